@@ -8,6 +8,18 @@ class Settings(BaseSettings):
     # Конфігурація OpenAI
     openai_api_key: str
     llm_model: str = "gpt-5-nano"
+
+    # Конфігурація шлюзу LLM (base_url дозволяє використати локальний OpenAI-сумісний сервер)
+    llm_base_url: Optional[str] = None
+    llm_interactive_max_connections: int = 50
+    llm_background_max_connections: int = 4
+    llm_connect_timeout: float = 5.0
+    llm_first_token_timeout: float = 20.0
+    llm_request_timeout: float = 90.0
+    llm_background_timeout: float = 60.0
+    llm_max_retries: int = 2
+    llm_retry_base_delay: float = 0.5
+    llm_hedge_after: float = 0.0
     
     # Конфігурація моделей
     embedding_model: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
@@ -16,11 +28,69 @@ class Settings(BaseSettings):
     # Конфігурація RAG
     chunk_size: int = 512
     chunk_overlap: int = 128
+    structure_splitting: bool = True # розбиття за нумерацією розділів і пунктів
     top_k: int = 5
     rerank_top_k: int = 3
     bm25_weight: float = 0.3
     vector_weight: float = 0.7
+
+    # Конфігурація щільного індексу: exact, int8 або binary
+    dense_index_mode: str = "exact"
+    dense_index_pca_dim: int = 0
+    dense_rescore_factor: int = 4
+
+    # Спільне сховище тексту чанків: memmap-файл у persist_directory замість буфера в пам'яті
+    chunk_store_mmap: bool = True
+
+    # Режим пошуку: flat (усі чанки) або hierarchical (спочатку розділи, потім чанки в них)
+    retrieval_mode: str = "flat"
+    hierarchical_top_sections: int = 3
+    hierarchical_expand_parent: bool = False
+    hierarchical_parent_max_chars: int = 2000
+
+    # Диверсифікація кандидатів перед re-ranking (злиття сусідніх чанків і MMR)
+    enable_diversification: bool = True
+    mmr_lambda: float = 0.7
+    mmr_candidates: int = 8
+    merge_max_chars: int = 1500
+
+    # Компресія контекстів: extractive (локальний відбір речень) або none
+    context_compression: str = "extractive"
+    compression_max_chars: int = 600
+
+    # Екстрактивна відповідь без LLM: попередній перегляд і резервна відповідь після дедлайну LLM
+    extractive_preview: bool = True
+    extractive_fallback: bool = True
+    extractive_max_sentences: int = 3
+
+    # Кешування вбудовувань запитів і результатів пошуку
+    enable_retrieval_cache: bool = True
+    embedding_cache_size: int = 4096
+    retrieval_cache_size: int = 1024
+
+    # Об'єднання однакових запитів, що обробляються одночасно (один пошук і одна генерація на всіх)
+    enable_single_flight: bool = True
+
+    # Токен-бюджет контексту в запиті до LLM
+    context_token_budget: int = 3000
+
+    # Об'єднання токенів у SSE-кадри (0 - вимкнено)
+    stream_coalesce_interval_ms: float = 30
+    stream_coalesce_max_chars: int = 256
     
+    # Профілювання окремих запитів та індексацій (заголовок X-Profile або POST /profiling/arm);
+    # вимкнено за замовчуванням: профілі містять тексти запитів користувачів і шляхи до файлів сервера
+    profiling_enabled: bool = False
+    profile_buffer_size: int = 20
+
+    # Трасування запитів (OTLP/JSON): file, otlp або none; журнал text або json
+    tracing_exporter: str = "file"
+    tracing_service_name: str = "knu-rag-api"
+    tracing_file_path: str = "./logs/traces.jsonl"
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    log_level: str = "INFO"
+    log_format: str = "text"
+
     # Конфігурація сховища
     persist_directory: str = "./chroma_db"
     collection_name: str = "knu_documents"
@@ -28,8 +98,31 @@ class Settings(BaseSettings):
     # Розташування теки з документами
     documents_path: str = "./documents"
     
+    # Кеш витягнутого тексту PDF і вбудовувань чанків (повторне розбиття без повторного розбору і векторизації)
+    text_cache_dir: str = "./cache/text"
+    embedding_store_path: str = "./cache/embeddings.sqlite3"
+
+    # Затримка видалення попереднього покоління індексу після атомарної заміни, с
+    index_retire_delay: float = 30.0
+
     # Оцінка якості системи
     enable_evaluation: bool = True
+
+    # Фонова оцінка якості: частка запитів, що оцінюються без явного запиту клієнта
+    evaluation_sample_rate: float = 0.1
+    evaluation_queue_size: int = 100
+    evaluation_workers: int = 2
+    evaluation_results_size: int = 1000
+
+    # Бекенд оцінки якості: "llm" (LLM-суддя) або "local" (NLI крос-енкодер, вбудовування й оцінки re-ranking)
+    evaluation_backend: str = "llm"
+    nli_model: str = "MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7"
+    local_relevance_threshold: float = 0.5
+
+    # Постійний кеш вердиктів LLM-судді
+    enable_judge_cache: bool = True
+    judge_cache_path: str = "./cache/judge_verdicts.sqlite3"
+    judge_cache_ttl: int = 7 * 24 * 3600
     
     class Config:
         env_file = ".env"
@@ -1,14 +1,18 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
+from typing import List, Optional
+from pydantic import ValidationError
 import logging
 from pathlib import Path
-import json
 import asyncio
+import hashlib
+import json
 
 from .models import (
     QueryRequest,
+    QueryFilters,
     QueryResponse,
     HealthResponse,
     EvaluationReportResponse,
@@ -19,16 +23,30 @@ from .models import (
 )
 
 from app.rag.rag_pipeline import RAGPipeline
+from app.rag.retriever.diversity import MAX_MERGED_CHUNKS, MERGED_ID_SEPARATOR
 from app.config import settings
+from app.streaming import encode_sse, coalesce_tokens
+from app.profiling import ProfileSession, ProfileStore, profiled_section
+from app.tracing import tracer, configure_logging, configure_tracing
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+log_listener = configure_logging(level=settings.log_level, log_format=settings.log_format)
 
 logger = logging.getLogger(__name__)
 
 rag_pipeline: RAGPipeline = None
+profile_store = ProfileStore(capacity=settings.profile_buffer_size)
+
+
+def start_profile(http_request: Request, kind: str, label: str) -> Optional[ProfileSession]:
+    """Сесія профілювання, якщо її запитано заголовком X-Profile або адміністративним перемикачем"""
+    if not settings.profiling_enabled:
+        return None
+
+    requested = http_request.headers.get("X-Profile", "").lower() in ("1", "true", "yes")
+    if not profile_store.should_profile(requested):
+        return None
+
+    return ProfileSession(kind=kind, label=label)
 
 
 @asynccontextmanager
@@ -36,6 +54,13 @@ async def lifespan(app: FastAPI):
     """Цикл роботи системи"""
     global rag_pipeline
 
+    configure_tracing(
+        exporter=settings.tracing_exporter,
+        service_name=settings.tracing_service_name,
+        file_path=settings.tracing_file_path,
+        otlp_endpoint=settings.tracing_otlp_endpoint
+    )
+
     logger.info("Ініціалізація RAG-системи...")
 
     try:
@@ -53,6 +78,14 @@ async def lifespan(app: FastAPI):
     
     logger.info("Завершення роботи...")
 
+    # Фонові оцінки якості перериваються перед наступним викликом LLM-судді
+    if rag_pipeline and rag_pipeline.evaluation_scheduler:
+        rag_pipeline.evaluation_scheduler.shutdown()
+
+    # Експорт спанів і записів журналу, що залишилися в чергах
+    tracer.configure(None)
+    log_listener.stop()
+
 
 app = FastAPI(
     title="API-навігатор з нормативних документів КНУТШ",
@@ -102,14 +135,34 @@ async def health_check():
     )
 
 
+async def watch_disconnect(http_request: Request, cancel_event: asyncio.Event, interval: float = 0.5):
+    """Відстеження від'єднання SSE-клієнта і сигналізація про скасування запиту"""
+    while not cancel_event.is_set():
+        if await http_request.is_disconnected():
+            logger.info("Клієнт від'єднався, обробку запиту скасовано")
+            cancel_event.set()
+            return
+
+        await asyncio.sleep(interval)
+
+
 @app.get("/query/stream", tags=["RAG"])
 async def query_rag_stream(
+    http_request: Request,
     question: str,
     return_contexts: bool = True,
-    return_evaluation: bool = False
+    return_evaluation: bool = False,
+    source: List[str] = Query(default_factory=list),
+    section: List[str] = Query(default_factory=list),
+    doc_type: List[str] = Query(default_factory=list),
+    effective_from: Optional[str] = None,
+    effective_to: Optional[str] = None
 ):
     """
     Streaming-обробка запиту користувача через SSE
+
+    Параметри source, section і doc_type можна повторювати (?source=a.pdf&section=2.13);
+    effective_from і effective_to обмежують дату набрання чинності документа (YYYY-MM-DD)
     """
     if not rag_pipeline:
         raise HTTPException(
@@ -117,52 +170,177 @@ async def query_rag_stream(
             detail="RAG-систему не ініціалізовано!"
         )
 
-    request = QueryRequest(
-        question=question,
-        return_contexts=return_contexts,
-        return_evaluation=return_evaluation
-    )
+    try:
+        request = QueryRequest(
+            question=question,
+            return_contexts=return_contexts,
+            return_evaluation=return_evaluation,
+            filters=QueryFilters(
+                sources=source,
+                sections=section,
+                doc_types=doc_type,
+                effective_from=effective_from,
+                effective_to=effective_to
+            )
+        )
+    except ValidationError as error:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=error.errors())
+
+    # Без структурного розбиття чанки не мають номерів розділів, і фільтр відкинув би всі контексти
+    if request.filters and request.filters.sections and not rag_pipeline.get_filter_values()["section_filter"]:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Фільтр за розділами недоступний: документи проіндексовано без структурного розбиття"
+        )
+
+    profile = start_profile(http_request, kind="query", label=request.question)
+
+    # Кореневий спан запиту завершується разом з потоком відповіді
+    request_span = tracer.start_span("GET /query/stream", kind="SERVER", attributes={
+        "http.method": "GET",
+        "http.route": "/query/stream",
+        "rag.question_length": len(request.question),
+        "rag.return_contexts": request.return_contexts,
+        "rag.profiled": profile is not None
+    })
     
     async def event_generator():
+        cancel_event = asyncio.Event()
+        watcher = asyncio.create_task(watch_disconnect(http_request, cancel_event))
+
+        stream = rag_pipeline.query_stream(
+            question=request.question,
+            return_evaluation=request.return_evaluation,
+            return_contexts=request.return_contexts,
+            filters=request.filters.dict(exclude_none=True) if request.filters else None,
+            cancel_event=cancel_event,
+            profile=profile,
+            trace_parent=request_span
+        )
+
         try:
-            logger.info(f"Обробка запиту...")
+            with tracer.use_span(request_span):
+                logger.info(f"Обробка запиту...")
             
-            async for event in rag_pipeline.query_stream(
-                question=request.question,
-                return_evaluation=request.return_evaluation,
-                return_contexts=request.return_contexts
+            # Токени об'єднуються у кадри за часовим і розмірним бюджетом
+            async for event in coalesce_tokens(
+                stream,
+                interval_ms=settings.stream_coalesce_interval_ms,
+                max_chars=settings.stream_coalesce_max_chars
             ):
+                if cancel_event.is_set():
+                    break
+
                 # Форматуємо як SSE
-                event_data = json.dumps(event, ensure_ascii=False)
-                yield f"data: {event_data}\n\n"
-                
-                # Даємо можливість іншим задачам виконуватися
-                await asyncio.sleep(0)
+                yield encode_sse(event)
             
+            if cancel_event.is_set():
+                rag_pipeline.cancellation_stats["streams_cancelled"] += 1
+                return
+
+            if profile:
+                record = profile_store.add(profile.finish())
+                yield encode_sse({"type": "profile", "data": record.summary(limit=5)})
+
             # Сигнал завершення
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield encode_sse({"type": "done", "data": {"trace_id": request_span.trace_id}})
             
-            logger.info("Запит успішно оброблено!")
+            with tracer.use_span(request_span):
+                logger.info("Запит успішно оброблено!")
+
+        except (GeneratorExit, asyncio.CancelledError):
+            # Сервер закрив відповідь через від'єднання клієнта
+            cancel_event.set()
+            rag_pipeline.cancellation_stats["streams_cancelled"] += 1
+            raise
 
         except Exception as error:
-            logger.error(f"Помилка при обробці запиту: {error}")
-            error_event = json.dumps({
+            request_span.record_exception(error)
+            with tracer.use_span(request_span):
+                logger.error(f"Помилка при обробці запиту: {error}")
+            yield encode_sse({
                 "type": "error",
                 "data": {"message": str(error)}
             })
-            yield f"data: {error_event}\n\n"
+
+        finally:
+            watcher.cancel()
+            # Закриття генератора пайплайну звільняє потік LLM
+            await stream.aclose()
+
+            # Профіль скасованого або невдалого запиту теж зберігається
+            if profile and profile_store.get(profile.id) is None:
+                profile_store.add(profile.finish())
+
+            request_span.set_attribute("rag.cancelled", cancel_event.is_set())
+            request_span.end()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        "X-Trace-Id": request_span.trace_id
+    }
+    if profile:
+        headers["X-Profile-Id"] = profile.id
     
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+        headers=headers
     )
 
 
+@app.get("/filters", tags=["RAG"])
+async def get_filter_values():
+    """Доступні значення фільтрів пошуку за метаданими"""
+    if not rag_pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="RAG-систему не ініціалізовано!"
+        )
+
+    return rag_pipeline.get_filter_values()
+
+
+@app.get("/chunks/{chunk_id}", tags=["RAG"])
+async def get_chunk(chunk_id: str, request: Request):
+    """
+    Повний текст знайденого чанка (для розгортання контексту в інтерфейсі)
+
+    Id чанків унікальні в межах покоління індексу, тож відповідь кешується клієнтом;
+    ETag дозволяє повторну перевірку без передачі тексту (304 Not Modified)
+    """
+    if not rag_pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="RAG-систему не ініціалізовано!"
+        )
+
+    if chunk_id.count(MERGED_ID_SEPARATOR) >= MAX_MERGED_CHUNKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Id може об'єднувати не більше {MAX_MERGED_CHUNKS} чанків"
+        )
+
+    chunk = rag_pipeline.get_chunk(chunk_id)
+
+    if chunk is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Чанк {chunk_id} не знайдено в поточному індексі"
+        )
+
+    body = json.dumps(chunk, ensure_ascii=False, default=str).encode("utf-8")
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/evaluation/report", response_model=EvaluationReportResponse, tags=["Evaluation"])
 async def get_evaluation_report():
     """Надання комплексного звіту стосовно якості відповідей системи"""
@@ -189,6 +367,26 @@ async def get_evaluation_report():
         )
 
 
+@app.get("/evaluation/{request_id}", tags=["Evaluation"])
+async def get_evaluation_result(request_id: str):
+    """Надання результату фонової оцінки якості окремого запиту"""
+    if not rag_pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="RAG-систему не ініціалізовано!"
+        )
+
+    result = rag_pipeline.get_evaluation_result(request_id)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Результат оцінки для запиту {request_id} не знайдено"
+        )
+
+    return result
+
+
 @app.get("/documents", response_model=DocumentsListResponse, tags=["Documents"])
 async def list_documents():
     """Надання списку документів"""
@@ -244,10 +442,24 @@ async def get_statistics():
                 "vector_weight": stats["vector_weight"],
                 "streaming_enabled": True,
                 "llm_compression": False,
+                "context_compression": settings.context_compression,
                 "fast_validation": True
             },
             "statistics": {
                 "vector_store_size": stats["vector_store_size"],
+                "dense_index": stats["dense_index"],
+                "chunk_store": stats["chunk_store"],
+                "retrieval_cache": stats["retrieval_cache"],
+                "single_flight": stats["single_flight"],
+                "cancellations": stats["cancellations"],
+                "extractive_answers": stats["extractive_answers"],
+                "evaluation_scheduler": stats["evaluation_scheduler"],
+                "judge_cache": stats["judge_cache"],
+                "index_generation": rag_pipeline.index_generation,
+                "tokens": stats["tokens"],
+                "prompt_cache": stats["prompt_cache"],
+                "llm_gateway": stats["llm_gateway"],
+                "tracing": tracer.stats(),
                 "evaluation_enabled": settings.enable_evaluation
             }
         }
@@ -272,7 +484,7 @@ async def get_parameters():
     
     try:
         params = rag_pipeline.get_current_parameters()
-        return ParametersResponse(**params)
+        return ParametersResponse(**params, index_generation=rag_pipeline.index_generation)
 
     except Exception as error:
         logger.error(f"Помилка при отриманні параметрів: {error}")
@@ -294,13 +506,20 @@ async def update_parameters(request: ParametersUpdateRequest):
     
     try:
         update_data = request.dict(exclude_unset=True)
-        rag_pipeline.update_parameters(update_data)
+        update_result = rag_pipeline.update_parameters(update_data)
         new_params = rag_pipeline.get_current_parameters()
-        
+
+        # Параметри розбиття набувають чинності після фонової перебудови індексу
+        message = "Параметри успішно оновлено!"
+        if update_result["plan"]["scope"] == "rechunk":
+            message = "Параметри оновлено! Перебудова індексу з новим розбиттям виконується у фоні"
+
         return {
-            "message": "Параметри успішно оновлено!",
+            "message": message,
             "status": "success",
-            "parameters": new_params
+            "parameters": new_params,
+            "plan": update_result["plan"],
+            "index": update_result["index"]
         }
         
     except Exception as error:
@@ -312,46 +531,72 @@ async def update_parameters(request: ParametersUpdateRequest):
         )
 
 
+@app.get("/index/status", tags=["Admin"])
+async def get_index_status():
+    """Надання інформації про живе покоління індексу і фонову перебудову"""
+    if not rag_pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="RAG-систему не ініціалізовано!"
+        )
+
+    return rag_pipeline.get_index_status()
+
+
 @app.post("/index", tags=["Admin"])
-async def index_documents():
-    """Індексація документів у сховищі"""
+async def index_documents(http_request: Request):
+    """Індексація документів у сховищі (з заголовком X-Profile: 1 індексація профілюється)"""
     if not rag_pipeline:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="RAG-систему не ініціалізовано!"
         )
     
+    index_span = tracer.start_span("POST /index", kind="SERVER", attributes={"http.method": "POST", "http.route": "/index"})
+
     try:
-        logger.info("Початок індексації документів...")
-        
-        try:
-            collection = rag_pipeline.vector_store.get()
-            before_count = len(collection.get('ids', []))
-        except:
-            before_count = 0
-        
-        rag_pipeline._index_documents()
+        with tracer.use_span(index_span):
+            logger.info("Початок індексації документів...")
+            
+            try:
+                collection = rag_pipeline.vector_store.get()
+                before_count = len(collection.get('ids', []))
+            except:
+                before_count = 0
+            
+            profile = start_profile(http_request, kind="index", label=settings.documents_path)
 
-        try:
-            collection = rag_pipeline.vector_store.get()
-            after_count = len(collection.get('ids', []))
-        except:
-            after_count = 0
+            with profiled_section(profile):
+                rag_pipeline._index_documents()
 
-        if rag_pipeline.retriever:
-            rag_pipeline.retriever._build_retrievers()
-        
-        logger.info(f"Індексацію завершено. Було {before_count}, стало {after_count}")
+            try:
+                collection = rag_pipeline.vector_store.get()
+                after_count = len(collection.get('ids', []))
+            except:
+                after_count = 0
+
+            if rag_pipeline.retriever:
+                with profiled_section(profile):
+                    rag_pipeline.retriever._build_retrievers()
+            
+            index_span.set_attributes({"index.chunks_before": before_count, "index.chunks_after": after_count})
+            logger.info(f"Індексацію завершено. Було {before_count}, стало {after_count}")
         
-        return {
+        response = {
             "message": "Індексацію успішно виконано!",
             "status": "success",
             "documents_before": before_count,
             "documents_after": after_count,
             "documents_added": after_count - before_count
         }
+
+        if profile:
+            response["profile"] = profile_store.add(profile.finish()).summary(limit=5)
+
+        return response
         
     except Exception as error:
+        index_span.record_exception(error)
         logger.error(f"Помилка при індексації: {error}")
 
         raise HTTPException(
@@ -359,6 +604,74 @@ async def index_documents():
             detail=f"Помилка при індексації: {str(error)}"
         )
 
+    finally:
+        index_span.end()
+
+
+@app.post("/profiling/arm", tags=["Admin"])
+async def arm_profiling(count: int = Query(default=1, ge=0, le=100)):
+    """Профілювання наступних count запитів або індексацій (0 - вимкнути)"""
+    if not settings.profiling_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Профілювання вимкнено в налаштуваннях (PROFILING_ENABLED)"
+        )
+
+    return {"armed": profile_store.arm(count), **profile_store.stats()}
+
+
+@app.get("/profiling", tags=["Admin"])
+async def list_profiles():
+    """Список збережених профілів (від найновішого)"""
+    if not settings.profiling_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Профілювання вимкнено в налаштуваннях (PROFILING_ENABLED)"
+        )
+
+    return {"profiles": profile_store.list(), **profile_store.stats()}
+
+
+@app.get("/profiling/{profile_id}", tags=["Admin"])
+async def get_profile(
+    profile_id: str,
+    format: str = Query(default="pstats", pattern="^(pstats|text|json)$"),
+    sort: str = Query(default="cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+    limit: int = Query(default=60, ge=1, le=1000)
+):
+    """
+    Завантаження профілю
+
+    - pstats: бінарний файл pstats (python -m pstats, snakeviz, gprof2dot)
+    - text: звіт pstats, відсортований за sort
+    - json: найдорожчі функції за власним часом
+    """
+    if not settings.profiling_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Профілювання вимкнено в налаштуваннях (PROFILING_ENABLED)"
+        )
+
+    record = profile_store.get(profile_id)
+
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Профіль {profile_id} не знайдено"
+        )
+
+    if format == "text":
+        return PlainTextResponse(record.to_text(sort=sort, limit=limit))
+
+    if format == "json":
+        return record.summary(limit=limit)
+
+    return Response(
+        content=record.to_pstats_bytes(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{record.kind}-{record.id}.prof"'}
+    )
+
 
 @app.post("/reset", tags=["Admin"])
 async def reset_vector_store():
@@ -2,11 +2,21 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 
+class QueryFilters(BaseModel):
+    """Фільтри пошуку за метаданими документів"""
+    sources: List[str] = Field(default_factory=list)
+    sections: List[str] = Field(default_factory=list)
+    doc_types: List[str] = Field(default_factory=list)
+    effective_from: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    effective_to: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+
+
 class QueryRequest(BaseModel):
     """Запит на інформаційний пошук"""
     question: str = Field(..., min_length=1)
     return_contexts: bool = Field(False)
     return_evaluation: bool = Field(False)
+    filters: Optional[QueryFilters] = None
 
 
 class ContextInfo(BaseModel):
@@ -79,6 +89,7 @@ class ParametersResponse(BaseModel):
     rerank_top_k: int
     bm25_weight: float
     vector_weight: float
+    index_generation: int = 0
 
 
 class ParametersUpdateRequest(BaseModel):
@@ -0,0 +1,182 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class ProfileRecord:
+    """Збережений профіль одного запиту або індексації"""
+    id: str
+    kind: str
+    label: str
+    started_at: str
+    duration: float
+    sections: int
+    stats: Dict[Any, Any] = field(repr=False)
+
+    def summary(self, limit: int = 10) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "sections": self.sections,
+            "top_functions": self.top_functions(limit)
+        }
+
+    def _pstats(self, stream: Optional[io.StringIO] = None) -> pstats.Stats:
+        # pstats.Stats приймає об'єкт з create_stats() і полем stats
+        holder = type("ProfileHolder", (), {"create_stats": lambda self: None, "stats": self.stats})()
+        return pstats.Stats(holder, stream=stream)
+
+    def top_functions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Функції з найбільшим власним часом (tottime)"""
+        rows = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in self.stats.items():
+            rows.append({
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "tottime": tottime,
+                "cumtime": cumtime
+            })
+        rows.sort(key=lambda row: row["tottime"], reverse=True)
+        return rows[:limit]
+
+    def to_pstats_bytes(self) -> bytes:
+        """Профіль у форматі pstats (як після Stats.dump_stats; відкривається snakeviz, gprof2dot, pstats)"""
+        return marshal.dumps(self.stats)
+
+    def to_text(self, sort: str = "cumulative", limit: int = 60) -> str:
+        stream = io.StringIO()
+        self._pstats(stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class ProfileSession:
+    """
+    Профілювання одного запиту cProfile-ом
+
+    Робота запиту виконується в потоці циклу подій і в потоках executor-а, тож профілюються
+    окремі синхронні ділянки (section/wrap), а не весь потік: так до профілю не потрапляє
+    робота інших запитів, що виконуються паралельно. Очікування мережі (потік LLM) не профілюється
+    """
+
+    def __init__(self, kind: str, label: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label[:200]
+        self.started_at = datetime.now().isoformat()
+        self._started = time.perf_counter()
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def section(self):
+        """Профілювання синхронної ділянки коду в поточному потоці"""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def wrap(self, function: Callable) -> Callable:
+        """Обгортка для функції, що виконується в executor-і"""
+        def profiled(*args, **kwargs):
+            with self.section():
+                return function(*args, **kwargs)
+        return profiled
+
+    def finish(self) -> ProfileRecord:
+        """Об'єднання профілів ділянок в один запис"""
+        with self._lock:
+            profiles = list(self._profiles)
+
+        stats: Dict[Any, Any] = {}
+        if profiles:
+            holder = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                holder.add(profile)
+            stats = holder.stats
+
+        return ProfileRecord(
+            id=self.id,
+            kind=self.kind,
+            label=self.label,
+            started_at=self.started_at,
+            duration=time.perf_counter() - self._started,
+            sections=len(profiles),
+            stats=stats
+        )
+
+
+def profiled_section(session: Optional[ProfileSession]):
+    """Ділянка профілювання або порожній контекст, якщо профілювання вимкнено"""
+    return session.section() if session else nullcontext()
+
+
+def profiled_call(session: Optional[ProfileSession], function: Callable) -> Callable:
+    return session.wrap(function) if session else function
+
+
+class ProfileStore:
+    """
+    Кільцевий буфер профілів і перемикач профілювання
+
+    Профілювання вмикається заголовком X-Profile у запиті або адміністративно:
+    arm(count) профілює наступні count запитів чи індексацій
+    """
+
+    def __init__(self, capacity: int = 20):
+        self.capacity = capacity
+        self._records: "OrderedDict[str, ProfileRecord]" = OrderedDict()
+        self._armed = 0
+        self._lock = threading.Lock()
+
+    def arm(self, count: int = 1) -> int:
+        with self._lock:
+            self._armed = max(0, count)
+            return self._armed
+
+    def should_profile(self, requested: bool = False) -> bool:
+        """Чи профілювати поточний запит (явний запит або залишок адміністративного лічильника)"""
+        if requested:
+            return True
+
+        with self._lock:
+            if self._armed > 0:
+                self._armed -= 1
+                return True
+        return False
+
+    def add(self, record: ProfileRecord) -> ProfileRecord:
+        with self._lock:
+            self._records[record.id] = record
+            while len(self._records) > self.capacity:
+                self._records.popitem(last=False)
+        return record
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        with self._lock:
+            return self._records.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = list(self._records.values())
+        return [record.summary(limit=5) for record in reversed(records)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"stored": len(self._records), "capacity": self.capacity, "armed": self._armed}
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+import pypdf
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+logger = logging.getLogger(__name__)
+
+
+def extract_pdf_text(pdf_file: Path) -> Dict[str, Any]:
+    """Витягнення тексту PDF-документа"""
+    with open(pdf_file, 'rb') as file:
+        reader = pypdf.PdfReader(file)
+        text = ""
+        for page in reader.pages:
+            text += page.extract_text() + "\n\n"
+
+    return {"source": pdf_file.name, "pages": len(reader.pages), "text": text}
+
+
+# Типи документів і їхня транслітерація в назвах файлів
+DOC_TYPES = {
+    "положення": "polozhennia",
+    "порядок": "poriadok",
+    "правила": "pravyla",
+    "інструкція": "instruktsiia",
+    "статут": "statut",
+    "розпорядження": "rozporiadzhennia",
+    "наказ": "nakaz"
+}
+DOC_TYPE_PATTERN = re.compile(r'\b(' + "|".join(DOC_TYPES) + r')\s+про\b', re.IGNORECASE)
+DATE_PATTERN = re.compile(r'\b(\d{2})\.(\d{2})\.(\d{4})')
+
+
+def infer_document_metadata(pdf_file: Path, text: str, head_size: int = 3000) -> Dict[str, str]:
+    """
+    Метадані документа для фільтрації: тип і дата набрання чинності
+
+    Тип визначається за назвою файлу або за першим зворотом "<тип> про" на початку тексту,
+    дата - як найпізніша дата на початку тексту (остання редакція). Файл "<назва>.meta.json"
+    поруч із PDF (поля doc_type, effective_date) має пріоритет
+    """
+    head = text[:head_size]
+    metadata = {}
+
+    stem = pdf_file.stem.lower()
+    for doc_type, transliterated in DOC_TYPES.items():
+        if stem.startswith(doc_type) or stem.startswith(transliterated):
+            metadata["doc_type"] = doc_type
+            break
+    else:
+        match = DOC_TYPE_PATTERN.search(head)
+        if match:
+            metadata["doc_type"] = match.group(1).lower()
+
+    dates = []
+    for day, month, year in DATE_PATTERN.findall(head):
+        if 1 <= int(month) <= 12 and 1 <= int(day) <= 31:
+            dates.append(f"{year}-{month}-{day}")
+    if dates:
+        metadata["effective_date"] = max(dates)
+
+    sidecar = pdf_file.with_suffix(".meta.json")
+    if sidecar.exists():
+        try:
+            with open(sidecar, encoding="utf-8") as file:
+                overrides = json.load(file)
+            metadata.update({key: str(overrides[key]) for key in ("doc_type", "effective_date") if overrides.get(key)})
+        except (OSError, ValueError) as error:
+            logger.warning(f"Не вдалося прочитати метадані {sidecar.name}: {error}")
+
+    return metadata
+
+
+class ExtractedTextCache:
+    """
+    Кеш витягнутого з PDF тексту
+
+    Ключ - назва, розмір і час зміни файлу, тож повторне розбиття на чанки
+    (інші chunk_size/chunk_overlap) не потребує повторного розбору PDF
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_file(self, pdf_file: Path) -> Path:
+        stat = pdf_file.stat()
+        key = hashlib.sha256(f"{pdf_file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:24]
+        return self.cache_dir / f"{key}.json"
+
+    def load(self, pdf_file: Path) -> Dict[str, Any]:
+        cache_file = self._cache_file(pdf_file)
+
+        if cache_file.exists():
+            self.hits += 1
+            with open(cache_file, encoding="utf-8") as file:
+                return json.load(file)
+
+        self.misses += 1
+        extracted = extract_pdf_text(pdf_file)
+        with open(cache_file, "w", encoding="utf-8") as file:
+            json.dump(extracted, file, ensure_ascii=False)
+
+        return extracted
+
+    def load_documents(self, documents_path: str) -> List[Document]:
+        """Завантаження всіх PDF-документів теки (з кешу, якщо файл не змінився)"""
+        documents = []
+
+        for pdf_file in sorted(Path(documents_path).glob("*.pdf")):
+            try:
+                extracted = self.load(pdf_file)
+                documents.append(Document(
+                    page_content=extracted["text"],
+                    metadata={
+                        "source": extracted["source"],
+                        "pages": extracted["pages"],
+                        **infer_document_metadata(pdf_file, extracted["text"])
+                    }
+                ))
+
+            except Exception as error:
+                logger.error(f"Помилка завантаження {pdf_file.name}: {error}")
+
+        return documents
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class PersistentEmbeddings(Embeddings):
+    """
+    Обгортка моделі вбудовувань з постійним кешем векторів чанків (SQLite)
+
+    Ключ - хеш назви моделі і тексту чанка: однакові чанки різних варіантів розбиття
+    та повторних індексацій обчислюються лише один раз. Вбудовування запитів не кешуються
+    (для них є RetrievalCache)
+    """
+
+    def __init__(self, embeddings: Embeddings, path: str, batch_size: int = 500):
+        self.embeddings = embeddings
+        self.path = path
+        self.batch_size = batch_size
+        self.model_name = getattr(embeddings, "model_name", type(embeddings).__name__)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB)")
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.batch_size):
+                batch = keys[start:start + self.batch_size]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing[key] = text
+
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            vectors = self.embeddings.embed_documents([missing[key] for key in missing_keys])
+
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in zip(missing_keys, vectors)]
+                )
+            found.update(zip(missing_keys, vectors))
+
+        return [list(found[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,142 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(query: str) -> str:
+    """Нормалізація запиту: нижній регістр, єдині пробіли, без кінцевої пунктуації"""
+    normalized = re.sub(r'\s+', ' ', query.strip().lower())
+    return normalized.rstrip(' ?!.…')
+
+
+class LRUCache:
+    """Потокобезпечний LRU-кеш з лічильниками влучань і промахів"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class RetrievalCache:
+    """
+    Дворівневий кеш інформаційного пошуку
+
+    Рівні:
+    1. Нормалізований запит → вбудовування запиту (залежить лише від моделі вбудовувань)
+    2. (запит, top_k, rerank_top_k, ваги, фільтр, покоління індексу) → ранжовані id чанків з оцінками,
+       текстом і метаданими після пост-обробки (компресії, розширення до розділу)
+
+    Зміна покоління індексу (перебудова ретриверів) робить недійсними всі результати пошуку
+    """
+
+    def __init__(self, embedding_cache_size: int = 4096, result_cache_size: int = 1024):
+        self.embeddings = LRUCache(embedding_cache_size)
+        self.results = LRUCache(result_cache_size)
+        self.generation = 0
+
+    def invalidate(self):
+        """Перехід до нового покоління індексу"""
+        self.generation += 1
+        self.results.clear()
+
+    def result_key(
+            self,
+            query: str,
+            top_k: int,
+            rerank_top_k: int,
+            bm25_weight: float,
+            vector_weight: float,
+            filter_dict: Optional[Dict] = None
+    ) -> Tuple:
+        filter_key = tuple(sorted((k, repr(v)) for k, v in filter_dict.items())) if filter_dict else ()
+        return (
+            normalize_query(query),
+            top_k,
+            rerank_top_k,
+            round(bm25_weight, 6),
+            round(vector_weight, 6),
+            filter_key,
+            self.generation
+        )
+
+    def get_results(self, key: Tuple) -> Optional[List[Tuple]]:
+        return self.results.get(key)
+
+    def put_results(self, key: Tuple, ranked: List[Tuple]):
+        # Результати, обчислені для попереднього покоління, не зберігаємо
+        if key[-1] == self.generation:
+            self.results.put(key, ranked)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index_generation": self.generation,
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats()
+        }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Обгортка над моделлю вбудовувань, що кешує вбудовування запитів"""
+
+    def __init__(self, embeddings: Embeddings, cache: RetrievalCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.cache.embeddings.get(key)
+
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.embeddings.put(key, vector)
+
+        return vector
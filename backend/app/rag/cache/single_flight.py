@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """Спільне виконання запиту: журнал подій і підписники"""
+
+    def __init__(self, owner: Any = None):
+        self.owner = owner
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.cancel_event = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self, event: Dict[str, Any]):
+        self.events.append(event)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        # Очікувачі попереднього стану прокидаються, наступні чекатимуть на новий Event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Об'єднання однакових запитів, що виконуються одночасно (single-flight)
+
+    - перший запит із заданим ключем запускає виконання в окремій задачі
+    - наступні запити з тим самим ключем під'єднуються до нього: отримують усі вже видані події,
+      а далі - нові події в міру надходження (токени LLM розсилаються кожному підписнику)
+    - підписник, що від'єднався (його cancel_event), виходить одразу, не чекаючи наступної події
+    - виконання скасовується (cancel_event), лише коли від'єдналися всі підписники
+    - після завершення ключ звільняється: однаковий запит, що надійшов пізніше, виконується заново
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self.counters = {
+            "flights": 0,
+            "coalesced": 0,
+            "abandoned": 0
+        }
+
+    def join(
+            self,
+            key: Hashable,
+            factory: Callable[[asyncio.Event], AsyncIterator[Dict[str, Any]]],
+            owner: Any = None
+    ) -> Tuple[Flight, bool]:
+        """
+        Під'єднання до виконання з ключем key або запуск нового
+
+        factory отримує cancel_event спільного виконання і повертає потік подій;
+        повертається пара (виконання, True для запиту, що його запустив)
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.counters["coalesced"] += 1
+            return flight, False
+
+        flight = self._flights[key] = Flight(owner)
+        flight.task = asyncio.create_task(self._run(key, flight, factory(flight.cancel_event)))
+        self.counters["flights"] += 1
+        return flight, True
+
+    async def _run(self, key: Hashable, flight: Flight, stream: AsyncIterator[Dict[str, Any]]):
+        error = None
+        try:
+            async for event in stream:
+                flight.publish(event)
+
+        except Exception as exc:
+            logger.error(f"Помилка спільного виконання запиту: {exc}")
+            error = exc
+
+        finally:
+            # Скасування задачі (зупинка сервера) завершує потоки підписників без помилки
+            self._release(key, flight)
+            flight.finish(error)
+            await stream.aclose()
+
+    def _release(self, key: Hashable, flight: Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def subscribe(
+            self,
+            key: Hashable,
+            flight: Flight,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Потік подій виконання для одного підписника (з початку журналу)"""
+        flight.subscribers += 1
+        position = 0
+
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+
+                changed = flight.changed
+
+                while position < len(flight.events):
+                    yield flight.events[position]
+                    position += 1
+
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+
+                await self._wait(changed, cancel_event)
+
+        finally:
+            flight.subscribers -= 1
+
+            # Останній підписник від'єднався: виконання нікому не потрібне
+            if not flight.subscribers and not flight.done:
+                self._release(key, flight)
+                flight.cancel_event.set()
+                self.counters["abandoned"] += 1
+
+    @staticmethod
+    async def _wait(changed: asyncio.Event, cancel_event: Optional[asyncio.Event]):
+        """Очікування нової події виконання або від'єднання підписника (що настане раніше)"""
+        if cancel_event is None:
+            await changed.wait()
+            return
+
+        waiters = {asyncio.ensure_future(changed.wait()), asyncio.ensure_future(cancel_event.wait())}
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "in_flight": len(self._flights),
+            "subscribers": sum(flight.subscribers for flight in self._flights.values())
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class VerdictCache:
+    """
+    Постійний кеш вердиктів LLM-судді (SQLite)
+
+    Ключ - хеш назви метрики, моделі-судді та вмісту повідомлень запиту (вхідні дані та шаблон),
+    тому зміна промпту чи моделі автоматично робить старі вердикти недійсними.
+    Записи, старші за ttl секунд, вважаються простроченими і видаляються
+    """
+
+    def __init__(self, path: str, ttl: int = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "key TEXT PRIMARY KEY, metric TEXT, model TEXT, verdict TEXT, created_at REAL)"
+            )
+        self.purge_expired()
+
+    @staticmethod
+    def make_key(metric: str, model: str, contents: List[str]) -> str:
+        """Хеш вмісту запиту до судді"""
+        digest = hashlib.sha256()
+        for part in (metric, model, *contents):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT verdict, created_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            verdict, created_at = row
+            if self.ttl and time.time() - created_at > self.ttl:
+                with self._connection:
+                    self._connection.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return verdict
+
+    def put(self, key: str, metric: str, model: str, verdict: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO verdicts (key, metric, model, verdict, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, metric, model, verdict, time.time())
+            )
+            self.writes += 1
+
+    def purge_expired(self) -> int:
+        """Видалення прострочених вердиктів"""
+        if not self.ttl:
+            return 0
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM verdicts")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+            by_metric = dict(self._connection.execute(
+                "SELECT metric, COUNT(*) FROM verdicts GROUP BY metric"
+            ).fetchall())
+
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "ttl": self.ttl,
+            "size": size,
+            "size_by_metric": by_metric,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "writes": self.writes,
+            "hit_rate": self.hits / total if total else 0.0
+        }
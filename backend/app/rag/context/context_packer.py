@@ -0,0 +1,192 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_token_counter(model_name: str) -> Callable[[str], int]:
+    """
+    Створення функції підрахунку токенів для моделі
+
+    Якщо tiktoken або його словник недоступні, використовується наближена оцінка (≈3 символи на токен)
+    """
+    if tiktoken is not None:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+        except Exception as error:
+            logger.warning(f"Не вдалося завантажити токенізатор для {model_name}: {error}. Використовується наближений підрахунок")
+
+    return lambda text: (len(text) + 2) // 3
+
+
+@dataclass
+class PackedContext:
+    """Результат пакування контекстів у токен-бюджет"""
+    text: str
+    documents: List[Document]
+    context_tokens: int
+    num_dropped: int = 0
+    num_truncated: int = 0
+    overlap_chars_trimmed: int = 0
+    sources: List[str] = field(default_factory=list)
+
+
+class ContextPacker:
+    """
+    Пакування отриманих чанків у контекст запиту з обмеженням кількості токенів
+
+    Етапи:
+    1. Видалення тексту, що повторюється в сусідніх чанках одного джерела (накладання розбивача)
+    2. Додавання чанків у порядку рангу, доки не вичерпано бюджет
+    3. Обрізання останнього чанку за токенами, якщо залишок бюджету є достатнім
+    """
+
+    SEPARATOR = "\n\n---\n\n"
+
+    def __init__(
+            self,
+            model_name: str,
+            token_budget: int = 3000,
+            min_chunk_tokens: int = 64,
+            min_overlap_chars: int = 20
+    ):
+        self.token_budget = token_budget
+        self.min_chunk_tokens = min_chunk_tokens
+        self.min_overlap_chars = min_overlap_chars
+        self.count_tokens = build_token_counter(model_name)
+
+    @staticmethod
+    def format_document(doc: Document) -> str:
+        return f"[Джерело: {doc.metadata.get('source', 'Unknown')}]\n{doc.page_content}"
+
+    def _overlap_length(self, previous: str, following: str) -> int:
+        """Довжина найдовшого суфікса previous, що є префіксом following"""
+        probe = following[:self.min_overlap_chars]
+        if len(probe) < self.min_overlap_chars:
+            return 0
+
+        position = previous.find(probe)
+        while position != -1:
+            suffix = previous[position:]
+            if following.startswith(suffix):
+                return len(suffix)
+            position = previous.find(probe, position + 1)
+
+        return 0
+
+    def _trim_against_packed(self, doc: Document, packed: Dict[Tuple[str, int], str]) -> Tuple[Document, int]:
+        """Видалення тексту, що вже є в запакованих сусідніх чанках того ж джерела"""
+        chunk_index = doc.metadata.get('chunk_index')
+        if not isinstance(chunk_index, int) or not packed:
+            return doc, 0
+
+        source = doc.metadata.get('source', '')
+        text = doc.page_content
+        trimmed = 0
+
+        # Початок чанку повторює кінець попереднього чанку
+        previous = packed.get((source, chunk_index - 1))
+        overlap = self._overlap_length(previous, text) if previous else 0
+        if overlap and overlap < len(text):
+            text = text[overlap:].lstrip()
+            trimmed += overlap
+
+        # Кінець чанку повторює початок наступного чанку
+        following = packed.get((source, chunk_index + 1))
+        overlap = self._overlap_length(text, following) if following else 0
+        if overlap and overlap < len(text):
+            text = text[:-overlap].rstrip()
+            trimmed += overlap
+
+        if not trimmed:
+            return doc, 0
+
+        return Document(
+            id=doc.id,
+            page_content=text,
+            metadata={**doc.metadata, 'overlap_trimmed': trimmed}
+        ), trimmed
+
+    def _truncate(self, doc: Document, max_tokens: int) -> Optional[Document]:
+        """Обрізання чанку до max_tokens токенів (за межею речення, якщо можливо)"""
+        text = doc.page_content
+        low, high = 0, len(text)
+
+        # Бінарний пошук найдовшого префікса, що вміщується в бюджет
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(self.format_document(Document(page_content=text[:middle], metadata=doc.metadata))) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+
+        prefix = text[:low]
+        sentence_end = max(prefix.rfind('. '), prefix.rfind('.\n'))
+        if sentence_end > len(prefix) // 2:
+            prefix = prefix[:sentence_end + 1]
+
+        if not prefix.strip():
+            return None
+
+        return Document(id=doc.id, page_content=prefix, metadata={**doc.metadata, 'truncated': True})
+
+    def pack(self, documents: List[Document], token_budget: Optional[int] = None) -> PackedContext:
+        """Пакування чанків (у порядку рангу) в межах токен-бюджету"""
+        budget = self.token_budget if token_budget is None else token_budget
+        separator_tokens = self.count_tokens(self.SEPARATOR)
+
+        packed: List[Document] = []
+        packed_by_position: Dict[Tuple[str, int], str] = {}
+        parts: List[str] = []
+        used_tokens = 0
+        num_truncated = 0
+        trimmed_chars = 0
+
+        for doc in documents:
+            doc, trimmed = self._trim_against_packed(doc, packed_by_position)
+            separator_cost = separator_tokens if parts else 0
+            cost = self.count_tokens(self.format_document(doc)) + separator_cost
+
+            if used_tokens + cost > budget:
+                remaining = budget - used_tokens - separator_cost
+                doc = self._truncate(doc, remaining) if remaining >= self.min_chunk_tokens else None
+                if doc is None:
+                    break
+                cost = self.count_tokens(self.format_document(doc)) + separator_cost
+                num_truncated += 1
+
+            packed.append(doc)
+            parts.append(self.format_document(doc))
+            used_tokens += cost
+            trimmed_chars += trimmed
+
+            chunk_index = doc.metadata.get('chunk_index')
+            if isinstance(chunk_index, int):
+                packed_by_position[(doc.metadata.get('source', ''), chunk_index)] = doc.page_content
+
+            if num_truncated:
+                break
+
+        return PackedContext(
+            text=self.SEPARATOR.join(parts),
+            documents=packed,
+            context_tokens=used_tokens,
+            num_dropped=len(documents) - len(packed),
+            num_truncated=num_truncated,
+            overlap_chars_trimmed=trimmed_chars,
+            sources=[doc.metadata.get('source', 'Unknown') for doc in packed]
+        )
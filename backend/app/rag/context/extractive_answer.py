@@ -0,0 +1,165 @@
+import os
+import re
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.rag.context.extractive_compressor import score_sentences, split_header, split_sentences
+
+
+CLAUSE_PREFIX = re.compile(r'^(\d{1,2}(?:\.\d{1,3}){1,4})\.?\s+')
+BULLET_PREFIX = re.compile(r'^[▪•·\-–—\s]+')
+
+
+@dataclass
+class ExtractiveAnswer:
+    """Відповідь, складена з речень знайдених контекстів (без генерації)"""
+    text: str
+    citations: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"answer": self.text, "citations": self.citations}
+
+
+class ExtractiveAnswerer:
+    """
+    Екстрактивна відповідь без LLM
+
+    Речення відібраних контекстів оцінюються крос-енкодером (або вбудовуваннями, або збігом термінів запиту),
+    найкращі max_sentences речень подаються списком з посиланням на пункт і джерело,
+    а ключові терміни виділяються жирним шрифтом (Markdown).
+    Використовується як миттєвий попередній перегляд до надходження токенів LLM
+    і як резервна відповідь, коли LLM не вклалася в дедлайн
+
+    Для контекстів, стиснених ExtractiveCompressor, використовуються вже обчислені оцінки речень
+    (metadata["sentence_scores"]); крос-енкодер оцінює лише решту речень
+    """
+
+    HEADER = "Витяг із документів (відповідь сформовано без мовної моделі):"
+
+    def __init__(
+            self,
+            cross_encoder: Optional[Any] = None,
+            embeddings: Optional[Embeddings] = None,
+            max_sentences: int = 3,
+            min_sentence_length: int = 30
+    ):
+        self.cross_encoder = cross_encoder
+        self.embeddings = embeddings
+        self.max_sentences = max_sentences
+        self.min_sentence_length = min_sentence_length
+
+    @staticmethod
+    def _terms(query: str, key_terms: Optional[List[str]]) -> List[str]:
+        """Терміни для виділення: ключові терміни або основи слів запиту (перші 5 літер)"""
+        if key_terms:
+            return sorted({term for term in key_terms if len(term) > 2}, key=len, reverse=True)
+        words = re.findall(r'\w+', query.lower())
+        return sorted({word[:5] for word in words if len(word) > 3}, key=len, reverse=True)
+
+    @staticmethod
+    def _lexical_scores(terms: List[str], sentences: List[str]) -> np.ndarray:
+        return np.asarray([sum(sentence.lower().count(term) for term in terms) for sentence in sentences], dtype=np.float32)
+
+    @staticmethod
+    def _highlight(sentence: str, terms: List[str]) -> str:
+        if not terms:
+            return sentence
+        pattern = re.compile(r'(?<!\w)(' + "|".join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+        return pattern.sub(lambda match: f"**{match.group(0)}**", sentence)
+
+    @staticmethod
+    def _clause_sentences(doc: Document) -> List[tuple]:
+        """Речення чанка з номером пункту, до якого кожне належить (чанк може містити кілька пунктів)"""
+        _, body = split_header(doc)
+        clause = doc.metadata.get("clause") or ""
+        result = []
+        for line in body.splitlines():
+            match = CLAUSE_PREFIX.match(line)
+            if match:
+                clause = match.group(1)
+                line = line[match.end():]
+            for sentence in split_sentences(line):
+                result.append((clause, BULLET_PREFIX.sub("", sentence)))
+        return result
+
+    @staticmethod
+    def _scored_sentences(doc: Document) -> List[tuple]:
+        """Речення стисненого чанка з оцінками компресора (пункт визначається за префіксом речення)"""
+        clause = doc.metadata.get("clause") or ""
+        result = []
+        for sentence, score in doc.metadata["sentence_scores"]:
+            # Пакувальник контексту міг обрізати текст чанка
+            if sentence not in doc.page_content:
+                continue
+            match = CLAUSE_PREFIX.match(sentence)
+            if match:
+                clause = match.group(1)
+                sentence = sentence[match.end():]
+            result.append((clause, BULLET_PREFIX.sub("", sentence), score))
+        return result
+
+    @staticmethod
+    def _citation(doc: Document, clause: str) -> Dict[str, Any]:
+        metadata = doc.metadata
+        return {
+            "source": os.path.basename(str(metadata.get("source", "Unknown"))),
+            "clause": clause,
+            "chunk_index": metadata.get("chunk_index"),
+            "label": f"п. {clause}" if clause else f"фрагмент {metadata.get('chunk_index', '?')}"
+        }
+
+    def answer(
+            self,
+            query: str,
+            documents: List[Document],
+            key_terms: Optional[List[str]] = None
+    ) -> Optional[ExtractiveAnswer]:
+        """Складання відповіді з найрелевантніших речень (None, якщо контекстів немає)"""
+        candidates, known_scores = [], []
+        for rank, doc in enumerate(documents):
+            if doc.metadata.get("sentence_scores"):
+                scored = self._scored_sentences(doc)
+            else:
+                scored = [(clause, sentence, None) for clause, sentence in self._clause_sentences(doc)]
+            for clause, sentence, score in scored:
+                if len(sentence) >= self.min_sentence_length:
+                    candidates.append((rank, doc, clause, sentence))
+                    known_scores.append(score)
+
+        if not candidates:
+            return None
+
+        sentences = [candidate[-1] for candidate in candidates]
+        terms = self._terms(query, key_terms)
+
+        # Модель оцінює лише речення без оцінки компресора
+        scores = np.asarray([0.0 if score is None else score for score in known_scores], dtype=np.float32)
+        missing = [i for i, score in enumerate(known_scores) if score is None]
+        if missing:
+            missing_scores = score_sentences(query, [sentences[i] for i in missing], self.cross_encoder, self.embeddings)
+            if missing_scores is None:
+                # Без моделі оцінки компресора не доповнити: усі речення оцінюються за збігом термінів
+                scores = self._lexical_scores(terms, sentences)
+            else:
+                scores[missing] = missing_scores
+
+        # За рівних оцінок перевага реченням з вище ранжованих контекстів
+        order = sorted(range(len(candidates)), key=lambda i: (-float(scores[i]), candidates[i][0]))
+
+        lines, citations, seen = [], [], set()
+        for i in order:
+            _, doc, clause, sentence = candidates[i]
+            if sentence in seen:
+                continue
+            seen.add(sentence)
+
+            citation = self._citation(doc, clause)
+            citations.append(citation)
+            lines.append(f"- {self._highlight(sentence, terms)} _({citation['label']}, {citation['source']})_")
+            if len(lines) >= self.max_sentences:
+                break
+
+        return ExtractiveAnswer(text="\n".join([self.HEADER, *lines]), citations=citations)
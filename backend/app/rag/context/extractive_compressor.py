@@ -0,0 +1,137 @@
+import re
+import numpy as np
+from typing import Any, List, Optional, Sequence, Tuple
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from langchain_core.embeddings import Embeddings
+from pydantic import ConfigDict
+
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.;!?])\s+|\n+')
+
+
+def split_sentences(text: str, min_length: int = 15) -> List[str]:
+    """Розбиття тексту на речення (короткі фрагменти приєднуються до попереднього речення)"""
+    sentences: List[str] = []
+    for part in SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and len(part) < min_length:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def score_sentences(
+        query: str,
+        sentences: List[str],
+        cross_encoder: Optional[Any] = None,
+        embeddings: Optional[Embeddings] = None
+) -> Optional[np.ndarray]:
+    """Оцінки релевантності речень запиту: крос-енкодер (одним пакетом) або косинусна схожість вбудовувань"""
+    if not sentences:
+        return None
+
+    if cross_encoder is not None:
+        return np.asarray(cross_encoder.predict([[query, sentence] for sentence in sentences]), dtype=np.float32)
+
+    if embeddings is not None:
+        query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        vectors = np.asarray(embeddings.embed_documents(sentences), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * max(float(np.linalg.norm(query_vector)), 1e-12)
+        return vectors @ query_vector / np.maximum(norms, 1e-12)
+
+    return None
+
+
+def split_header(doc: Document) -> Tuple[str, str]:
+    """Відокремлення рядка-заголовка розділу (LegalStructureSplitter) від тексту чанка"""
+    section, title = doc.metadata.get("section"), doc.metadata.get("section_title")
+    text = doc.page_content
+    if section and title and text.startswith(f"{section}. {title}") and "\n" in text:
+        header, body = text.split("\n", 1)
+        return header, body
+    return "", text
+
+
+class ExtractiveCompressor(BaseDocumentCompressor):
+    """
+    Локальний екстрактивний компресор контекстів (заміна LLMChainFilter без звернень до API)
+
+    Речення кожного документа оцінюються щодо запиту крос-енкодером (одним пакетом для всіх документів)
+    або, якщо його немає, косинусною схожістю вбудовувань. У документі залишаються найкращі речення
+    в межах max_chars у початковому порядку; рядок-заголовок розділу зберігається завжди.
+    Документи, коротші за max_chars, не змінюються
+
+    Оцінки залишених речень зберігаються в metadata["sentence_scores"] (пари [речення, оцінка]),
+    щоб екстрактивна відповідь не оцінювала ті самі речення повторно
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cross_encoder: Optional[Any] = None
+    embeddings: Optional[Embeddings] = None
+    max_chars: int = 600
+    gap_marker: str = " … "
+
+    def compress_documents(
+            self,
+            documents: Sequence[Document],
+            query: str,
+            callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        # Речення всіх довгих документів оцінюються одним пакетом
+        pending = []
+        for i, doc in enumerate(documents):
+            if len(doc.page_content) <= self.max_chars:
+                continue
+            header, body = split_header(doc)
+            sentences = split_sentences(body)
+            if len(sentences) > 1:
+                pending.append((i, header, sentences))
+
+        if not pending:
+            return list(documents)
+
+        all_sentences = [sentence for _, _, sentences in pending for sentence in sentences]
+        scores = score_sentences(query, all_sentences, self.cross_encoder, self.embeddings)
+        if scores is None:
+            return list(documents)
+
+        compressed = list(documents)
+        offset = 0
+        for i, header, sentences in pending:
+            doc_scores = scores[offset:offset + len(sentences)]
+            offset += len(sentences)
+
+            budget = self.max_chars - len(header)
+            kept, length = [], 0
+            for position in np.argsort(-doc_scores):
+                size = len(sentences[position]) + 1
+                if kept and length + size > budget:
+                    continue
+                kept.append(int(position))
+                length += size
+
+            kept.sort()
+            parts = [sentences[kept[0]]]
+            for previous, position in zip(kept, kept[1:]):
+                parts.append((" " if position == previous + 1 else self.gap_marker) + sentences[position])
+            text = "".join(parts)
+
+            doc = documents[i]
+            compressed[i] = Document(
+                id=doc.id,
+                page_content=f"{header}\n{text}" if header else text,
+                metadata={
+                    **doc.metadata,
+                    "compressed": True,
+                    "original_length": len(doc.page_content),
+                    "sentence_scores": [[sentences[position], float(doc_scores[position])] for position in kept]
+                }
+            )
+
+        return compressed
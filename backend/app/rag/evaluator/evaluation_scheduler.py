@@ -0,0 +1,197 @@
+import logging
+import queue
+import random
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+
+from app.rag.evaluator.quality_evaluator import EvaluationCancelled, RAGQualityEvaluator
+from app.tracing import Span, tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EvaluationJob:
+    """Завершений запит, що очікує на оцінку якості"""
+    request_id: str
+    query: str
+    answer: str
+    contexts: List[Document]
+    context_scores: Optional[List[float]] = None
+    trace_parent: Optional[Span] = None
+
+
+class EvaluationScheduler:
+    """
+    Фонова оцінка якості, відокремлена від потоку відповіді
+
+    - завершені трійки (запит, відповідь, контексти) потрапляють в обмежену чергу
+    - оцінюється лише частка запитів (sample_rate) або запити, для яких оцінку явно запитано
+    - якщо черга заповнена, запит не оцінюється (лічильник dropped)
+    - результати доступні за request_id і потрапляють до звіту оцінювача
+    - shutdown перериває оцінки, що виконуються, перед наступним викликом LLM-судді (статус cancelled)
+    """
+
+    def __init__(
+            self,
+            evaluator: RAGQualityEvaluator,
+            sample_rate: float = 0.1,
+            queue_size: int = 100,
+            num_workers: int = 2,
+            results_size: int = 1000
+    ):
+        self.evaluator = evaluator
+        self.sample_rate = sample_rate
+        self.results_size = results_size
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._results: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self.counters = {
+            "submitted": 0,
+            "sampled_out": 0,
+            "dropped": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0
+        }
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"evaluation-worker-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _set_result(self, request_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._results[request_id] = result
+            self._results.move_to_end(request_id)
+            while len(self._results) > self.results_size:
+                self._results.popitem(last=False)
+
+    def submit(
+            self,
+            query: str,
+            answer: str,
+            contexts: List[Document],
+            force: bool = False,
+            context_scores: Optional[List[float]] = None,
+            trace_parent: Optional[Span] = None
+    ) -> Dict[str, Any]:
+        """
+        Постановка запиту в чергу оцінювання
+
+        force=True оминає вибірку (оцінку явно запитано клієнтом);
+        спан оцінки у фоновому потоці стає дочірнім до trace_parent (той самий trace_id, що й у запиту)
+        """
+        self._count("submitted")
+
+        if not force and random.random() >= self.sample_rate:
+            self._count("sampled_out")
+            return {"request_id": None, "status": "sampled_out"}
+
+        job = EvaluationJob(
+            request_id=uuid.uuid4().hex,
+            query=query,
+            answer=answer,
+            contexts=contexts,
+            context_scores=context_scores,
+            trace_parent=trace_parent
+        )
+
+        # Статус встановлюється до постановки в чергу, щоб не перезаписати вже готовий результат
+        self._set_result(job.request_id, {"request_id": job.request_id, "status": "pending"})
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._results.pop(job.request_id, None)
+            self._count("dropped")
+            return {"request_id": None, "status": "dropped"}
+
+        return {"request_id": job.request_id, "status": "pending"}
+
+    def _worker(self):
+        while not self._stopped.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            span = tracer.start_span("evaluation.job", parent=job.trace_parent, attributes={
+                "evaluation.request_id": job.request_id,
+                "evaluation.contexts": len(job.contexts)
+            })
+
+            try:
+                with tracer.use_span(span):
+                    metrics = self.evaluator.evaluate(
+                        query=job.query,
+                        answer=job.answer,
+                        contexts=job.contexts,
+                        cancel_event=self._stopped,
+                        context_scores=job.context_scores
+                    )
+                span.set_attribute("evaluation.overall_score", metrics.overall_score)
+                self._set_result(job.request_id, {
+                    "request_id": job.request_id,
+                    "status": "done",
+                    "metrics": {
+                        "faithfulness": metrics.faithfulness,
+                        "answer_relevancy": metrics.answer_relevancy,
+                        "context_relevancy": metrics.context_relevancy,
+                        "mrr": metrics.mrr,
+                        "map": metrics.map_score,
+                        "overall_score": metrics.overall_score
+                    }
+                })
+                self._count("completed")
+
+            except EvaluationCancelled:
+                span.set_attribute("evaluation.cancelled", True)
+                self._set_result(job.request_id, {"request_id": job.request_id, "status": "cancelled"})
+                self._count("cancelled")
+
+            except Exception as error:
+                span.record_exception(error)
+                with tracer.use_span(span):
+                    logger.error(f"Помилка фонової оцінки якості: {error}")
+                self._set_result(job.request_id, {
+                    "request_id": job.request_id,
+                    "status": "error",
+                    "error": str(error)
+                })
+                self._count("failed")
+
+            finally:
+                span.end()
+                self._queue.task_done()
+
+    def get_result(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Результат оцінки за ідентифікатором запиту"""
+        with self._lock:
+            return self._results.get(request_id)
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "sample_rate": self.sample_rate,
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize
+        }
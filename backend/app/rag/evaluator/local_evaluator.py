@@ -0,0 +1,122 @@
+import logging
+import math
+import re
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import CrossEncoder
+
+from app.config import settings
+from app.rag.evaluator.quality_evaluator import RAGQualityEvaluator
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalQualityEvaluator(RAGQualityEvaluator):
+    """
+    Оцінка якості локальними моделями без викликів LLM-судді
+
+    Метрики:
+    1. Faithfulness - NLI крос-енкодер: частка речень відповіді, що випливають (entailment) з контекстів
+    2. Answer Relevancy - косинусна подібність вбудовувань запиту і відповіді (вже завантажена модель)
+    3. Context Relevancy - оцінки крос-енкодера, отримані під час re-ranking у HybridRetriever.retrieve
+    4-5. MRR і MAP обчислюються так само, як і для LLM-судді
+    """
+
+    SENTENCE_PATTERN = re.compile(r'(?<=[.!?;])\s+|\n+')
+
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            nli_model: str = settings.nli_model,
+            relevance_threshold: float = settings.local_relevance_threshold,
+            max_answer_sentences: int = 20
+    ):
+        super().__init__(llm=None)
+        self.embeddings = embeddings
+        self.relevance_threshold = relevance_threshold
+        self.max_answer_sentences = max_answer_sentences
+
+        self.nli_model = CrossEncoder(nli_model)
+        self.entailment_index = self._find_entailment_index()
+
+    def _find_entailment_index(self) -> int:
+        """Позиція класу entailment у виході NLI-моделі"""
+        id2label = getattr(self.nli_model.config, "id2label", None) or {}
+        for index, label in id2label.items():
+            if "entail" in str(label).lower():
+                return int(index)
+
+        # Типовий порядок класів NLI-моделей: contradiction, entailment, neutral
+        return 1
+
+    def _split_sentences(self, text: str) -> List[str]:
+        sentences = [s.strip() for s in self.SENTENCE_PATTERN.split(text) if len(s.strip()) > 10]
+        return sentences[:self.max_answer_sentences]
+
+    def _evaluate_faithfulness(self, answer: str, contexts: List[str]) -> float:
+        """Середня (за реченнями відповіді) максимальна ймовірність entailment серед контекстів"""
+        if not answer or not contexts:
+            return 0.0
+
+        sentences = self._split_sentences(answer) or [answer]
+
+        try:
+            # Один батч для всіх пар (контекст, речення)
+            pairs = [[context, sentence] for sentence in sentences for context in contexts]
+            probabilities = np.asarray(self.nli_model.predict(pairs, apply_softmax=True))
+            entailment = probabilities[:, self.entailment_index].reshape(len(sentences), len(contexts))
+
+            return float(entailment.max(axis=1).mean())
+
+        except Exception as error:
+            logger.error(f"Помилка при локальній оцінці достовірності відповіді: {error}")
+            return self._overlap_score(answer, "\n\n".join(contexts))
+
+    def _evaluate_answer_relevancy(self, query: str, answer: str) -> float:
+        """Косинусна подібність вбудовувань запиту і відповіді"""
+        if not answer or not query:
+            return 0.0
+
+        try:
+            query_vector, answer_vector = np.asarray(self.embeddings.embed_documents([query, answer]))
+            similarity = self._cosine(query_vector, answer_vector)
+            return max(0.0, min(1.0, similarity))
+
+        except Exception as error:
+            logger.error(f"Помилка при локальній оцінці релевантності відповіді: {error}")
+            return self._overlap_score(query, answer)
+
+    def _evaluate_context_relevancy(
+            self,
+            query: str,
+            contexts: List[str],
+            context_scores: Optional[List[float]] = None
+    ) -> Tuple[List[bool], float]:
+        """
+        Релевантність контекстів за оцінками крос-енкодера з етапу re-ranking
+
+        Логіти крос-енкодера переводяться в [0, 1] сигмоїдою; якщо оцінок немає,
+        використовується косинусна подібність вбудовувань запиту і контекстів
+        """
+        if not contexts or not query:
+            return [], 0.0
+
+        if context_scores is not None and len(context_scores) == len(contexts):
+            relevancy = [self._sigmoid(score) for score in context_scores]
+        else:
+            vectors = np.asarray(self.embeddings.embed_documents([query, *contexts]))
+            relevancy = [max(0.0, self._cosine(vectors[0], vector)) for vector in vectors[1:]]
+
+        individual_relevancy = [score >= self.relevance_threshold for score in relevancy]
+        return individual_relevancy, float(sum(relevancy) / len(relevancy))
+
+    @staticmethod
+    def _sigmoid(score: float) -> float:
+        return 1.0 / (1.0 + math.exp(-float(score)))
+
+    @staticmethod
+    def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+        norm = np.linalg.norm(a) * np.linalg.norm(b)
+        return float(np.dot(a, b) / norm) if norm else 0.0
@@ -1,9 +1,11 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseLLM
 import re
 import json
+import logging
+import threading
 from datetime import datetime
 
 from app.rag.prompts.prompt_templates import (
@@ -11,6 +13,16 @@ from app.rag.prompts.prompt_templates import (
     relevancy_evaluation_prompt,
     context_relevancy_prompt
 )
+from app.rag.prompts.prompt_cache import PromptCacheStats
+from app.rag.cache.verdict_cache import VerdictCache
+from app.tracing import tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationCancelled(Exception):
+    """Оцінку якості скасовано до завершення (зупинка EvaluationScheduler)"""
 
 
 @dataclass
@@ -41,15 +53,20 @@ class RAGQualityEvaluator:
     5. MAP - Mean Average Precision
     """
     
-    def __init__(self, llm: BaseLLM):
+    def __init__(self, llm: BaseLLM, verdict_cache: Optional[VerdictCache] = None):
         self.llm = llm
+        self.verdict_cache = verdict_cache
+        self.judge_model = getattr(getattr(llm, "client", llm), "model_name", None) or type(llm).__name__
         self.evaluation_history: List[EvaluationMetrics] = []
+        self.prompt_cache_stats = PromptCacheStats()
     
     def evaluate(
         self,
         query: str,
         answer: str,
-        contexts: List[Document]
+        contexts: List[Document],
+        cancel_event: Optional[threading.Event] = None,
+        context_scores: Optional[List[float]] = None
     ) -> EvaluationMetrics:
         """
         Оцінка якості відповіді RAG-системи
@@ -58,14 +75,27 @@ class RAGQualityEvaluator:
             query: запит користувача
             answer: згенерована відповідь
             contexts: отримані контексти
+            cancel_event: подія скасування, що перевіряється перед кожним LLM-викликом
+            context_scores: оцінки крос-енкодера для контекстів (використовуються локальною оцінкою)
         
         Повертає об'єкт EvaluationMetrics з усіма оцінками якості відповіді
         """
         context_texts = [doc.page_content for doc in contexts]
 
-        faithfulness = self._evaluate_faithfulness(answer, context_texts)
-        answer_relevancy = self._evaluate_answer_relevancy(query, answer)
-        individual_relevancy, context_relevancy = self._evaluate_context_relevancy(query, context_texts)
+        self._raise_if_cancelled(cancel_event)
+        with tracer.span("evaluator.faithfulness") as span:
+            faithfulness = self._evaluate_faithfulness(answer, context_texts)
+            span.set_attribute("evaluator.score", faithfulness)
+        self._raise_if_cancelled(cancel_event)
+        with tracer.span("evaluator.answer_relevancy") as span:
+            answer_relevancy = self._evaluate_answer_relevancy(query, answer)
+            span.set_attribute("evaluator.score", answer_relevancy)
+        self._raise_if_cancelled(cancel_event)
+        with tracer.span("evaluator.context_relevancy", attributes={"evaluator.contexts": len(context_texts)}) as span:
+            individual_relevancy, context_relevancy = self._evaluate_context_relevancy(
+                query, context_texts, context_scores
+            )
+            span.set_attribute("evaluator.score", context_relevancy)
 
         mrr = self._calculate_mrr(context_texts, individual_relevancy)
         map_score = self._calculate_map(context_texts, individual_relevancy)
@@ -96,6 +126,39 @@ class RAGQualityEvaluator:
 
         return metrics
     
+    @staticmethod
+    def _raise_if_cancelled(cancel_event: Optional[threading.Event]):
+        """Переривання оцінки, якщо її було скасовано"""
+        if cancel_event is not None and cancel_event.is_set():
+            raise EvaluationCancelled()
+
+    def _invoke(self, messages: List[Any], metric: str, parse: Callable[[str], Any]) -> Any:
+        """
+        Виклик LLM-судді з обліком кешованих токенів запиту; повертає розібраний вердикт parse(verdict)
+
+        Вердикт для вже оціненого вмісту береться з постійного кешу без виклику LLM.
+        До кешу потрапляють лише вердикти, які parse розпізнав (без винятку ValueError),
+        тож некоректна відповідь судді не повторюватиметься з кешу до завершення TTL
+        """
+        with tracer.span("evaluator.judge", kind="CLIENT", attributes={"evaluator.metric": metric}) as span:
+            key = None
+            if self.verdict_cache:
+                key = VerdictCache.make_key(metric, self.judge_model, [message.content for message in messages])
+                verdict = self.verdict_cache.get(key)
+                span.set_attribute("evaluator.cache_hit", verdict is not None)
+                if verdict is not None:
+                    return parse(verdict)
+
+            response = self.llm.invoke(messages)
+            self.prompt_cache_stats.record_response(response)
+            verdict = response.content.strip()
+            result = parse(verdict)
+
+            if key is not None:
+                self.verdict_cache.put(key, metric, self.judge_model, verdict)
+
+            return result
+
     def _evaluate_faithfulness(self, answer: str, contexts: List[str]) -> float:
         """Оцінка достовірності відповіді на основі отриманого контексту"""
         if not answer or not contexts:
@@ -103,18 +166,17 @@ class RAGQualityEvaluator:
 
         combined_context = "\n\n".join(contexts)
 
-        prompt = faithfulness_evaluation_prompt.format(
+        prompt = faithfulness_evaluation_prompt.format_messages(
             context=combined_context,
             answer=answer
         )
         
         try:
-            response = self.llm.invoke(prompt).content.strip()
-            score = self._extract_score(response)
+            score = self._invoke(prompt, "faithfulness", self._extract_score)
             return max(0.0, min(1.0, score))
 
         except Exception as error:
-            print(f"Помилка при оцінці достовірності відповіді системи: {error}")
+            logger.error(f"Помилка при оцінці достовірності відповіді системи: {error}")
 
             return self._overlap_score(answer, combined_context)
     
@@ -123,21 +185,25 @@ class RAGQualityEvaluator:
         if not answer or not query:
             return 0.0
         
-        prompt = relevancy_evaluation_prompt.format(
+        prompt = relevancy_evaluation_prompt.format_messages(
             query=query,
             answer=answer
         )
         
         try:
-            response = self.llm.invoke(prompt).content.strip()
-            score = self._extract_score(response)
+            score = self._invoke(prompt, "answer_relevancy", self._extract_score)
             return max(0.0, min(1.0, score))
 
         except Exception as error:
-            print(f"Помилка при оцінці релевантності відповіді на запит: {error}")
+            logger.error(f"Помилка при оцінці релевантності відповіді на запит: {error}")
             return self._overlap_score(query, answer)
 
-    def _evaluate_context_relevancy(self, query: str, contexts: List[str]) -> Tuple[List[bool], float]:
+    def _evaluate_context_relevancy(
+            self,
+            query: str,
+            contexts: List[str],
+            context_scores: Optional[List[float]] = None
+    ) -> Tuple[List[bool], float]:
         """
         Оцінка релевантності отриманих контекстів на запит
         Виконується батч-оцінка: один LLM-запит використовується для оцінки всіх фрагментів окремо і загалом
@@ -147,23 +213,22 @@ class RAGQualityEvaluator:
 
         # Підготовка батч-запиту
         batch_context = "\n\n".join([f"Контекст {i + 1}.\n{ctx}" for i, ctx in enumerate(contexts)])
-        prompt = context_relevancy_prompt.format(
+        prompt = context_relevancy_prompt.format_messages(
             query=query,
             context=batch_context
         )
 
         try:
-            response = self.llm.invoke(prompt).content.strip()
-            parsed = json.loads(response)
+            parsed = self._invoke(prompt, "context_relevancy", self._parse_context_verdict)
             individual_relevancy = parsed.get('individual_score', [False] * len(contexts))
-            overall_relevancy = parsed.get('overall_score', 0.0)
+            overall_relevancy = parsed['overall_score']
 
             return individual_relevancy, max(0.0, min(1.0, overall_relevancy))
 
         except Exception as error:
-            print(f"Помилка при оцінці релевантності отриманих контекстів: {error}")
+            logger.error(f"Помилка при оцінці релевантності отриманих контекстів: {error}")
 
-            return sum(self._overlap_score(query, ctx) for ctx in contexts) / len(contexts)
+            return [False] * len(contexts), sum(self._overlap_score(query, ctx) for ctx in contexts) / len(contexts)
 
     def _calculate_mrr(self, retrieved_docs: List[Document], individual_relevancy: List[bool]) -> float:
         """
@@ -196,8 +261,18 @@ class RAGQualityEvaluator:
                 precision_sum += relevant_count / i
         return precision_sum / total_relevant
     
+    @staticmethod
+    def _parse_context_verdict(text: str) -> Dict[str, Any]:
+        """Розбір JSON-вердикту релевантності контекстів (ValueError, якщо формат некоректний)"""
+        parsed = json.loads(text)
+        if not isinstance(parsed, dict) or not isinstance(parsed.get('overall_score'), (int, float)):
+            raise ValueError(f"некоректний вердикт релевантності контекстів: '{text[:100]}'")
+        if not isinstance(parsed.get('individual_score', []), list):
+            raise ValueError(f"некоректний список individual_score: '{text[:100]}'")
+        return parsed
+
     def _extract_score(self, text: str) -> float:
-        """Отримання числової оцінки з тексту відповіді"""
+        """Отримання числової оцінки з тексту відповіді (ValueError, якщо оцінку не розпізнано)"""
         text = text.strip()
 
         # Шукаємо найбільш ймовірне число
@@ -228,9 +303,8 @@ class RAGQualityEvaluator:
             except ValueError:
                 pass
         
-        # Встановлюємо нульове значення, якщо не змогли розпізнати відповідь
-        print(f"Попередження: не вдалося розпізнати оцінку в тексті: '{text[:100]}'")
-        return 0.0
+        # Нерозпізнаний вердикт не кешується, а оцінка обчислюється запасним способом
+        raise ValueError(f"не вдалося розпізнати оцінку в тексті: '{text[:100]}'")
     
     def _overlap_score(self, text1: str, text2: str) -> float:
         """Оцінка перетину слів"""
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+QUERY_TIME = "query_time"
+RETRIEVER_REBUILD = "retriever_rebuild"
+RECHUNK = "rechunk"
+
+# Обсяг роботи, потрібний для застосування кожного параметра
+PARAMETER_SCOPES = {
+    "rerank_top_k": QUERY_TIME, # зріз після re-ranking
+    "bm25_weight": QUERY_TIME, # ваги злиття в EnsembleRetriever
+    "vector_weight": QUERY_TIME,
+    "top_k": RETRIEVER_REBUILD, # кількість кандидатів BM25 і векторного ретриверів
+    "chunk_size": RECHUNK, # потрібне повторне розбиття і нова колекція
+    "chunk_overlap": RECHUNK
+}
+
+
+@dataclass
+class ChangePlan:
+    """План застосування зміни параметрів"""
+    query_time: Dict[str, Any] = field(default_factory=dict)
+    retriever_rebuild: Dict[str, Any] = field(default_factory=dict)
+    rechunk: Dict[str, Any] = field(default_factory=dict)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def scope(self) -> Optional[str]:
+        """Найширший обсяг роботи в плані"""
+        if self.rechunk:
+            return RECHUNK
+        if self.retriever_rebuild:
+            return RETRIEVER_REBUILD
+        if self.query_time:
+            return QUERY_TIME
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "scope": self.scope,
+            QUERY_TIME: self.query_time,
+            RETRIEVER_REBUILD: self.retriever_rebuild,
+            RECHUNK: self.rechunk,
+            "unchanged": self.unchanged
+        }
+
+
+def plan_parameter_changes(current: Dict[str, Any], requested: Dict[str, Any]) -> ChangePlan:
+    """Класифікація змінених параметрів за обсягом роботи"""
+    plan = ChangePlan()
+
+    for name, value in requested.items():
+        if value is None:
+            continue
+
+        if current.get(name) == value:
+            plan.unchanged.append(name)
+            continue
+
+        scope = PARAMETER_SCOPES.get(name, RETRIEVER_REBUILD)
+        getattr(plan, scope)[name] = value
+
+    return plan
+
+
+class IndexGenerations:
+    """
+    Облік поколінь індексу (колекцій Chroma з різними параметрами розбиття)
+
+    Покоління 0 - базова колекція settings.collection_name, покоління n > 0 - колекція "<назва>_g<n>".
+    Живе покоління зберігається у файлі поруч зі сховищем, тож після перезапуску
+    завантажується саме та колекція, що була активною
+    """
+
+    def __init__(self, persist_directory: str, base_collection_name: str):
+        self.base_collection_name = base_collection_name
+        self.state_path = os.path.join(persist_directory, "index_generation.json")
+        self._lock = threading.Lock()
+
+    def collection_name(self, generation: int) -> str:
+        return self.base_collection_name if generation == 0 else f"{self.base_collection_name}_g{generation}"
+
+    def load(self) -> Dict[str, Any]:
+        """Стан живого покоління (порожній словник, якщо файл відсутній)"""
+        if not os.path.exists(self.state_path):
+            return {}
+
+        try:
+            with open(self.state_path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            logger.warning(f"Не вдалося прочитати стан поколінь індексу: {error}")
+            return {}
+
+    def save(self, generation: int, chunk_size: int, chunk_overlap: int, num_chunks: int):
+        """Атомарний запис живого покоління"""
+        state = {
+            "generation": generation,
+            "collection_name": self.collection_name(generation),
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "num_chunks": num_chunks,
+            "activated_at": datetime.now().isoformat()
+        }
+
+        with self._lock:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            temporary_path = f"{self.state_path}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(state, file, ensure_ascii=False, indent=2)
+            os.replace(temporary_path, self.state_path)
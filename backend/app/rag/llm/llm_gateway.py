@@ -0,0 +1,363 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+import openai
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from app.config import settings
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Виклик LLM не вклався у встановлений дедлайн"""
+
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+    LLMDeadlineExceeded
+)
+
+
+class LLMLane:
+    """
+    Окрема смуга викликів LLM зі своїм пулом з'єднань
+
+    Можливості:
+    - дедлайни: час до першого токена і загальний час відповіді
+    - повтори з експоненційною затримкою та повним jitter (лише до отримання першого токена)
+    - hedged-запити: паралельний дублікат запиту, якщо перший токен не надійшов за заданий час
+    - обмеження кількості одночасних синхронних викликів
+    """
+
+    def __init__(
+            self,
+            name: str,
+            client: BaseChatModel,
+            first_token_timeout: float = 20.0,
+            request_timeout: float = 60.0,
+            max_retries: int = 2,
+            retry_base_delay: float = 0.5,
+            retry_max_delay: float = 8.0,
+            hedge_after: float = 0.0,
+            max_concurrency: Optional[int] = None
+    ):
+        self.name = name
+        self.client = client
+        self.first_token_timeout = first_token_timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_after = hedge_after
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "deadline_exceeded": 0,
+            "hedged": 0,
+            "hedge_wins": 0
+        }
+
+    def _count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Експоненційна затримка з повним jitter"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        return attempt < self.max_retries and isinstance(error, RETRYABLE_ERRORS)
+
+    def invoke(self, messages: Any, **kwargs) -> Any:
+        """
+        Синхронний виклик з повторами (для потоків Thread Pool)
+
+        Синхронний виклик не перервати посередині, тож загальний дедлайн request_timeout перевіряється
+        перед кожною спробою: очікування місця в смузі і повтор не починаються, якщо часу не лишилося
+        """
+        self._count("calls")
+        deadline = time.monotonic() + self.request_timeout
+
+        attempt = 0
+        while True:
+            try:
+                return self._invoke_once(messages, deadline, **kwargs)
+
+            except Exception as error:
+                if isinstance(error, openai.APITimeoutError):
+                    self._count("deadline_exceeded")
+                if not self._should_retry(error, attempt):
+                    self._count("errors")
+                    raise
+
+                delay = self._backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    self._count("deadline_exceeded")
+                    self._count("errors")
+                    raise LLMDeadlineExceeded(
+                        f"LLM ({self.name}) не відповіла за {self.request_timeout} с (спроб: {attempt + 1})"
+                    ) from error
+
+                self._count("retries")
+                time.sleep(delay)
+                attempt += 1
+
+    def _invoke_once(self, messages: Any, deadline: float, **kwargs) -> Any:
+        """Одна спроба синхронного виклику (очікування місця в смузі обмежене дедлайном)"""
+        if not self._semaphore:
+            return self.client.invoke(messages, **kwargs)
+
+        if not self._semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMDeadlineExceeded(f"LLM ({self.name}): смуга не звільнилася до дедлайну")
+        try:
+            return self.client.invoke(messages, **kwargs)
+        finally:
+            self._semaphore.release()
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        """Асинхронний виклик із загальним дедлайном і повторами"""
+        self._count("calls")
+
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(self.client.ainvoke(messages, **kwargs), self.request_timeout)
+
+            except asyncio.TimeoutError:
+                self._count("deadline_exceeded")
+                error = LLMDeadlineExceeded(f"LLM ({self.name}) не відповіла за {self.request_timeout} с")
+                if not self._should_retry(error, attempt):
+                    self._count("errors")
+                    raise error
+            except Exception as error:
+                if not self._should_retry(error, attempt):
+                    self._count("errors")
+                    raise
+
+            self._count("retries")
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def _open_stream(self, messages: Any, **kwargs) -> Tuple[AsyncIterator[Any], Optional[Any]]:
+        """
+        Відкриття потоку до отримання першого фрагмента
+
+        Якщо перший фрагмент не надійшов за hedge_after секунд, запускається дублікат запиту;
+        використовується потік, що першим повернув фрагмент, інший закривається
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first_token_deadline = started + self.first_token_timeout
+        hedge_at = started + self.hedge_after if self.hedge_after > 0 else None
+
+        pending: Dict[asyncio.Future, AsyncIterator[Any]] = {}
+        is_hedge: Dict[asyncio.Future, bool] = {}
+
+        def launch(hedge: bool):
+            stream = self.client.astream(messages, **kwargs)
+            task = asyncio.ensure_future(stream.__anext__())
+            pending[task] = stream
+            is_hedge[task] = hedge
+
+        launch(hedge=False)
+        last_error: Optional[Exception] = None
+
+        try:
+            while pending:
+                now = loop.time()
+                if now >= first_token_deadline:
+                    raise LLMDeadlineExceeded(
+                        f"LLM ({self.name}) не повернула перший токен за {self.first_token_timeout} с"
+                    )
+
+                wake_at = first_token_deadline
+                if hedge_at is not None:
+                    wake_at = min(wake_at, hedge_at)
+
+                done, _ = await asyncio.wait(
+                    set(pending), timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    stream = pending.pop(task)
+                    try:
+                        chunk = task.result()
+                    except StopAsyncIteration:
+                        chunk = None
+                    except Exception as error:
+                        last_error = error
+                        await stream.aclose()
+                        continue
+
+                    if is_hedge[task]:
+                        self._count("hedge_wins")
+                    return stream, chunk
+
+                if hedge_at is not None and loop.time() >= hedge_at and pending:
+                    hedge_at = None
+                    self._count("hedged")
+                    launch(hedge=True)
+
+            raise last_error
+
+        finally:
+            # Закриття потоків, що програли
+            for task, stream in pending.items():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+                await stream.aclose()
+
+    async def astream(self, messages: Any, **kwargs) -> AsyncIterator[Any]:
+        """Потокова генерація з дедлайнами, повторами та hedged-запитами"""
+        self._count("calls")
+        loop = asyncio.get_running_loop()
+
+        attempt = 0
+        while True:
+            try:
+                stream, first_chunk = await self._open_stream(messages, **kwargs)
+                break
+            except Exception as error:
+                if isinstance(error, LLMDeadlineExceeded):
+                    self._count("deadline_exceeded")
+                if not self._should_retry(error, attempt):
+                    self._count("errors")
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+        deadline = loop.time() + self.request_timeout
+
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), max(0.0, remaining))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self._count("deadline_exceeded")
+                    self._count("errors")
+                    raise LLMDeadlineExceeded(f"LLM ({self.name}) не завершила відповідь за {self.request_timeout} с")
+
+                yield chunk
+
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "first_token_timeout": self.first_token_timeout,
+            "request_timeout": self.request_timeout,
+            "max_retries": self.max_retries,
+            "hedge_after": self.hedge_after
+        }
+
+
+class LLMGateway:
+    """
+    Шлюз до LLM з окремими пулами з'єднань для інтерактивної генерації та фонових задач
+
+    - interactive: генерація відповідей і валідація запитів (потокова, з hedged-запитами)
+    - background: оцінка якості (менший пул і обмежена кількість одночасних викликів)
+
+    Параметр base_url дозволяє спрямувати виклики на локальний OpenAI-сумісний сервер-заглушку
+    """
+
+    def __init__(
+            self,
+            model: str = settings.llm_model,
+            api_key: str = settings.openai_api_key,
+            base_url: Optional[str] = settings.llm_base_url
+    ):
+        self.model = model
+        self.base_url = base_url
+
+        self.interactive = LLMLane(
+            name="interactive",
+            client=self._create_client(
+                api_key=api_key,
+                max_connections=settings.llm_interactive_max_connections,
+                read_timeout=settings.llm_first_token_timeout,
+                streaming=True
+            ),
+            first_token_timeout=settings.llm_first_token_timeout,
+            request_timeout=settings.llm_request_timeout,
+            max_retries=settings.llm_max_retries,
+            retry_base_delay=settings.llm_retry_base_delay,
+            hedge_after=settings.llm_hedge_after
+        )
+
+        self.background = LLMLane(
+            name="background",
+            client=self._create_client(
+                api_key=api_key,
+                max_connections=settings.llm_background_max_connections,
+                read_timeout=settings.llm_background_timeout,
+                streaming=False
+            ),
+            first_token_timeout=settings.llm_background_timeout,
+            request_timeout=settings.llm_background_timeout,
+            max_retries=settings.llm_max_retries,
+            retry_base_delay=settings.llm_retry_base_delay,
+            max_concurrency=settings.llm_background_max_connections
+        )
+
+    def _create_client(
+            self,
+            api_key: str,
+            max_connections: int,
+            read_timeout: float,
+            streaming: bool
+    ) -> ChatOpenAI:
+        """Створення клієнта з власним пулом з'єднань і таймаутами"""
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        timeout = httpx.Timeout(
+            connect=settings.llm_connect_timeout,
+            read=read_timeout,
+            write=settings.llm_connect_timeout,
+            pool=settings.llm_connect_timeout
+        )
+
+        return ChatOpenAI(
+            model=self.model,
+            temperature=0.0,
+            openai_api_key=api_key,
+            base_url=self.base_url,
+            streaming=streaming,
+            stream_usage=True,
+            max_retries=0,
+            timeout=timeout,
+            http_client=httpx.Client(limits=limits, timeout=timeout),
+            http_async_client=httpx.AsyncClient(limits=limits, timeout=timeout)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "interactive": self.interactive.stats(),
+            "background": self.background.stats()
+        }
@@ -0,0 +1,48 @@
+import threading
+from typing import Any, Dict, Optional
+
+
+class PromptCacheStats:
+    """
+    Облік кешованих токенів запиту за метаданими відповіді провайдера LLM
+
+    Провайдер повідомляє кількість токенів префікса, отриманих з кешу, у usage_metadata
+    (input_token_details.cache_read), що дозволяє перевірити ефективність кешування префікса
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    @staticmethod
+    def cached_tokens(usage_metadata: Optional[Dict[str, Any]]) -> int:
+        """Кількість кешованих токенів запиту в метаданих відповіді"""
+        if not usage_metadata:
+            return 0
+
+        details = usage_metadata.get("input_token_details") or {}
+        return details.get("cache_read", 0) or 0
+
+    def record(self, usage_metadata: Optional[Dict[str, Any]]):
+        """Облік метаданих одного виклику LLM"""
+        if not usage_metadata:
+            return
+
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage_metadata.get("input_tokens", 0) or 0
+            self.cached_prompt_tokens += self.cached_tokens(usage_metadata)
+
+    def record_response(self, response: Any):
+        """Облік відповіді LLM (AIMessage)"""
+        self.record(getattr(response, "usage_metadata", None))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cached_ratio": self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        }
@@ -1,4 +1,4 @@
-from langchain_core.prompts import PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
 from typing import Dict, List
 
 
@@ -11,10 +11,13 @@ class PromptTemplates:
     - Structured output formatting
     - Role-based prompting з чіткими обмеженнями
     - Застосування принципів Constitutional AI
+
+    Кожен шаблон складається зі статичного системного повідомлення та змінного повідомлення користувача.
+    Незмінний префікс запиту дозволяє провайдеру LLM повторно використовувати кешовані токени
     """
     
     @staticmethod
-    def get_answer_generation_prompt() -> PromptTemplate:
+    def get_answer_generation_prompt() -> ChatPromptTemplate:
         """
         Запит для генерації відповідей
         
@@ -24,7 +27,7 @@ class PromptTemplates:
         - Strict output constraints
         - Механізм self-verification
         """
-        template = """Ви - експертна AI-система для роботи з нормативними документами Київського національного університету імені Тараса Шевченка.
+        system_template = """Ви - експертна AI-система для роботи з нормативними документами Київського національного університету імені Тараса Шевченка.
 
 КРИТИЧНО ВАЖЛИВІ ПРАВИЛА (ПОРУШЕННЯ НЕПРИПУСТИМЕ):
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -35,12 +38,6 @@ class PromptTemplates:
 5. ОБОВ'ЯЗКОВО цитувати конкретні пункти/розділи документів
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-НАДАНИЙ КОНТЕКСТ З ДОКУМЕНТІВ:
-{context}
-
-ЗАПИТАННЯ КОРИСТУВАЧА:
-{question}
-
 ІНСТРУКЦІЇ ДЛЯ ФОРМУВАННЯ ВІДПОВІДІ (ВИКОНУВАТИ ПОКРОКОВО):
 
 Крок 1 - АНАЛІЗ РЕЛЕВАНТНОСТІ:
@@ -117,30 +114,31 @@ class PromptTemplates:
 ✓ "У [назва документа] зазначено..."
 ✓ "Відповідно до пункту X.X..."
 ✓ "Документ встановлює..."
+"""
+
+        human_template = """НАДАНИЙ КОНТЕКСТ З ДОКУМЕНТІВ:
+{context}
+
+ЗАПИТАННЯ КОРИСТУВАЧА:
+{question}
 
 ТЕПЕР СФОРМУЙТЕ ВІДПОВІДЬ, ДОТРИМУЮЧИСЬ УСІХ ПРАВИЛ:"""
 
-        return PromptTemplate(
-            template=template,
-            input_variables=["context", "question"]
-        )
+        return ChatPromptTemplate.from_messages([
+            ("system", system_template),
+            ("human", human_template)
+        ])
     
     
     @staticmethod
-    def get_faithfulness_evaluation_prompt() -> PromptTemplate:
+    def get_faithfulness_evaluation_prompt() -> ChatPromptTemplate:
         """
         Запит для оцінки достовірності відповіді
         """
-        template = """Ви - експертна система оцінки якості AI-відповідей.
+        system_template = """Ви - експертна система оцінки якості AI-відповідей.
 
 ЗАВДАННЯ: оцініть наскільки відповідь обґрунтовано наданим контекстом.
 
-КОНТЕКСТ З ДОКУМЕНТІВ:
-{context}
-
-ВІДПОВІДЬ ДЛЯ ПЕРЕВІРКИ:
-{answer}
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 ІНСТРУКЦІЯ З ОЦІНЮВАННЯ:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -167,30 +165,30 @@ class PromptTemplates:
 - Суперечність контексту → оцінка 0.0
 
 ФОРМАТ ВІДПОВІДІ:
-Поверніть ЛИШЕ число від 0.0 до 1.0 (наприклад: 0.6)
+Поверніть ЛИШЕ число від 0.0 до 1.0 (наприклад: 0.6)"""
+
+        human_template = """КОНТЕКСТ З ДОКУМЕНТІВ:
+{context}
+
+ВІДПОВІДЬ ДЛЯ ПЕРЕВІРКИ:
+{answer}
 
 Оцінка:"""
 
-        return PromptTemplate(
-            template=template,
-            input_variables=["context", "answer"]
-        )
+        return ChatPromptTemplate.from_messages([
+            ("system", system_template),
+            ("human", human_template)
+        ])
     
     @staticmethod
-    def get_relevancy_evaluation_prompt() -> PromptTemplate:
+    def get_relevancy_evaluation_prompt() -> ChatPromptTemplate:
         """
         Запит для оцінки релевантності відповіді на запит
         """
-        template = """Ви - експертна система оцінки релевантності AI-відповідей.
+        system_template = """Ви - експертна система оцінки релевантності AI-відповідей.
 
 ЗАВДАННЯ: оцініть РЕЛЕВАНТНІСТЬ відповіді до запиту користувача.
 
-ЗАПИТ КОРИСТУВАЧА:
-{query}
-
-ОТРИМАНА ВІДПОВІДЬ:
-{answer}
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 ПОКРОКОВА ОЦІНКА:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -215,31 +213,31 @@ class PromptTemplates:
 
 ФОРМАТ ВІДПОВІДІ:
 Поверніть ЛИШЕ число від 0.0 до 1.0 (наприклад: 0.6)
-БЕЗ пояснень, БЕЗ додаткового тексту
+БЕЗ пояснень, БЕЗ додаткового тексту"""
+
+        human_template = """ЗАПИТ КОРИСТУВАЧА:
+{query}
+
+ОТРИМАНА ВІДПОВІДЬ:
+{answer}
 
 Оцінка:"""
 
-        return PromptTemplate(
-            template=template,
-            input_variables=["query", "answer"]
-        )
+        return ChatPromptTemplate.from_messages([
+            ("system", system_template),
+            ("human", human_template)
+        ])
     
     @staticmethod
-    def get_context_relevancy_evaluation_prompt() -> PromptTemplate:
+    def get_context_relevancy_evaluation_prompt() -> ChatPromptTemplate:
         """
         Запит для оцінки релевантності контексту
         """
 
-        template = """Ви - система оцінки якості пошуку інформації.
+        system_template = """Ви - система оцінки якості пошуку інформації.
 
 ЗАВДАННЯ: визначте, чи може цей контекст допомогти відповісти на запит.
 
-ЗАПИТ КОРИСТУВАЧА:
-{query}
-
-ЗНАЙДЕНИЙ КОНТЕКСТ:
-{context}
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 КРИТЕРІЇ ОЦІНЮВАННЯ:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -268,26 +266,30 @@ class PromptTemplates:
 перший елемент масива представляє оцінку першого контекста, другий елемент - другого контекста, третій елемент - третього контекста, і так 
 до останнього контексту
 - атрибут overall_score, значенням якого є значення типу float, що представляє ЗАГАЛЬНУ релевантність ВСЬОГО контексту, причому 
-його значення МАЄ бути від 0.0 до 1.0
+його значення МАЄ бути від 0.0 до 1.0"""
+
+        human_template = """ЗАПИТ КОРИСТУВАЧА:
+{query}
+
+ЗНАЙДЕНИЙ КОНТЕКСТ:
+{context}
 
 Відповідь:"""
 
-        return PromptTemplate(
-            template=template,
-            input_variables=["query", "context"]
-        )
+        return ChatPromptTemplate.from_messages([
+            ("system", system_template),
+            ("human", human_template)
+        ])
     
     @staticmethod
-    def get_ethics_check_prompt() -> PromptTemplate:
+    def get_ethics_check_prompt() -> ChatPromptTemplate:
         """
         Запит для перевірки запиту на етичність
         """
-        template = """Ви - система модерації для академічної платформи Київського національного університету імені Тараса Шевченка.
+        system_template = """Ви - система модерації для академічної платформи Київського національного університету імені Тараса Шевченка.
 
 ЗАВДАННЯ: визначте, чи є запит етичним.
 
-ЗАПИТ: "{query}"
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 НЕПРИЙНЯТНІ ТЕМИ (АВТОМАТИЧНО НЕЕТИЧНИЙ):
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -325,26 +327,26 @@ class PromptTemplates:
 ФОРМАТ ВІДПОВІДІ:
 Поверніть ЛИШЕ одне слово:
 - ЕТИЧНИЙ
-- НЕЕТИЧНИЙ
+- НЕЕТИЧНИЙ"""
+
+        human_template = """ЗАПИТ: "{query}"
 
 Відповідь:"""
 
-        return PromptTemplate(
-            template=template,
-            input_variables=["query"]
-        )
+        return ChatPromptTemplate.from_messages([
+            ("system", system_template),
+            ("human", human_template)
+        ])
     
     @staticmethod
-    def get_relevance_check_prompt() -> PromptTemplate:
+    def get_relevance_check_prompt() -> ChatPromptTemplate:
         """
         Запит для перевірки релевантності запиту до нормативних документів Київського національного університету імені Тараса Шевченка
         """
-        template = """Ви - система фільтрації запитів для бази нормативних документів Київського національного університету імені Тараса Шевченка.
+        system_template = """Ви - система фільтрації запитів для бази нормативних документів Київського національного університету імені Тараса Шевченка.
 
 ЗАВДАННЯ: визначте, чи є запит релевантним.
 
-ЗАПИТ: "{query}"
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 РЕЛЕВАНТНІ ЗАПИТИ (стосуються документів):
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -393,14 +395,16 @@ class PromptTemplates:
 ФОРМАТ ВІДПОВІДІ:
 Поверніть ЛИШЕ одне слово:
 - РЕЛЕВАНТНИЙ
-- НЕРЕЛЕВАНТНИЙ
+- НЕРЕЛЕВАНТНИЙ"""
+
+        human_template = """ЗАПИТ: "{query}"
 
 Відповідь:"""
 
-        return PromptTemplate(
-            template=template,
-            input_variables=["query"]
-        )
+        return ChatPromptTemplate.from_messages([
+            ("system", system_template),
+            ("human", human_template)
+        ])
 
 
 # Глобальні екземпляри для використання в коді
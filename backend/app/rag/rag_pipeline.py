@@ -3,19 +3,39 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional, AsyncIterator
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-import pypdf
 import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import partial
 from concurrent.futures import ThreadPoolExecutor
 
 from app.config import settings
-from app.rag.retriever.hybrid_retriever import HybridRetriever
+from app.rag.retriever.hybrid_retriever import HybridRetriever, RetrievalResult, context_id, index_storage_paths
 from app.rag.evaluator.quality_evaluator import RAGQualityEvaluator
+from app.rag.evaluator.evaluation_scheduler import EvaluationScheduler
+from app.rag.evaluator.local_evaluator import LocalQualityEvaluator
 from app.rag.validator.query_validator import QueryValidator
 from app.rag.prompts.prompt_templates import answer_generation_prompt
 from app.rag.splitter.custom_splitter import HybridLegalDocumentSplitter
+from app.rag.cache.retrieval_cache import RetrievalCache, normalize_query
+from app.rag.cache.single_flight import SingleFlight
+from app.rag.cache.verdict_cache import VerdictCache
+from app.rag.cache.corpus_cache import ExtractedTextCache, PersistentEmbeddings
+from app.rag.index.change_planner import IndexGenerations, plan_parameter_changes
+from app.rag.context.context_packer import ContextPacker
+from app.rag.context.extractive_answer import ExtractiveAnswer, ExtractiveAnswerer
+from app.rag.prompts.prompt_cache import PromptCacheStats
+from app.rag.llm.llm_gateway import LLMGateway, RETRYABLE_ERRORS
+from app.profiling import ProfileSession, profiled_call, profiled_section
+from app.tracing import Span, tracer
+
+
+logger = logging.getLogger(__name__)
 
 
 class RAGPipeline:
@@ -48,30 +68,84 @@ class RAGPipeline:
         self.use_llm_compression = use_llm_compression
         self.cross_encoder_model = settings.cross_encoder_model
 
+        # Живе покоління індексу: колекція і параметри розбиття, з якими її побудовано
+        self.index_generations = IndexGenerations(self.persist_directory, settings.collection_name)
+        live_index = self.index_generations.load()
+        self.index_generation = live_index.get("generation", 0)
+        self.collection_name = self.index_generations.collection_name(self.index_generation)
+        self.chunk_size = live_index.get("chunk_size", self.chunk_size)
+        self.chunk_overlap = live_index.get("chunk_overlap", self.chunk_overlap)
+
+        # Стан фонової перебудови індексу
+        self._index_lock = threading.Lock()
+        self._rechunk_target = None
+        self._rechunk_running = False
+        self.rebuild_status: Dict[str, Any] = {"state": "idle"}
+
         # Thread Pool для асинхронних задач
         self.executor = ThreadPoolExecutor(max_workers=2)
 
+        # Лічильники роботи, скасованої через від'єднання клієнта
+        self.cancellation_stats = {
+            "streams_cancelled": 0,
+            "retrievals_cancelled": 0,
+            "generations_cancelled": 0
+        }
+
+        # Лічильники екстрактивних відповідей (попередній перегляд і резервна відповідь)
+        self.extractive_stats = {
+            "previews": 0,
+            "fallbacks": 0
+        }
+
         # Ініціалізація вбудовувань
-        print("Ініціалізація вбудовувань...")
+        logger.info("Ініціалізація вбудовувань...")
         self.embeddings = HuggingFaceEmbeddings(
             model_name=settings.embedding_model,
             model_kwargs={'device': 'cpu'},
             encode_kwargs={'normalize_embeddings': True}
         )
 
-        # Ініціалізація LLM
-        print("Ініціалізація LLM...")
-        self.llm = ChatOpenAI(
-            model=settings.llm_model,
-            temperature=0.0,
-            openai_api_key=settings.openai_api_key,
-            streaming=True
+        # Постійні кеші тексту PDF і вбудовувань чанків: повторне розбиття не потребує
+        # повторного розбору PDF, а векторизуються лише чанки, яких ще не було
+        self.text_cache = ExtractedTextCache(settings.text_cache_dir)
+        self.chunk_embeddings = PersistentEmbeddings(self.embeddings, path=settings.embedding_store_path)
+
+        # Ініціалізація LLM: окремі пули для інтерактивної генерації та фонової оцінки
+        logger.info("Ініціалізація LLM...")
+        self.llm_gateway = LLMGateway()
+        self.llm = self.llm_gateway.interactive.client
+
+        # Пакування контекстів у токен-бюджет запиту
+        self.context_packer = ContextPacker(
+            model_name=settings.llm_model,
+            token_budget=settings.context_token_budget
         )
 
+        # Облік токенів запитів до LLM
+        self.token_stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "context_tokens": 0,
+            "cached_prompt_tokens": 0
+        }
+        self.prompt_cache_stats = PromptCacheStats()
+
+        # Кеш вбудовувань запитів і результатів пошуку (спільний для всіх екземплярів ретривера)
+        self.retrieval_cache = RetrievalCache(
+            embedding_cache_size=settings.embedding_cache_size,
+            result_cache_size=settings.retrieval_cache_size
+        ) if settings.enable_retrieval_cache else None
+
+        # Об'єднання однакових запитів, що обробляються одночасно
+        self.single_flight = SingleFlight() if settings.enable_single_flight else None
+
         # Компоненти RAG
         self.vector_store = None
         self.retriever = None
         self.evaluator = None
+        self.evaluation_scheduler = None
         self.query_validator = None
 
         if initialize:
@@ -80,59 +154,63 @@ class RAGPipeline:
     def _initialize_pipeline(self, use_llm_validation: bool = False):
         """Ініціалізація RAG-пайплайну"""
         if os.path.exists(self.persist_directory):
-            print("Завантаження наявного сховища...")
+            logger.info("Завантаження наявного сховища...")
             self.vector_store = Chroma(
                 persist_directory=self.persist_directory,
-                embedding_function=self.embeddings,
-                collection_name=settings.collection_name
+                embedding_function=self.chunk_embeddings,
+                collection_name=self.collection_name
             )
 
             try:
                 collection = self.vector_store.get()
                 doc_count = len(collection.get('ids', []))
-                print(f"Знайдено {doc_count} чанків у сховищі!")
+                logger.info(f"Знайдено {doc_count} чанків у сховищі!")
 
                 if doc_count == 0:
-                    print("Сховище є порожнім. Початок індексації документів...")
+                    logger.info("Сховище є порожнім. Початок індексації документів...")
                     self._index_documents()
 
             except Exception as error:
-                print(f"Помилка перевірки сховища: {error}")
-                print("Повторна переіндексація документів...")
+                logger.error(f"Помилка перевірки сховища: {error}")
+                logger.info("Повторна переіндексація документів...")
                 self._index_documents()
         else:
-            print("Створення нового сховища...")
+            logger.info("Створення нового сховища...")
             self._create_vector_store()
 
         # Ініціалізація гібридного ретривера
-        print("Ініціалізація гібридного ретривера...")
-        self.retriever = HybridRetriever(
-            vector_store=self.vector_store,
-            embeddings=self.embeddings,
-            llm=None,
-            bm25_weight=self.bm25_weight,
-            vector_weight=self.vector_weight,
-            top_k=self.top_k,
-            rerank_top_k=self.rerank_top_k,
-            use_llm_compression=False,
-            cross_encoder_model=self.cross_encoder_model
-        )
+        logger.info("Ініціалізація гібридного ретривера...")
+        self.retriever = self._create_retriever(self.vector_store)
 
         # Ініціалізація оцінювача якості
         if settings.enable_evaluation:
-            print("Ініціалізація оцінювача якості відповідей...")
-            self.evaluator = RAGQualityEvaluator(llm=self.llm)
+            logger.info("Ініціалізація оцінювача якості відповідей...")
+            if settings.evaluation_backend == "local":
+                self.evaluator = LocalQualityEvaluator(embeddings=self.embeddings)
+            else:
+                verdict_cache = VerdictCache(
+                    path=settings.judge_cache_path,
+                    ttl=settings.judge_cache_ttl
+                ) if settings.enable_judge_cache else None
+                self.evaluator = RAGQualityEvaluator(llm=self.llm_gateway.background, verdict_cache=verdict_cache)
+            self.evaluation_scheduler = EvaluationScheduler(
+                evaluator=self.evaluator,
+                sample_rate=settings.evaluation_sample_rate,
+                queue_size=settings.evaluation_queue_size,
+                num_workers=settings.evaluation_workers,
+                results_size=settings.evaluation_results_size
+            )
 
         # Ініціалізація валідатора запитів
-        print("Ініціалізація валідатора запитів...")
+        logger.info("Ініціалізація валідатора запитів...")
         self.query_validator = QueryValidator(
-            llm=self.llm,
+            llm=self.llm_gateway.interactive,
             use_llm_validation=use_llm_validation
         )
 
         self.prompt_template = answer_generation_prompt
 
-        print("RAG-пайплайн ініціалізовано успішно!")
+        logger.info("RAG-пайплайн ініціалізовано успішно!")
 
     def _create_vector_store(self):
         """Створення сховища з PDF-документів"""
@@ -141,26 +219,27 @@ class RAGPipeline:
         if not documents:
             raise ValueError("Не знайдено жодних документів!")
 
-        print("Розбиття тексту документів за допомогою гібридного розбивача...")
+        logger.info("Розбиття тексту документів за допомогою гібридного розбивача...")
 
         hybrid_splitter = HybridLegalDocumentSplitter(
-            embeddings=self.embeddings,
+            embeddings=self.chunk_embeddings,
             chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap
+            chunk_overlap=self.chunk_overlap,
+            structure_aware=settings.structure_splitting
         )
 
         splits = hybrid_splitter.split_documents(documents)
-        print(f"Створено {len(splits)} чанків документів!")
+        logger.info(f"Створено {len(splits)} чанків документів!")
 
         # Створення сховища
         self.vector_store = Chroma.from_documents(
             documents=splits,
-            embedding=self.embeddings,
+            embedding=self.chunk_embeddings,
             persist_directory=self.persist_directory,
-            collection_name=settings.collection_name
+            collection_name=self.collection_name
         )
 
-        print(f"Сховище створено з {len(splits)} чанками!")
+        logger.info(f"Сховище створено з {len(splits)} чанками!")
 
     def _load_documents(self) -> List[Document]:
         """Завантаження PDF-документів"""
@@ -168,30 +247,16 @@ class RAGPipeline:
         docs_path = Path(self.documents_path)
 
         if not docs_path.exists():
-            print(f"Шлях {self.documents_path} до документу не існує!")
+            logger.warning(f"Шлях {self.documents_path} до документу не існує!")
             return documents
 
         pdf_files = list(docs_path.glob("*.pdf"))
-        print(f"Знайдено {len(pdf_files)} PDF-файлів!")
+        logger.info(f"Знайдено {len(pdf_files)} PDF-файлів!")
 
-        for pdf_file in pdf_files:
-            try:
-                with open(pdf_file, 'rb') as file:
-                    reader = pypdf.PdfReader(file)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text() + "\n\n"
-
-                doc = Document(
-                    page_content=text,
-                    metadata={"source": pdf_file.name, "pages": len(reader.pages)}
-                )
-
-                documents.append(doc)
-                print(f"Завантажено {pdf_file.name}: {len(reader.pages)} сторінок")
-
-            except Exception as error:
-                print(f"Помилка завантаження {pdf_file.name}: {error}")
+        # Текст незмінених файлів береться з кешу без повторного розбору PDF
+        documents = self.text_cache.load_documents(self.documents_path)
+        for doc in documents:
+            logger.info(f"Завантажено {doc.metadata['source']}: {doc.metadata['pages']} сторінок")
 
         return documents
 
@@ -201,7 +266,7 @@ class RAGPipeline:
             documents = self._load_documents()
 
             if not documents:
-                print("Документів для індексації не знайдено!")
+                logger.info("Документів для індексації не знайдено!")
                 return
 
             # Отримуємо список вже проіндексованих документів
@@ -212,10 +277,10 @@ class RAGPipeline:
                     for metadata in collection['metadatas']:
                         if metadata and 'source' in metadata:
                             indexed_sources.add(metadata['source'])
-                print(f"Знайдено {len(indexed_sources)} унікальних документів у сховищі!")
+                logger.info(f"Знайдено {len(indexed_sources)} унікальних документів у сховищі!")
 
             except Exception as error:
-                print(f"Не вдалося отримати список проіндексованих документів: {error}")
+                logger.warning(f"Не вдалося отримати список проіндексованих документів: {error}")
 
             # Фільтруємо тільки нові документи
             new_documents = []
@@ -228,51 +293,159 @@ class RAGPipeline:
                     skipped_documents.append(source)
 
             if skipped_documents:
-                print(
+                logger.info(
                     f"Пропущено {len(skipped_documents)} вже проіндексованих документів: {', '.join(skipped_documents)}")
 
             if not new_documents:
-                print("Немає нових документів для індексації!")
+                logger.info("Немає нових документів для індексації!")
                 return
 
-            print(f"Знайдено {len(new_documents)} нових документів для індексації!")
+            logger.info(f"Знайдено {len(new_documents)} нових документів для індексації!")
 
-            print("Розбиття тексту документів за допомогою гібридного розбивача...")
+            logger.info("Розбиття тексту документів за допомогою гібридного розбивача...")
 
             hybrid_splitter = HybridLegalDocumentSplitter(
-                embeddings=self.embeddings,
+                embeddings=self.chunk_embeddings,
                 chunk_size=self.chunk_size,
-                chunk_overlap=self.chunk_overlap
+                chunk_overlap=self.chunk_overlap,
+                structure_aware=settings.structure_splitting
             )
 
             splits = hybrid_splitter.split_documents(new_documents)
-            print(f"Створено {len(splits)} чанків з нових документів!")
+            logger.info(f"Створено {len(splits)} чанків з нових документів!")
 
             # Додавання чанків до сховища
             if self.vector_store:
-                print(f"Додавання {len(splits)} чанків до сховища...")
+                logger.info(f"Додавання {len(splits)} чанків до сховища...")
                 self.vector_store.add_documents(splits)
-                print(f"Успішно проіндексовано {len(splits)} чанків з {len(new_documents)} нових документів!")
+                logger.info(f"Успішно проіндексовано {len(splits)} чанків з {len(new_documents)} нових документів!")
             else:
-                print("Помилка: сховище не ініціалізовано")
+                logger.error("Помилка: сховище не ініціалізовано")
 
         except Exception as error:
-            print(f"Помилка індексації документів: {error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Помилка індексації документів: {error}")
 
     async def query_stream(
             self,
             question: str,
             return_evaluation: bool = False,
-            return_contexts: bool = False
+            return_contexts: bool = False,
+            filters: Optional[Dict[str, Any]] = None,
+            cancel_event: Optional[asyncio.Event] = None,
+            profile: Optional[ProfileSession] = None,
+            trace_parent: Optional[Span] = None
     ) -> AsyncIterator[Dict[str, Any]]:
         """
         Метод запиту до RAG-системи
+
+        Якщо встановлено cancel_event (клієнт від'єднався), обробка припиняється на найближчому етапі:
+        пошук не запускається, а потік LLM закривається
+
+        filters обмежують пошук метаданими чанків (sources, sections, doc_types, effective_from, effective_to)
+
+        Якщо передано profile, синхронні етапи запиту (валідація, пошук, пакування контексту,
+        екстрактивна відповідь, облік токенів) профілюються cProfile-ом
+
+        Запит трасується спаном rag.query_stream (дочірнім до trace_parent) з дочірніми спанами етапів
+
+        Оцінка якості виконується у фоні (EvaluationScheduler): для return_evaluation=True
+        замість результату повертається подія evaluation_scheduled з request_id,
+        за яким результат можна отримати через GET /evaluation/{request_id}
+
+        Однакові (після нормалізації) запити, що надходять під час обробки першого, під'єднуються до нього
+        (SingleFlight): пошук і генерація виконуються один раз, події розсилаються всім клієнтам.
+        Профільовані запити виконуються окремо
+        """
+        span = tracer.start_span("rag.query_stream", parent=trace_parent, attributes={
+            "rag.filtered": bool(filters),
+            "rag.return_evaluation": return_evaluation
+        })
+
+        if self.single_flight is not None and profile is None:
+            key = (
+                normalize_query(question),
+                return_evaluation,
+                return_contexts,
+                json.dumps(filters or {}, sort_keys=True, default=str),
+                self.index_generation
+            )
+            # Спільне виконання переживає спан запиту, що його запустив, тож має власне трасування,
+            # пов'язане посиланнями (links) зі спанами всіх підписників
+            flight_span = tracer.start_span("rag.single_flight", root=True, attributes={
+                "rag.filtered": bool(filters),
+                "rag.return_evaluation": return_evaluation
+            })
+            flight, leader = self.single_flight.join(
+                key,
+                lambda flight_cancel: self._flight_stream(
+                    question, return_evaluation, return_contexts, filters, flight_cancel, flight_span
+                ),
+                owner=flight_span
+            )
+            flight.owner.add_link(span)
+            span.add_link(flight.owner)
+            span.set_attribute("rag.single_flight", "leader" if leader else "follower")
+            stream = self.single_flight.subscribe(key, flight, cancel_event)
+        else:
+            stream = self._query_stream(question, return_evaluation, return_contexts, filters, cancel_event, profile, span)
+
+        try:
+            async for event in stream:
+                yield event
+
+        except Exception as error:
+            span.record_exception(error)
+            raise
+
+        finally:
+            await stream.aclose()
+            span.set_attribute("rag.cancelled", self._is_cancelled(cancel_event))
+            span.end()
+
+    async def _flight_stream(
+            self,
+            question: str,
+            return_evaluation: bool,
+            return_contexts: bool,
+            filters: Optional[Dict[str, Any]],
+            cancel_event: asyncio.Event,
+            span: Span
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Спільне виконання запиту (SingleFlight) під власним спаном, що завершується разом з ним"""
+        stream = self._query_stream(question, return_evaluation, return_contexts, filters, cancel_event, None, span)
+        try:
+            async for event in stream:
+                yield event
+
+        except Exception as error:
+            span.record_exception(error)
+            raise
+
+        finally:
+            await stream.aclose()
+            span.set_attribute("rag.cancelled", cancel_event.is_set())
+            span.end()
+
+    async def _query_stream(
+            self,
+            question: str,
+            return_evaluation: bool,
+            return_contexts: bool,
+            filters: Optional[Dict[str, Any]],
+            cancel_event: Optional[asyncio.Event],
+            profile: Optional[ProfileSession],
+            span: Span
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Етапи обробки запиту
+
+        Етапи генератора виконуються в різних задачах, тож спани етапів отримують батьківський спан явно
         """
         # Валідація запиту
         if self.query_validator:
-            validation_result = self.query_validator.validate_query(question)
+            with tracer.use_span(span), profiled_section(profile):
+                validation_result = self.query_validator.validate_query(question)
+            span.set_attribute("rag.valid", validation_result.is_valid)
             
             yield {
                 "type": "validation",
@@ -286,106 +459,315 @@ class RAGPipeline:
                 return
 
         # Отримання контекстів
-        retrieved_results = self.retriever.retrieve(question, return_scores=True)
-        retrieved_docs = [r.document for r in retrieved_results]
+        if self._is_cancelled(cancel_event):
+            self._record_cancellation("retrievals_cancelled")
+            return
+
+        loop = asyncio.get_event_loop()
+        retrieval_task = loop.run_in_executor(
+            None,
+            profiled_call(profile, tracer.bind(
+                partial(self.retriever.retrieve, question, filter_dict=filters, return_scores=True), parent=span
+            ))
+        )
 
-        # Підготовка контексту
-        context_text = "\n\n---\n\n".join([
-            f"[Джерело: {doc.metadata.get('source', 'Unknown')}]\n{doc.page_content}"
-            for doc in retrieved_docs
-        ])
+        if not await self._wait_unless_cancelled(retrieval_task, cancel_event):
+            self._record_cancellation("retrievals_cancelled")
+            return
 
+        retrieved_results = retrieval_task.result()
+        retrieved_docs = [r.document for r in retrieved_results]
+
+        # Підготовка контексту в межах токен-бюджету
+        with tracer.span("rag.pack_context", parent=span) as pack_span, profiled_section(profile):
+            packed_context = self.context_packer.pack(retrieved_docs)
+            pack_span.set_attributes({
+                "rag.candidates": len(retrieved_docs),
+                "rag.contexts_packed": len(packed_context.documents),
+                "rag.contexts_dropped": packed_context.num_dropped,
+                "rag.context_tokens": packed_context.context_tokens
+            })
+
+        key_terms = None
         if return_contexts:
-            key_terms = self.retriever._extract_key_terms(question)
-            contexts_data = []
-            
-            for i, result in enumerate(retrieved_results):
-                doc = result.document
-                contexts_data.append({
-                    "content": doc.page_content,
-                    "preview": doc.page_content[:300] + "..." if len(doc.page_content) > 300 else doc.page_content,
-                    "length": len(doc.page_content),
-                    "metadata": doc.metadata,
-                    "source": doc.metadata.get('source', 'Unknown'),
-                    "chunk_index": doc.metadata.get('chunk_index', None),
-                    "rank": i + 1,
-                    "key_terms": key_terms
-                })
+            with profiled_section(profile):
+                key_terms = self.retriever._extract_key_terms(question)
+
+            # Компактні дескриптори: повний текст клієнт отримує через GET /chunks/{id} на вимогу
+            contexts_data = [self._context_descriptor(result) for result in retrieved_results]
 
             yield {
                 "type": "contexts",
                 "data": {
                     "contexts": contexts_data,
-                    "num_contexts": len(contexts_data)
+                    "num_contexts": len(contexts_data),
+                    "key_terms": key_terms,
+                    "generation": self.index_generation
                 }
             }
 
         # Генерація відповіді
-        prompt = self.prompt_template.format(
-            context=context_text,
+        if self._is_cancelled(cancel_event):
+            self._record_cancellation("generations_cancelled")
+            return
+
+        # Статичний системний префікс іде першим, змінні контекст і запитання - після нього
+        prompt = self.prompt_template.format_messages(
+            context=packed_context.text,
             question=question
         )
 
-        full_answer = ""
-        async for chunk in self.llm.astream(prompt):
-            token = chunk.content
-            full_answer += token
-            
+        answer_tokens: List[str] = []
+        usage_metadata = None
+        generation_cancelled = False
+        llm_error = None
+        generation_span = tracer.start_span("llm.generate", parent=span, kind="CLIENT", attributes={
+            "llm.model": settings.llm_model,
+            "llm.prompt_messages": len(prompt)
+        })
+        llm_stream = self.llm_gateway.interactive.astream(prompt)
+
+        # Запит до LLM стартує одразу, попередній перегляд будується паралельно з очікуванням першого токена
+        first_chunk = asyncio.ensure_future(llm_stream.__anext__())
+        extractive_answer = None
+        extractive_task = None
+
+        try:
+            # Миттєвий попередній перегляд: екстрактивна відповідь, якщо вона готова до першого токена LLM
+            if settings.extractive_preview and packed_context.documents:
+                extractive_task = loop.run_in_executor(
+                    None,
+                    profiled_call(profile, tracer.bind(
+                        partial(self._extractive_answer, question, packed_context.documents, key_terms), parent=span
+                    ))
+                )
+                await asyncio.wait({first_chunk, extractive_task}, return_when=asyncio.FIRST_COMPLETED)
+
+                if extractive_task.done() and not first_chunk.done():
+                    extractive_answer = extractive_task.result()
+                    if extractive_answer:
+                        self.extractive_stats["previews"] += 1
+                        yield {
+                            "type": "extractive_answer",
+                            "data": {**extractive_answer.to_dict(), "mode": "preview"}
+                        }
+
+            chunk = await first_chunk
+            while True:
+                if self._is_cancelled(cancel_event):
+                    generation_cancelled = True
+                    break
+
+                if chunk.usage_metadata:
+                    usage_metadata = chunk.usage_metadata
+
+                if not answer_tokens:
+                    generation_span.add_event("first_token")
+
+                token = chunk.content
+                answer_tokens.append(token)
+
+                yield {
+                    "type": "token",
+                    "data": {"token": token}
+                }
+
+                chunk = await llm_stream.__anext__()
+
+        except StopAsyncIteration:
+            pass
+
+        except (GeneratorExit, asyncio.CancelledError):
+            generation_cancelled = True
+            raise
+
+        except RETRYABLE_ERRORS as error:
+            # LLM не вклалася в дедлайн або недоступна: до першого токена можлива резервна відповідь
+            generation_span.record_exception(error)
+            if answer_tokens or not settings.extractive_fallback:
+                raise
+            llm_error = error
+
+        except Exception as error:
+            generation_span.record_exception(error)
+            raise
+
+        finally:
+            # Очікування першого токена має завершитися до закриття потоку LLM
+            if not first_chunk.done():
+                first_chunk.cancel()
+                try:
+                    await first_chunk
+                except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                    pass
+
+            # Закриття потоку LLM припиняє генерацію на стороні провайдера
+            await llm_stream.aclose()
+            if generation_cancelled:
+                self._record_cancellation("generations_cancelled")
+
+            generation_span.set_attributes({"llm.chunks": len(answer_tokens), "llm.cancelled": generation_cancelled})
+            generation_span.end()
+
+        if generation_cancelled:
+            return
+
+        if llm_error is not None:
+            # Попередній перегляд, що не встиг до помилки LLM, дообчислюється і стає резервною відповіддю
+            if extractive_answer is None:
+                extractive_answer = await (extractive_task or loop.run_in_executor(
+                    None,
+                    profiled_call(profile, tracer.bind(
+                        partial(self._extractive_answer, question, packed_context.documents, key_terms), parent=span
+                    ))
+                ))
+            if extractive_answer is None:
+                raise llm_error
+
+            self.extractive_stats["fallbacks"] += 1
+            span.set_attribute("rag.extractive_fallback", True)
             yield {
-                "type": "token",
-                "data": {"token": token}
+                "type": "extractive_answer",
+                "data": {**extractive_answer.to_dict(), "mode": "fallback", "reason": str(llm_error)}
             }
+            return
+
+        full_answer = "".join(answer_tokens)
+
+        # Облік токенів: дані провайдера мають пріоритет над локальним підрахунком
+        with profiled_section(profile):
+            usage = self._record_usage(prompt, full_answer, packed_context, usage_metadata)
+        span.set_attributes({
+            "llm.prompt_tokens": usage["prompt_tokens"],
+            "llm.completion_tokens": usage["completion_tokens"],
+            "llm.cached_prompt_tokens": usage["cached_prompt_tokens"],
+            "llm.usage_source": usage["source"]
+        })
+        yield {
+            "type": "usage",
+            "data": usage
+        }
 
-        # Асинхронна оцінка якості
-        if return_evaluation and self.evaluator:
-            # Потокове оцінювання якості
-            loop = asyncio.get_event_loop()
-            evaluation_task = loop.run_in_executor(
-                self.executor,
-                self._evaluate_async,
-                question,
-                full_answer,
-                retrieved_docs
+        # Фонова оцінка якості: потік відповіді не очікує на її завершення
+        if self.evaluation_scheduler:
+            scheduled = self.evaluation_scheduler.submit(
+                query=question,
+                answer=full_answer,
+                contexts=packed_context.documents,
+                force=return_evaluation,
+                context_scores=self._context_scores(packed_context.documents, retrieved_results),
+                trace_parent=span
             )
+            span.set_attribute("evaluation.status", scheduled["status"])
 
-            yield {
-                "type": "evaluation_pending",
-                "data": {"message": "Відбувається оцінка якості відповіді..."}
-            }
-            
-            # Коли оцінка є готовою, відправляємо результат
-            try:
-                metrics = await evaluation_task
+            if return_evaluation:
                 yield {
-                    "type": "evaluation",
-                    "data": {
-                        "faithfulness": metrics.faithfulness,
-                        "answer_relevancy": metrics.answer_relevancy,
-                        "context_relevancy": metrics.context_relevancy,
-                        "mrr": metrics.mrr,
-                        "map": metrics.map_score,
-                        "overall_score": metrics.overall_score
-                    }
-                }
-            except Exception as error:
-                print(f"Помилка оцінки якості: {error}")
-                yield {
-                    "type": "evaluation_error",
-                    "data": {"error": str(error)}
+                    "type": "evaluation_scheduled",
+                    "data": scheduled
                 }
 
-    def _evaluate_async(self, query: str, answer: str, contexts: List[Document]):
-        """Синхронна функція для виконання в Thread Pool"""
-        return self.evaluator.evaluate(
-            query=query,
-            answer=answer,
-            contexts=contexts
-        )
+    def _extractive_answer(
+            self,
+            question: str,
+            documents: List[Document],
+            key_terms: Optional[List[str]] = None
+    ) -> Optional[ExtractiveAnswer]:
+        """Екстрактивна відповідь з речень контекстів (крос-енкодер ретривера, без LLM)"""
+        with tracer.span("rag.extractive_answer", attributes={"rag.documents": len(documents)}) as span:
+            # Ті самі моделі, що й у компресора контекстів, щоб його оцінки речень були порівнянними
+            answerer = ExtractiveAnswerer(
+                cross_encoder=self.retriever.cross_encoder if self.retriever else None,
+                embeddings=self.retriever.query_embeddings if self.retriever else None,
+                max_sentences=settings.extractive_max_sentences
+            )
+            answer = answerer.answer(question, documents, key_terms)
+            span.set_attribute("rag.citations", len(answer.citations) if answer else 0)
+            return answer
+
+    @staticmethod
+    def _is_cancelled(cancel_event: Optional[asyncio.Event]) -> bool:
+        """Перевірка, чи було скасовано запит"""
+        return cancel_event is not None and cancel_event.is_set()
+
+    @staticmethod
+    async def _wait_unless_cancelled(task: asyncio.Future, cancel_event: Optional[asyncio.Event]) -> bool:
+        """
+        Очікування завершення задачі з урахуванням скасування запиту
+
+        Повертає True, якщо задача завершилася, і False, якщо запит було скасовано раніше
+        """
+        if cancel_event is None:
+            await asyncio.wait({task})
+            return True
+
+        cancel_waiter = asyncio.ensure_future(cancel_event.wait())
+        try:
+            await asyncio.wait({task, cancel_waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancel_waiter.cancel()
+
+        return task.done()
+
+    def _record_usage(
+            self,
+            prompt: List[Any],
+            answer: str,
+            packed_context: Any,
+            usage_metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Підрахунок і облік токенів одного запиту"""
+        cached_prompt_tokens = PromptCacheStats.cached_tokens(usage_metadata)
+        self.prompt_cache_stats.record(usage_metadata)
+
+        if usage_metadata:
+            prompt_tokens = usage_metadata.get("input_tokens", 0)
+            completion_tokens = usage_metadata.get("output_tokens", 0)
+            source = "provider"
+        else:
+            prompt_tokens = sum(self.context_packer.count_tokens(message.content) for message in prompt)
+            completion_tokens = self.context_packer.count_tokens(answer)
+            source = "estimate"
+
+        self.token_stats["requests"] += 1
+        self.token_stats["prompt_tokens"] += prompt_tokens
+        self.token_stats["completion_tokens"] += completion_tokens
+        self.token_stats["context_tokens"] += packed_context.context_tokens
+        self.token_stats["cached_prompt_tokens"] += cached_prompt_tokens
+
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "context_tokens": packed_context.context_tokens,
+            "context_token_budget": self.context_packer.token_budget,
+            "contexts_packed": len(packed_context.documents),
+            "contexts_dropped": packed_context.num_dropped,
+            "contexts_truncated": packed_context.num_truncated,
+            "overlap_chars_trimmed": packed_context.overlap_chars_trimmed,
+            "source": source
+        }
+
+    def _context_scores(self, documents: List[Document], retrieved_results: List[Any]) -> Optional[List[float]]:
+        """Оцінки re-ranking для упакованих контекстів (для локальної оцінки релевантності контекстів)"""
+        if not self.retriever or not self.retriever.cross_encoder:
+            return None
+
+        scores_by_id = {r.document.id: float(r.relevance_score) for r in retrieved_results if r.document.id}
+        if not all(doc.id in scores_by_id for doc in documents):
+            return None
+
+        return [scores_by_id[doc.id] for doc in documents]
+
+    def _record_cancellation(self, counter: str):
+        """Облік скасованої роботи"""
+        self.cancellation_stats[counter] = self.cancellation_stats.get(counter, 0) + 1
 
     def __del__(self):
         """Закриття Thread Pool при завершенні роботи"""
         if hasattr(self, 'executor'):
             self.executor.shutdown(wait=False)
+        if getattr(self, 'evaluation_scheduler', None):
+            self.evaluation_scheduler.shutdown()
 
     def get_stats(self) -> Dict[str, Any]:
         """Надання повної інформації про систему"""
@@ -396,9 +778,31 @@ class RAGPipeline:
             "top_k": self.top_k,
             "rerank_top_k": self.rerank_top_k,
             "bm25_weight": self.bm25_weight,
-            "vector_weight": self.vector_weight
+            "vector_weight": self.vector_weight,
+            "dense_index": None,
+            "chunk_store": None,
+            "retrieval_cache": self.retrieval_cache.stats() if self.retrieval_cache else None,
+            "single_flight": self.single_flight.stats() if self.single_flight else None,
+            "cancellations": dict(self.cancellation_stats),
+            "extractive_answers": dict(self.extractive_stats),
+            "evaluation_scheduler": self.evaluation_scheduler.stats() if self.evaluation_scheduler else None,
+            "judge_cache": self.evaluator.verdict_cache.stats() if self.evaluator and self.evaluator.verdict_cache else None,
+            "tokens": self._token_report(),
+            "llm_gateway": self.llm_gateway.stats(),
+            "prompt_cache": {
+                "generation": self.prompt_cache_stats.stats(),
+                "evaluation": self.evaluator.prompt_cache_stats.stats() if self.evaluator else None,
+                "validation": self.query_validator.prompt_cache_stats.stats() if self.query_validator else None
+            }
         }
 
+        if self.retriever and self.retriever.dense_index:
+            stats["dense_index"] = self.retriever.dense_index.memory_stats()
+        if self.retriever and self.retriever.store:
+            stats["chunk_store"] = self.retriever.store.memory_stats()
+        if self.retriever and self.retriever.section_index:
+            stats["section_index"] = self.retriever.section_index.stats()
+
         if self.vector_store:
             try:
                 collection = self.vector_store._collection
@@ -409,6 +813,16 @@ class RAGPipeline:
 
         return stats
 
+    def _token_report(self) -> Dict[str, Any]:
+        """Сумарна і середня кількість токенів на запит"""
+        requests = self.token_stats["requests"]
+        return {
+            **self.token_stats,
+            "context_token_budget": self.context_packer.token_budget,
+            "avg_prompt_tokens": self.token_stats["prompt_tokens"] / requests if requests else 0.0,
+            "avg_completion_tokens": self.token_stats["completion_tokens"] / requests if requests else 0.0
+        }
+
     def get_current_parameters(self) -> Dict[str, Any]:
         """Надання RAG-параметрів системи"""
         return {
@@ -420,24 +834,10 @@ class RAGPipeline:
             "vector_weight": self.vector_weight
         }
 
-    def update_parameters(self, parameters: Dict[str, Any]):
-        """Оновлення RAG-параметрів системи"""
-        if "chunk_size" in parameters:
-            self.chunk_size = parameters["chunk_size"]
-        if "chunk_overlap" in parameters:
-            self.chunk_overlap = parameters["chunk_overlap"]
-        if "top_k" in parameters:
-            self.top_k = parameters["top_k"]
-        if "rerank_top_k" in parameters:
-            self.rerank_top_k = parameters["rerank_top_k"]
-        if "bm25_weight" in parameters:
-            self.bm25_weight = parameters["bm25_weight"]
-        if "vector_weight" in parameters:
-            self.vector_weight = parameters["vector_weight"]
-
-        # Переініціалізація ретривера
-        self.retriever = HybridRetriever(
-            vector_store=self.vector_store,
+    def _create_retriever(self, vector_store: Chroma) -> HybridRetriever:
+        """Створення гібридного ретривера над сховищем з поточними параметрами"""
+        return HybridRetriever(
+            vector_store=vector_store,
             embeddings=self.embeddings,
             llm=self.llm if self.use_llm_compression else None,
             bm25_weight=self.bm25_weight,
@@ -445,32 +845,297 @@ class RAGPipeline:
             top_k=self.top_k,
             rerank_top_k=self.rerank_top_k,
             use_llm_compression=self.use_llm_compression,
-            cross_encoder_model=self.cross_encoder_model
+            cross_encoder_model=self.cross_encoder_model,
+            cache=self.retrieval_cache
         )
 
-        print(f"Параметри оновлено: {parameters}")
+    def update_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Оновлення RAG-параметрів системи
+
+        Зміни класифікуються за обсягом роботи:
+        - query_time (rerank_top_k, ваги злиття) - застосовуються до живого ретривера без перебудови
+        - retriever_rebuild (top_k) - перебудова BM25 і векторного ретриверів над тією ж колекцією
+        - rechunk (chunk_size, chunk_overlap) - фонова побудова нового покоління індексу з атомарною заміною
+        """
+        plan = plan_parameter_changes(self.get_current_parameters(), parameters)
+
+        if plan.query_time:
+            self.rerank_top_k = plan.query_time.get("rerank_top_k", self.rerank_top_k)
+            self.bm25_weight = plan.query_time.get("bm25_weight", self.bm25_weight)
+            self.vector_weight = plan.query_time.get("vector_weight", self.vector_weight)
+
+            if self.retriever and not plan.retriever_rebuild:
+                self.retriever.rerank_top_k = self.rerank_top_k
+                self.retriever.bm25_weight = self.bm25_weight
+                self.retriever.vector_weight = self.vector_weight
+                if self.retriever.ensemble_retriever:
+                    self.retriever.ensemble_retriever.weights = [self.bm25_weight, self.vector_weight]
+
+        if plan.retriever_rebuild:
+            self.top_k = plan.retriever_rebuild.get("top_k", self.top_k)
+            # Під блокуванням фонова перебудова не замінить колекцію між читанням і заміною ретривера
+            with self._index_lock:
+                self.retriever = self._create_retriever(self.vector_store)
+
+        if plan.rechunk:
+            self._schedule_rechunk(
+                plan.rechunk.get("chunk_size", self.chunk_size),
+                plan.rechunk.get("chunk_overlap", self.chunk_overlap)
+            )
+
+        logger.info(f"Параметри оновлено: {plan.to_dict()}")
+
+        return {"plan": plan.to_dict(), "index": self.get_index_status()}
+
+    def _schedule_rechunk(self, chunk_size: int, chunk_overlap: int):
+        """Постановка фонової перебудови індексу (новіший запит замінює ще не розпочатий)"""
+        with self._index_lock:
+            self._rechunk_target = (chunk_size, chunk_overlap)
+            if self._rechunk_running:
+                return
+            self._rechunk_running = True
+
+        self.executor.submit(self._rechunk_worker)
+
+    def _rechunk_worker(self):
+        """Фонова перебудова, доки живе покоління не відповідатиме останнім запитаним параметрам"""
+        while True:
+            with self._index_lock:
+                target = self._rechunk_target
+                if target is None or target == (self.chunk_size, self.chunk_overlap):
+                    self._rechunk_target = None
+                    self._rechunk_running = False
+                    return
+
+            try:
+                self._rebuild_index(*target)
+
+            except Exception as error:
+                logger.error(f"Помилка фонової перебудови індексу: {error}")
+                self.rebuild_status = {
+                    "state": "failed",
+                    "chunk_size": target[0],
+                    "chunk_overlap": target[1],
+                    "error": str(error)
+                }
+                with self._index_lock:
+                    if self._rechunk_target == target:
+                        self._rechunk_target = None
+
+    def _rebuild_index(self, chunk_size: int, chunk_overlap: int):
+        """
+        Побудова нового покоління індексу з кешованого тексту і вбудовувань та атомарна заміна живого
+
+        Запити, що вже виконуються, завершуються на старому ретривері; стару колекцію
+        видаляється із затримкою settings.index_retire_delay
+        """
+        generation = self.index_generation + 1
+        collection_name = self.index_generations.collection_name(generation)
+        started = time.perf_counter()
+        embedding_hits, embedding_misses = self.chunk_embeddings.hits, self.chunk_embeddings.misses
+
+        self.rebuild_status = {
+            "state": "building",
+            "stage": "splitting",
+            "generation": generation,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "started_at": datetime.now().isoformat()
+        }
+        logger.info(f"Фонова перебудова індексу (покоління {generation}): chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
+
+        documents = self.text_cache.load_documents(self.documents_path)
+        if not documents:
+            raise ValueError("Не знайдено жодних документів!")
+
+        splits = HybridLegalDocumentSplitter(
+            embeddings=self.chunk_embeddings,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            structure_aware=settings.structure_splitting
+        ).split_documents(documents)
+
+        # Структурний розбивач враховує chunk_overlap лише для надто великих пунктів і документів
+        # без нумерації, тож нові параметри можуть дати ті самі чанки: нове покоління не потрібне
+        if self._same_chunks(splits):
+            with self._index_lock:
+                self.chunk_size = chunk_size
+                self.chunk_overlap = chunk_overlap
+                self.index_generations.save(self.index_generation, chunk_size, chunk_overlap, len(splits))
+
+            self.rebuild_status = {
+                "state": "idle",
+                "last_build": {
+                    "generation": self.index_generation,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "num_chunks": len(splits),
+                    "duration": time.perf_counter() - started,
+                    "skipped": "identical_chunks",
+                    "finished_at": datetime.now().isoformat()
+                }
+            }
+            logger.info(f"Чанки не змінилися: параметри застосовано до покоління {self.index_generation} без перебудови")
+            return
+
+        self.rebuild_status["stage"] = "embedding"
+        self._drop_collection(collection_name)
+        vector_store = Chroma.from_documents(
+            documents=splits,
+            embedding=self.chunk_embeddings,
+            persist_directory=self.persist_directory,
+            collection_name=collection_name
+        )
+
+        # Ретривер будується під блокуванням, тож зміна top_k під час побудови не буде втрачена;
+        # атомарна заміна живого покоління
+        self.rebuild_status["stage"] = "retriever"
+        with self._index_lock:
+            retriever = self._create_retriever(vector_store)
+            retired_collection = self.collection_name
+            self.vector_store = vector_store
+            self.retriever = retriever
+            self.chunk_size = chunk_size
+            self.chunk_overlap = chunk_overlap
+            self.index_generation = generation
+            self.collection_name = collection_name
+            self.index_generations.save(generation, chunk_size, chunk_overlap, len(splits))
+
+        if self.retrieval_cache:
+            self.retrieval_cache.invalidate()
+
+        self.rebuild_status = {
+            "state": "idle",
+            "last_build": {
+                "generation": generation,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "num_chunks": len(splits),
+                "duration": time.perf_counter() - started,
+                "embeddings_reused": self.chunk_embeddings.hits - embedding_hits,
+                "embeddings_computed": self.chunk_embeddings.misses - embedding_misses,
+                "finished_at": datetime.now().isoformat()
+            }
+        }
+        logger.info(f"Покоління {generation} активне: {len(splits)} чанків")
+
+        timer = threading.Timer(settings.index_retire_delay, self._drop_collection, args=(retired_collection,))
+        timer.daemon = True
+        timer.start()
+
+    def _same_chunks(self, splits: List[Document]) -> bool:
+        """Чи збігаються нові чанки (джерело і текст) з чанками живого покоління"""
+        with self._index_lock:
+            vector_store = self.vector_store
+        if vector_store is None:
+            return False
+
+        live = vector_store.get(include=['documents', 'metadatas'])
+        if len(live['documents']) != len(splits):
+            return False
+
+        metadatas = live.get('metadatas') or [{} for _ in live['documents']]
+        live_chunks = sorted((str((metadata or {}).get('source')), text) for metadata, text in zip(metadatas, live['documents']))
+        new_chunks = sorted((str(doc.metadata.get('source')), doc.page_content) for doc in splits)
+        return live_chunks == new_chunks
+
+    def _drop_collection(self, collection_name: str):
+        """Видалення колекції Chroma (якщо вона існує) і файлів її покоління індексу"""
+        try:
+            self.vector_store._client.delete_collection(name=collection_name)
+            logger.info(f"Колекцію '{collection_name}' видалено")
+        except Exception:
+            pass
+
+        for path in index_storage_paths(collection_name).values():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _context_descriptor(result: RetrievalResult, preview_chars: int = 300) -> Dict[str, Any]:
+        """Дескриптор знайденого контексту для SSE-події contexts (без повного тексту і метаданих)"""
+        doc = result.document
+        metadata = doc.metadata
+        content = doc.page_content
+
+        return {
+            "id": context_id(doc),
+            "source": metadata.get('source', 'Unknown'),
+            "rank": result.rank,
+            "score": round(float(result.relevance_score), 4),
+            "preview": content[:preview_chars] + "..." if len(content) > preview_chars else content,
+            "length": metadata.get("original_length", len(content)),
+            "chunk_index": metadata.get('chunk_index', None),
+            "chunk_index_end": metadata.get('chunk_index_end', metadata.get('chunk_index', None)),
+            "compressed": bool(metadata.get("compressed", False))
+        }
+
+    def get_chunk(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        """Повний текст і метадані контексту за id з дескриптора (див. HybridRetriever.get_document)"""
+        if not self.retriever:
+            return None
+
+        doc = self.retriever.get_document(chunk_id)
+        if doc is None:
+            return None
+
+        return {
+            "id": chunk_id,
+            "content": doc.page_content,
+            "length": len(doc.page_content),
+            "source": doc.metadata.get('source', 'Unknown'),
+            "chunk_index": doc.metadata.get('chunk_index', None),
+            "metadata": doc.metadata,
+            "generation": self.index_generation
+        }
+
+    def get_filter_values(self) -> Dict[str, Any]:
+        """Доступні значення фільтрів пошуку (джерела, типи документів, розділи) і підтримка фільтра за розділами"""
+        if not self.retriever or not self.retriever.filter_index:
+            return {"section_filter": False, "sources": [], "doc_types": [], "sections": []}
+
+        return self.retriever.filter_index.values()
+
+    def get_index_status(self) -> Dict[str, Any]:
+        """Надання інформації про живе покоління індексу і фонову перебудову"""
+        with self._index_lock:
+            pending = self._rechunk_target
+
+        return {
+            "live_generation": self.index_generation,
+            "collection_name": self.collection_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "pending": {"chunk_size": pending[0], "chunk_overlap": pending[1]} if pending else None,
+            "rebuild": self.rebuild_status,
+            "text_cache": self.text_cache.stats(),
+            "embedding_store": self.chunk_embeddings.stats()
+        }
 
     def reset_vector_store(self):
         """Перебудова сховища"""
         import time
         import gc
 
-        print("Очищення сховища через ChromaDB API...")
+        logger.info("Очищення сховища через ChromaDB API...")
 
         # Видалення колекції через ChromaDB API
         try:
             if self.vector_store:
                 chroma_client = self.vector_store._client
-                collection_name = settings.collection_name
+                collection_name = self.collection_name
 
-                print(f"Видалення колекції '{collection_name}'...")
+                logger.info(f"Видалення колекції '{collection_name}'...")
 
                 try:
                     chroma_client.delete_collection(name=collection_name)
-                    print(f"Колекцію '{collection_name}' успішно видалено!")
+                    logger.info(f"Колекцію '{collection_name}' успішно видалено!")
 
                 except Exception as error:
-                    print(f"Попередження при видаленні колекції: {error}")
+                    logger.warning(f"Попередження при видаленні колекції: {error}")
 
                 # Закриття з'єднання
                 del self.vector_store
@@ -481,30 +1146,20 @@ class RAGPipeline:
                 time.sleep(0.5)
 
         except Exception as error:
-            print(f"Помилка при роботі з ChromaDB API: {error}")
+            logger.error(f"Помилка при роботі з ChromaDB API: {error}")
             # Fallback: спробуємо просто очистити об'єкт
             self.vector_store = None
             gc.collect()
             time.sleep(0.5)
 
         # Створюємо нове сховище
-        print("Створення нового сховища...")
+        logger.info("Створення нового сховища...")
         self._create_vector_store()
 
-        print("Переініціалізація ретривера...")
-        self.retriever = HybridRetriever(
-            vector_store=self.vector_store,
-            embeddings=self.embeddings,
-            llm=self.llm if self.use_llm_compression else None,
-            bm25_weight=self.bm25_weight,
-            vector_weight=self.vector_weight,
-            top_k=self.top_k,
-            rerank_top_k=self.rerank_top_k,
-            use_llm_compression=self.use_llm_compression,
-            cross_encoder_model=self.cross_encoder_model
-        )
+        logger.info("Переініціалізація ретривера...")
+        self.retriever = self._create_retriever(self.vector_store)
 
-        print("Сховище успішно перебудовано!")
+        logger.info("Сховище успішно перебудовано!")
 
     def get_evaluation_report(self) -> Dict[str, Any]:
         """Надання комплексного звіту стосовно якості відповідей системи"""
@@ -513,12 +1168,20 @@ class RAGPipeline:
 
         return self.evaluator.get_evaluation_report()
 
+    def get_evaluation_result(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Надання результату фонової оцінки якості за ідентифікатором запиту"""
+        if not self.evaluation_scheduler:
+            return None
+
+        return self.evaluation_scheduler.get_result(request_id)
+
     def add_documents(self, documents: List[Document]):
         """Додавання нових чанків"""
         hybrid_splitter = HybridLegalDocumentSplitter(
-            embeddings=self.embeddings,
+            embeddings=self.chunk_embeddings,
             chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap
+            chunk_overlap=self.chunk_overlap,
+            structure_aware=settings.structure_splitting
         )
 
         splits = hybrid_splitter.split_documents(documents)
@@ -528,4 +1191,4 @@ class RAGPipeline:
         if self.retriever:
             self.retriever._build_retrievers()
 
-        print(f"Додано {len(splits)} чанків!")
+        logger.info(f"Додано {len(splits)} чанків!")
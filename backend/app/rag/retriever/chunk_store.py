@@ -0,0 +1,125 @@
+import os
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from langchain_core.documents import Document
+
+
+class ChunkStore(Sequence):
+    """
+    Компактне сховище чанків для всіх етапів пошуку
+
+    - текст усіх чанків зберігається в одному суцільному буфері UTF-8 з масивом зсувів;
+      якщо задано storage_path, буфер записується на диск і відкривається через memmap
+      (сторінки спільні для процесів і витісняються ОС за потреби)
+    - метадані зберігаються по колонках: значення кожного поля інтерновано (таблиця унікальних значень
+      і масив кодів int32, -1 - значення відсутнє)
+    - чанк адресується цілою позицією; Document створюється лише на вимогу (document, documents)
+
+    Індексація store[i] повертає Document, тож сховище можна передати туди, де очікується список документів
+    """
+
+    def __init__(
+            self,
+            ids: List[str],
+            texts: List[str],
+            metadatas: List[Optional[Dict[str, Any]]],
+            storage_path: Optional[str] = None
+    ):
+        self.ids: List[str] = list(ids)
+        self.position_by_id: Dict[str, int] = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.storage_path = storage_path
+
+        encoded = [text.encode("utf-8") for text in texts]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=self.offsets[1:])
+        self.lengths = np.asarray([len(text) for text in texts], dtype=np.int32)
+        self._buffer = self._store_buffer(b"".join(encoded))
+
+        # Колонки метаданих: таблиця значень і коди для кожного чанка
+        self.columns: Dict[str, np.ndarray] = {}
+        self.values: Dict[str, List[Any]] = {}
+        interned: Dict[str, Dict[Any, int]] = {}
+        for position, metadata in enumerate(metadatas):
+            for key, value in (metadata or {}).items():
+                if key not in self.columns:
+                    self.columns[key] = np.full(len(self.ids), -1, dtype=np.int32)
+                    self.values[key] = []
+                    interned[key] = {}
+                table = interned[key]
+                # Тип входить у ключ, щоб 1, 1.0 і True не змішувалися
+                code = table.get((type(value), value))
+                if code is None:
+                    code = table[(type(value), value)] = len(self.values[key])
+                    self.values[key].append(value)
+                self.columns[key][position] = code
+
+    def _store_buffer(self, data: bytes) -> np.ndarray:
+        """Буфер тексту в пам'яті або на диску (запис у тимчасовий файл і атомарна заміна, потім memmap)"""
+        if not self.storage_path or not data:
+            return np.frombuffer(data, dtype=np.uint8)
+
+        os.makedirs(os.path.dirname(self.storage_path) or ".", exist_ok=True)
+        temporary_path = f"{self.storage_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+        # Заміна файлу не зачіпає memmap попереднього покоління, що ще обслуговує запити
+        os.replace(temporary_path, self.storage_path)
+        return np.memmap(self.storage_path, dtype=np.uint8, mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, position: int) -> Document:
+        if isinstance(position, slice):
+            return [self.document(i) for i in range(*position.indices(len(self)))]
+        return self.document(position)
+
+    def __iter__(self) -> Iterator[Document]:
+        for position in range(len(self)):
+            yield self.document(position)
+
+    def position(self, chunk_id: str) -> Optional[int]:
+        return self.position_by_id.get(chunk_id)
+
+    def text(self, position: int) -> str:
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self._buffer[start:end].tobytes().decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        for position in range(len(self)):
+            yield self.text(position)
+
+    def metadata(self, position: int) -> Dict[str, Any]:
+        metadata = {}
+        for key, column in self.columns.items():
+            code = column[position]
+            if code >= 0:
+                metadata[key] = self.values[key][code]
+        return metadata
+
+    def column(self, key: str) -> List[Any]:
+        """Значення поля для всіх чанків (None, якщо значення відсутнє)"""
+        column, values = self.columns.get(key), self.values.get(key, [])
+        if column is None:
+            return [None] * len(self)
+        return [values[code] if code >= 0 else None for code in column]
+
+    def document(self, position: int) -> Document:
+        position = int(position)
+        return Document(id=self.ids[position], page_content=self.text(position), metadata=self.metadata(position))
+
+    def documents(self, positions: Sequence[int]) -> List[Document]:
+        return [self.document(position) for position in positions]
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Розмір буфера тексту і колонок метаданих"""
+        column_bytes = sum(column.nbytes for column in self.columns.values())
+        return {
+            "chunks": len(self),
+            "text_bytes": int(self.offsets[-1]),
+            "offsets_bytes": int(self.offsets.nbytes + self.lengths.nbytes),
+            "metadata_columns": len(self.columns),
+            "metadata_codes_bytes": int(column_bytes),
+            "interned_values": sum(len(values) for values in self.values.values()),
+            "memory_mapped": isinstance(self._buffer, np.memmap)
+        }
@@ -0,0 +1,117 @@
+import numpy as np
+from typing import List, Optional
+from langchain_core.documents import Document
+
+
+MERGED_ID_SEPARATOR = "+"
+# Найбільша кількість чанків в одному об'єднаному документі (і в id, що запитується через GET /chunks/{id})
+MAX_MERGED_CHUNKS = 16
+
+
+def mmr_select(
+        query_vector: np.ndarray,
+        vectors: np.ndarray,
+        k: int,
+        lambda_mult: float = 0.7
+) -> List[int]:
+    """
+    Maximal Marginal Relevance над нормалізованими векторами
+
+    Матриця попарних схожостей обчислюється одним множенням, а максимальна схожість
+    з уже обраними кандидатами оновлюється векторно після кожного вибору
+    """
+    n = len(vectors)
+    if n <= k:
+        return list(range(n))
+
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+
+    return selected
+
+
+def _strip_overlap(previous: str, following: str, max_overlap: int) -> str:
+    """Видалення з початку наступного чанка тексту, що повторює кінець попереднього (накладання)"""
+    for size in range(min(len(previous), len(following), max_overlap), 19, -1):
+        if previous.endswith(following[:size]):
+            return following[size:].lstrip()
+    return following
+
+
+def _strip_header(doc: Document) -> str:
+    """Текст чанка без рядка-заголовка розділу (додається LegalStructureSplitter)"""
+    section, title = doc.metadata.get("section"), doc.metadata.get("section_title")
+    text = doc.page_content
+    if section and title and text.startswith(f"{section}. {title}"):
+        return text.split("\n", 1)[1] if "\n" in text else ""
+    return text
+
+
+def merge_documents(docs: List[Document], max_overlap: int = 512) -> Document:
+    """Об'єднання послідовних чанків одного джерела в один документ"""
+    if len(docs) == 1:
+        return docs[0]
+
+    text = docs[0].page_content
+    for previous, doc in zip(docs, docs[1:]):
+        following = _strip_header(doc) if doc.metadata.get("section") == previous.metadata.get("section") else doc.page_content
+        following = _strip_overlap(text, following, max_overlap)
+        if following:
+            text = f"{text}\n{following}"
+
+    ids = [doc.id for doc in docs]
+    return Document(
+        id=MERGED_ID_SEPARATOR.join(ids) if all(ids) else None,
+        page_content=text,
+        metadata={
+            **docs[0].metadata,
+            "merged_chunks": len(docs),
+            "chunk_index_end": docs[-1].metadata.get("chunk_index"),
+            "clause_end": docs[-1].metadata.get("clause_end", docs[-1].metadata.get("clause", ""))
+        }
+    )
+
+
+def merge_adjacent(docs: List[Document], max_chars: int, max_overlap: int = 512) -> List[Document]:
+    """
+    Злиття сусідніх чанків (те саме джерело, послідовні chunk_index) серед кандидатів
+
+    Об'єднаний документ займає місце свого найкраще ранжованого чанка;
+    довжина обмежена max_chars, кількість чанків - MAX_MERGED_CHUNKS
+    """
+    def key(doc: Document) -> Optional[tuple]:
+        index = doc.metadata.get("chunk_index")
+        return (doc.metadata.get("source"), index) if isinstance(index, int) else None
+
+    rank_of = {id(doc): rank for rank, doc in enumerate(docs)}
+    ordered = sorted((doc for doc in docs if key(doc) is not None), key=key)
+
+    runs: List[List[Document]] = []
+    for doc in ordered:
+        if runs:
+            last = runs[-1][-1]
+            source, index = key(doc)
+            length = sum(len(d.page_content) for d in runs[-1]) + len(doc.page_content)
+            if key(last) == (source, index - 1) and length <= max_chars and len(runs[-1]) < MAX_MERGED_CHUNKS:
+                runs[-1].append(doc)
+                continue
+            if key(last) == (source, index):
+                continue
+        runs.append([doc])
+
+    merged = [(min(rank_of[id(d)] for d in run), merge_documents(run, max_overlap)) for run in runs]
+    merged += [(rank_of[id(doc)], doc) for doc in docs if key(doc) is None]
+    return [doc for _, doc in sorted(merged, key=lambda item: item[0])]
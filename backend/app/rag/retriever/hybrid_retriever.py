@@ -1,17 +1,54 @@
+import logging
+import os
 import re
+import threading
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseLLM
 from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_chroma import Chroma
-from langchain_community.retrievers import BM25Retriever
+from langchain_community.retrievers.bm25 import default_preprocessing_func
 from langchain.retrievers import EnsembleRetriever, ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import LLMChainFilter
 from dataclasses import dataclass
+from pydantic import ConfigDict
+from rank_bm25 import BM25Okapi
 from sentence_transformers import CrossEncoder
 
 from app.config import settings
+from app.rag.retriever.quantized_index import QuantizedDenseIndex, QuantizedVectorRetriever
+from app.rag.retriever.chunk_store import ChunkStore
+from app.rag.retriever.section_index import SectionIndex, weighted_rrf, top_positions
+from app.rag.retriever.metadata_filter import MetadataFilter, MetadataFilterIndex
+from app.rag.context.extractive_compressor import ExtractiveCompressor
+from app.rag.retriever.diversity import MAX_MERGED_CHUNKS, MERGED_ID_SEPARATOR, merge_adjacent, merge_documents, mmr_select
+from app.rag.cache.retrieval_cache import RetrievalCache, CachedQueryEmbeddings
+from app.tracing import Span, tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+# Суфікс id контексту, розширеного до тексту батьківського розділу (hierarchical_expand_parent)
+PARENT_ID_SUFFIX = "~parent"
+
+
+def context_id(doc: Document) -> Optional[str]:
+    """Id, за яким HybridRetriever.get_document відновлює саме той текст контексту, що отримала LLM"""
+    if doc.id and doc.metadata.get("expanded"):
+        return f"{doc.id}{PARENT_ID_SUFFIX}"
+    return doc.id
+
+
+def index_storage_paths(collection_name: str) -> Dict[str, str]:
+    """Файли покоління індексу на диску (буфер тексту ChunkStore і повноточні вектори квантованого індексу)"""
+    return {
+        "chunk_store": os.path.join(settings.persist_directory, "chunk_store", f"{collection_name}.bin"),
+        "dense_index": os.path.join(settings.persist_directory, "dense_index", f"{collection_name}_full.npy")
+    }
 
 
 @dataclass
@@ -22,6 +59,53 @@ class RetrievalResult:
     rank: int
 
 
+class QueryVectorRetriever(BaseRetriever):
+    """Векторний ретривер, що отримує вбудовування запиту через задану модель (наприклад, кешовану)"""
+
+    vector_store: Any
+    embeddings: Embeddings
+    k: int = 10
+
+    def _get_relevant_documents(
+            self,
+            query: str,
+            *,
+            run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return self.vector_store.similarity_search_by_vector(query_vector, k=self.k)
+
+
+class ChunkBM25Retriever(BaseRetriever):
+    """BM25-ретривер над ChunkStore: індекс будується з тексту сховища, Document створюються лише для top k"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorizer: Any
+    store: ChunkStore
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+    k: int = 4
+
+    @classmethod
+    def from_store(
+            cls,
+            store: ChunkStore,
+            preprocess_func: Callable[[str], List[str]] = default_preprocessing_func,
+            **kwargs: Any
+    ) -> "ChunkBM25Retriever":
+        vectorizer = BM25Okapi([preprocess_func(text) for text in store.texts()])
+        return cls(vectorizer=vectorizer, store=store, preprocess_func=preprocess_func, **kwargs)
+
+    def _get_relevant_documents(
+            self,
+            query: str,
+            *,
+            run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        scores = np.asarray(self.vectorizer.get_scores(self.preprocess_func(query)))
+        return self.store.documents(top_positions(scores, self.k))
+
+
 class HybridRetriever:
     """
     Гібридний ретривер на основі LangChain's EnsembleRetriever, що комбінує розріджений BM25-пошук і щільний векторний пошук
@@ -37,7 +121,22 @@ class HybridRetriever:
             top_k: int = 5,
             rerank_top_k: int = 3,
             use_llm_compression: bool = True,
-            cross_encoder_model: str = settings.cross_encoder_model
+            cross_encoder_model: str = settings.cross_encoder_model,
+            dense_index_mode: str = settings.dense_index_mode,
+            dense_index_pca_dim: int = settings.dense_index_pca_dim,
+            dense_rescore_factor: int = settings.dense_rescore_factor,
+            retrieval_mode: str = settings.retrieval_mode,
+            top_sections: int = settings.hierarchical_top_sections,
+            expand_parent: bool = settings.hierarchical_expand_parent,
+            parent_max_chars: int = settings.hierarchical_parent_max_chars,
+            diversify: bool = settings.enable_diversification,
+            mmr_lambda: float = settings.mmr_lambda,
+            mmr_candidates: int = settings.mmr_candidates,
+            merge_max_chars: int = settings.merge_max_chars,
+            context_compression: str = settings.context_compression,
+            compression_max_chars: int = settings.compression_max_chars,
+            chunk_store_mmap: bool = settings.chunk_store_mmap,
+            cache: Optional[RetrievalCache] = None
     ):
         self.vector_store = vector_store
         self.embeddings = embeddings
@@ -47,6 +146,26 @@ class HybridRetriever:
         self.top_k = top_k
         self.rerank_top_k = rerank_top_k
         self.use_llm_compression = use_llm_compression and llm is not None
+        self.dense_index_mode = dense_index_mode
+        self.dense_index_pca_dim = dense_index_pca_dim
+        self.dense_rescore_factor = dense_rescore_factor
+        self.chunk_store_mmap = chunk_store_mmap
+
+        # Ієрархічний пошук: спочатку розділи, потім чанки лише в обраних розділах
+        self.hierarchical = retrieval_mode == "hierarchical" and embeddings is not None
+        self.top_sections = top_sections
+        self.expand_parent = expand_parent
+        self.parent_max_chars = parent_max_chars
+
+        # Диверсифікація кандидатів перед re-ranking: злиття сусідніх чанків і MMR
+        self.diversify = diversify
+        self.mmr_lambda = mmr_lambda
+        self.mmr_candidates = mmr_candidates
+        self.merge_max_chars = merge_max_chars
+
+        # Кеш вбудовувань запитів і результатів пошуку
+        self.cache = cache
+        self.query_embeddings = CachedQueryEmbeddings(embeddings, cache) if cache and embeddings else embeddings
 
         # Ініціалізація ретриверів
         self.bm25_retriever = None
@@ -54,43 +173,94 @@ class HybridRetriever:
         self.ensemble_retriever = None
         self.compression_retriever = None
         self.cross_encoder = None
+        self.dense_index = None
+        self.section_index = None
+        self.filter_index = None
+        self.chunk_vectors = None
+        self._chunk_vectors_lock = threading.Lock()
+        self.store: Optional[ChunkStore] = None
 
         # Побудова індексів
         self._build_retrievers()
 
-        print("Ініціалізація крос-енкодера...")
+        logger.info("Ініціалізація крос-енкодера...")
 
         try:
             self.cross_encoder = CrossEncoder(cross_encoder_model)
 
         except Exception as error:
-            print(f"Не вдалося завантажити крос-ендокер: {error}. Re-ranking відбуватиметься без використання крос-ендокера")
+            logger.warning(f"Не вдалося завантажити крос-ендокер: {error}. Re-ranking відбуватиметься без використання крос-ендокера")
             self.cross_encoder = None
 
+        # Локальна екстрактивна компресія відібраних контекстів (без звернень до LLM)
+        self.extractive_compressor = None
+        if context_compression == "extractive" and (self.cross_encoder or self.embeddings):
+            self.extractive_compressor = ExtractiveCompressor(
+                cross_encoder=self.cross_encoder,
+                embeddings=self.query_embeddings,
+                max_chars=compression_max_chars
+            )
+
     def _build_retrievers(self):
         """Побудова BM25 і векторного ретриверів з документів у сховищі"""
         try:
-            all_docs = self.vector_store.get(include=['documents', 'metadatas'])
+            use_dense_index = self.dense_index_mode != "exact" and self.embeddings is not None
+            # Під час побудови вбудовування всіх чанків завантажуються лише для квантованого індексу та індексу розділів;
+            # у точному режимі - з першим відфільтрованим запитом (_load_chunk_vectors)
+            need_embeddings = self.embeddings is not None and (use_dense_index or self.hierarchical)
+            include = ['documents', 'metadatas', 'embeddings'] if need_embeddings else ['documents', 'metadatas']
+            all_docs = self.vector_store.get(include=include)
 
             if all_docs and 'documents' in all_docs and all_docs['documents']:
-                valid_docs = []
+                valid_positions = []
 
-                metadatas = all_docs.get('metadatas', [{} for _ in all_docs['documents']])
+                metadatas = all_docs.get('metadatas') or [{} for _ in all_docs['documents']]
 
                 for i, doc_text in enumerate(all_docs['documents']):
-                    if doc_text and isinstance(doc_text, str) and doc_text.strip():
-                        # Токенізація для BM25
-                        tokens = re.findall(r'\w+', doc_text.lower())
-                        if tokens:
-                            valid_docs.append(Document(page_content=doc_text, metadata=metadatas[i]))
+                    # Чанк має містити хоча б один токен для BM25
+                    if doc_text and isinstance(doc_text, str) and re.search(r'\w', doc_text):
+                        valid_positions.append(i)
+
+                if valid_positions:
+                    # Єдине сховище тексту і метаданих чанків для всіх етапів пошуку
+                    self.store = ChunkStore(
+                        ids=[all_docs['ids'][i] for i in valid_positions],
+                        texts=[all_docs['documents'][i] for i in valid_positions],
+                        metadatas=[metadatas[i] for i in valid_positions],
+                        storage_path=index_storage_paths(self.vector_store._collection.name)["chunk_store"]
+                        if self.chunk_store_mmap else None
+                    )
+                    del all_docs['documents']
 
-                if valid_docs:
                     # BM25-ретривер
-                    self.bm25_retriever = BM25Retriever.from_documents(valid_docs)
-                    self.bm25_retriever.k = self.top_k * 2
+                    self.bm25_retriever = ChunkBM25Retriever.from_store(self.store, k=self.top_k * 2)
 
                     # Векторний ретривер
-                    self.vector_retriever = self.vector_store.as_retriever(search_kwargs={"k": self.top_k * 2})
+                    if use_dense_index:
+                        self.vector_retriever = self._build_dense_index_retriever(
+                            all_docs['ids'], all_docs['embeddings'], valid_positions
+                        )
+                    elif self.cache and self.query_embeddings:
+                        self.vector_retriever = QueryVectorRetriever(
+                            vector_store=self.vector_store,
+                            embeddings=self.query_embeddings,
+                            k=self.top_k * 2
+                        )
+                    else:
+                        self.vector_retriever = self.vector_store.as_retriever(search_kwargs={"k": self.top_k * 2})
+
+                    # Індекси метаданих для фільтрації до оцінювання
+                    self.filter_index = MetadataFilterIndex([self.store.metadata(i) for i in range(len(self.store))])
+
+                    if need_embeddings:
+                        vectors = np.asarray(all_docs['embeddings'], dtype=np.float32)[valid_positions]
+                        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+                        # Індекс розділів для ієрархічного пошуку (квантований індекс уже зберігає
+                        # повноточні вектори на диску, тож копія в пам'яті потрібна лише без нього)
+                        if self.hierarchical:
+                            self._build_section_index(vectors)
+                            self.chunk_vectors = None if self.dense_index else vectors
 
                     # Ensemble-ретривер
                     self.ensemble_retriever = EnsembleRetriever(
@@ -106,16 +276,274 @@ class HybridRetriever:
                             base_retriever=self.ensemble_retriever
                         )
 
-                    print(f"Гібридний ретривер успішно ініціалізовано!")
+                    # Нове покоління індексу робить недійсними кешовані результати пошуку
+                    if self.cache:
+                        self.cache.invalidate()
+
+                    logger.info("Гібридний ретривер успішно ініціалізовано!")
                 else:
-                    print("Не знайдено валідних документів!")
+                    logger.warning("Не знайдено валідних документів!")
             else:
-                print("Сховище є порожнім!")
+                logger.info("Сховище є порожнім!")
 
         except Exception as error:
-            print(f"Не вдалося побудувати гібридний ретривер: {error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Не вдалося побудувати гібридний ретривер: {error}")
+
+    def _build_dense_index_retriever(
+            self,
+            ids: List[str],
+            embeddings: Any,
+            positions: List[int]
+    ) -> QuantizedVectorRetriever:
+        """Побудова компактного квантованого індексу з двоетапним пере-оцінюванням"""
+        vectors = np.asarray(embeddings, dtype=np.float32)[positions]
+
+        self.dense_index = QuantizedDenseIndex(
+            mode=self.dense_index_mode,
+            pca_dim=self.dense_index_pca_dim,
+            rescore_factor=self.dense_rescore_factor,
+            storage_path=index_storage_paths(self.vector_store._collection.name)["dense_index"]
+        )
+        self.dense_index.build([ids[i] for i in positions], vectors)
+
+        stats = self.dense_index.memory_stats()
+        logger.info(
+            f"Побудовано квантований індекс ({stats['mode']}, {stats['pca_dim']} вимірів): "
+            f"{stats['bytes_per_chunk']:.0f} байт на чанк, стиснення у {stats['compression_ratio']:.1f} разів"
+        )
+
+        return QuantizedVectorRetriever(
+            index=self.dense_index,
+            embeddings=self.query_embeddings,
+            documents=self.store,
+            k=self.top_k * 2
+        )
+
+    def _build_section_index(self, vectors: np.ndarray):
+        """Побудова індексу розділів з нормалізованих вбудовувань чанків"""
+        self.section_index = SectionIndex(
+            store=self.store,
+            vectors=vectors,
+            preprocess_func=self.bm25_retriever.preprocess_func
+        )
+
+        stats = self.section_index.stats()
+        logger.info(
+            f"Побудовано індекс розділів: {stats['sections']} розділів, "
+            f"у середньому {stats['avg_chunks_per_section']:.1f} чанків на розділ"
+        )
+
+    def _query_vector(self, query: str) -> Optional[np.ndarray]:
+        if self.query_embeddings is None:
+            return None
+        query_vector = np.asarray(self.query_embeddings.embed_query(query), dtype=np.float32)
+        return query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+
+    def _load_chunk_vectors(self):
+        """Одноразове завантаження нормалізованих вбудовувань усіх чанків з Chroma (точний режим)"""
+        with self._chunk_vectors_lock:
+            if self.chunk_vectors is not None:
+                return
+
+            fetched = self.vector_store.get(include=['embeddings'])
+            rows_by_id = {doc_id: row for row, doc_id in enumerate(fetched['ids'])}
+            rows = [rows_by_id.get(doc_id) for doc_id in self.store.ids]
+            if None in rows:
+                return
+
+            vectors = np.asarray(fetched['embeddings'], dtype=np.float32)[rows]
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            self.chunk_vectors = vectors
+            logger.info(f"Завантажено вбудовування {len(vectors)} чанків для відфільтрованого пошуку")
+
+    def _candidate_vectors(self, candidates: np.ndarray, load_all: bool = False) -> Optional[np.ndarray]:
+        """
+        Нормалізовані вбудовування кандидатів (з пам'яті, з memmap квантованого індексу або з Chroma)
+
+        load_all=True (відфільтрований пошук, кандидатів може бути сотні) у точному режимі один раз
+        завантажує вбудовування всіх чанків і далі тримає їх у пам'яті; інакше (MMR, десятки кандидатів)
+        з Chroma читаються лише вбудовування кандидатів
+        """
+        if self.chunk_vectors is None and load_all and self.dense_index is None and self.embeddings is not None:
+            self._load_chunk_vectors()
+
+        if self.chunk_vectors is not None:
+            return self.chunk_vectors[candidates]
+
+        if self.dense_index is not None and self.dense_index.full_vectors is not None:
+            vectors = np.asarray(self.dense_index.full_vectors[np.sort(candidates)], dtype=np.float32)
+            vectors = vectors[np.argsort(np.argsort(candidates))]
+        elif self.embeddings is not None:
+            # Точний режим: читаються вбудовування лише кандидатів, а не всієї колекції
+            ids = [self.store.ids[position] for position in candidates]
+            fetched = self.vector_store.get(ids=ids, include=['embeddings'])
+            by_id = dict(zip(fetched['ids'], fetched['embeddings']))
+            if len(by_id) != len(ids):
+                return None
+            vectors = np.asarray([by_id[doc_id] for doc_id in ids], dtype=np.float32)
+        else:
+            return None
+
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _score_candidates(
+            self,
+            query_tokens: List[str],
+            query_vector: Optional[np.ndarray],
+            candidates: Optional[np.ndarray] = None
+    ) -> List[Document]:
+        """
+        BM25 і векторні оцінки, зважене RRF-злиття, як в EnsembleRetriever
+
+        candidates - позиції чанків, серед яких ведеться пошук (None - усі чанки).
+        Оцінювання працює з позиціями у ChunkStore; Document створюються лише для злитого списку
+        """
+        if candidates is None:
+            k = min(self.top_k * 2, len(self.store))
+            rankings = [(top_positions(np.asarray(self.bm25_retriever.vectorizer.get_scores(query_tokens)), k), self.bm25_weight)]
+
+            if query_vector is not None and self.dense_index is not None:
+                dense = np.asarray([position for position, _ in self.dense_index.search(query_vector, k)], dtype=np.int64)
+                rankings.append((dense, self.vector_weight))
+            elif query_vector is not None and self.chunk_vectors is not None:
+                rankings.append((top_positions(self.chunk_vectors @ query_vector, k), self.vector_weight))
+            elif query_vector is not None:
+                rankings.append((self._chroma_positions(query_vector, k), self.vector_weight))
+        else:
+            if not len(candidates):
+                return []
+
+            k = min(self.top_k * 2, len(candidates))
+            bm25_scores = np.asarray(self.bm25_retriever.vectorizer.get_batch_scores(query_tokens, candidates.tolist()))
+            rankings = [(candidates[top_positions(bm25_scores, k)], self.bm25_weight)]
+
+            vectors = self._candidate_vectors(candidates, load_all=True) if query_vector is not None else None
+            if vectors is not None:
+                rankings.append((candidates[top_positions(vectors @ query_vector, k)], self.vector_weight))
+
+        fused = weighted_rrf(rankings)
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        return self.store.documents([position for position, _ in ranked])
+
+    def _chroma_positions(self, query_vector: np.ndarray, k: int) -> np.ndarray:
+        """
+        Щільне ранжування точним пошуком Chroma без копій вбудовувань у пам'яті
+
+        Запит повертає лише id (без тексту і метаданих), які переводяться в позиції сховища
+        """
+        result = self.vector_store._collection.query(
+            query_embeddings=[query_vector.tolist()],
+            n_results=k,
+            include=['distances']
+        )
+        positions = (self.store.position(doc_id) for doc_id in result['ids'][0])
+        return np.asarray([position for position in positions if position is not None], dtype=np.int64)
+
+    def _document_vectors(self, docs: List[Document]) -> Optional[np.ndarray]:
+        """Нормалізовані вбудовування кандидатів (для об'єднаних чанків - середнє складових)"""
+        members = []
+        for doc in docs:
+            positions = [self.store.position(doc_id) for doc_id in (doc.id or "").split(MERGED_ID_SEPARATOR)]
+            if None in positions:
+                return None
+            members.append(positions)
+
+        unique, inverse = np.unique(np.concatenate(members), return_inverse=True)
+        vectors = self._candidate_vectors(unique)
+        if vectors is None:
+            return None
+
+        rows = np.split(vectors[inverse], np.cumsum([len(positions) for positions in members])[:-1])
+        means = np.stack([row.mean(axis=0) for row in rows])
+        return means / np.maximum(np.linalg.norm(means, axis=1, keepdims=True), 1e-12)
+
+    def _diversify(self, query: str, results: List[Document]) -> List[Document]:
+        """
+        Диверсифікація кандидатів між злиттям і re-ranking
+
+        1. Сусідні чанки одного джерела (накладання chunk_overlap) об'єднуються в один кандидат
+        2. MMR за вбудовуваннями відбирає mmr_candidates релевантних і несхожих між собою кандидатів,
+           тож крос-енкодер оцінює менше пар, а top rerank_top_k не заповнюється повторами
+        """
+        if not self.diversify or len(results) < 2:
+            return results
+
+        results = merge_adjacent(results, self.merge_max_chars)
+
+        k = max(self.mmr_candidates, self.rerank_top_k)
+        if len(results) <= k:
+            return results
+
+        query_vector = self._query_vector(query)
+        vectors = self._document_vectors(results) if query_vector is not None else None
+        if vectors is None:
+            return results[:k]
+
+        return [results[i] for i in mmr_select(query_vector, vectors, k, self.mmr_lambda)]
+
+    def _hierarchical_search(self, query: str, allowed: Optional[np.ndarray] = None) -> List[Document]:
+        """
+        Ієрархічний пошук
+
+        1. Пошук top_sections розділів за центроїдами вбудовувань і BM25 за текстом розділів
+           (серед розділів, що містять чанки, дозволені фільтром)
+        2. BM25 і векторні оцінки лише для чанків обраних розділів
+        """
+        query_tokens = self.bm25_retriever.preprocess_func(query)
+        query_vector = self._query_vector(query)
+
+        allowed_sections = np.unique(self.section_index.section_of[allowed]) if allowed is not None else None
+        section_ids = self.section_index.search(
+            query_tokens, query_vector, self.top_sections, self.bm25_weight, self.vector_weight, allowed_sections
+        )
+        candidates = self.section_index.candidate_positions(section_ids)
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+
+        return self._score_candidates(query_tokens, query_vector, candidates)
+
+    def _filtered_search(self, query: str, allowed: np.ndarray) -> List[Document]:
+        """Пошук лише серед чанків, що пройшли фільтр метаданих"""
+        return self._score_candidates(
+            self.bm25_retriever.preprocess_func(query),
+            self._query_vector(query),
+            np.flatnonzero(allowed)
+        )
+
+    def _expand_parents(self, reranked: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Заміна чанків текстом батьківського розділу (по одному фрагменту на розділ)"""
+        expanded = []
+        seen_sections = set()
+        for doc, score in reranked:
+            position = self.section_index.position_by_id.get(doc.id)
+            if position is None:
+                expanded.append((doc, score))
+                continue
+
+            parent = self._parent_document(doc, position)
+            if parent.metadata["parent_section"] in seen_sections:
+                continue
+            seen_sections.add(parent.metadata["parent_section"])
+            expanded.append((parent, score))
+
+        return expanded
+
+    def _parent_document(self, doc: Document, position: int) -> Document:
+        """Чанк, замінений текстом батьківського розділу"""
+        section, text = self.section_index.expand(position, self.parent_max_chars)
+        return Document(
+            id=doc.id,
+            page_content=text,
+            metadata={**doc.metadata, "parent_section": section.key, "expanded": True}
+        )
+
+    def evaluate_dense_recall(self, queries: List[str], k: Optional[int] = None) -> Optional[float]:
+        """Оцінка recall@k квантованого пошуку відносно точного пошуку за повноточними векторами"""
+        if not self.dense_index or not queries:
+            return None
+
+        query_vectors = np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32)
+        return self.dense_index.recall_at_k(query_vectors, k or self.top_k * 2)
 
     def _cross_encoder_rerank(self, query: str, documents: List[Document]) -> List[Tuple[Document, float]]:
         """Re-ranking з використанням крос-енкодера для досягнення кращої семантичної релевантності"""
@@ -202,28 +630,173 @@ class HybridRetriever:
         Головний метод інформаційного пошуку
 
         Етапи інформаційного пошуку
+        0. Перевірка кешу результатів пошуку і побудова маски фільтра метаданих
         1. Гібридний пошук з EnsembleRetriever (розріджений BM25-пошук і щільний векторний пошук)
-        2. LLM compression
-        3. Cross-encoder re-ranking
+           або ієрархічний пошук (розділи, потім чанки в обраних розділах)
+        2. Злиття сусідніх чанків і MMR-диверсифікація
+        3. LLM compression
+        4. Cross-encoder re-ranking
+        5. Опційне розширення до тексту батьківського розділу
+        6. Локальна екстрактивна компресія (найрелевантніші речення в межах бюджету)
         """
         if not self.ensemble_retriever:
             return []
 
-        search_kwargs = {"k": self.top_k * 2}
-        if filter_dict:
-            search_kwargs["filter"] = filter_dict
+        metadata_filter = MetadataFilter.from_dict(filter_dict)
+
+        with tracer.span("retriever.retrieve", attributes={"retriever.filtered": not metadata_filter.is_empty}) as span:
+            reranked = self._retrieve(query, metadata_filter, span)
+            span.set_attribute("retriever.results", len(reranked))
+            return self._format_results(reranked, return_scores)
+
+    def _retrieve(self, query: str, metadata_filter: MetadataFilter, span: Span) -> List[Tuple[Document, float]]:
+        """Етапи інформаційного пошуку (спани етапів вкладені в span)"""
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.result_key(
+                query, self.top_k, self.rerank_top_k, self.bm25_weight, self.vector_weight, metadata_filter.to_dict()
+            )
+            # Кешуються результати після пост-обробки: влучання не запускає компресію повторно
+            reranked = self._materialize_cached(self.cache.get_results(cache_key))
+            span.set_attribute("retriever.cache_hit", reranked is not None)
+            if reranked is not None:
+                return reranked
+
+        # Фільтр метаданих застосовується до оцінювання: BM25, векторні оцінки і re-ranking
+        # обчислюються лише для чанків, дозволених бітовою маскою
+        allowed = None
+        if metadata_filter.sections and not self.filter_index.supports_sections:
+            raise ValueError("Фільтр за розділами недоступний: чанки індексу не містять номерів розділів")
+        if not metadata_filter.is_empty:
+            allowed = self.filter_index.mask(metadata_filter)
+            span.set_attribute("retriever.filter_allowed", int(allowed.sum()))
+            if not allowed.any():
+                return []
+
+        with tracer.span("retriever.search") as search_span:
+            if self.section_index:
+                strategy = "hierarchical"
+                results = self._hierarchical_search(query, allowed)
+            elif allowed is not None:
+                strategy = "filtered"
+                results = self._filtered_search(query, allowed)
+            elif self.query_embeddings is not None:
+                # Злиття BM25 і щільних оцінок за позиціями сховища (без копій Document з Chroma);
+                # щільні оцінки - з квантованого індексу, вбудовувань у пам'яті або запиту до Chroma лише за id
+                strategy = "fused"
+                results = self._score_candidates(self.bm25_retriever.preprocess_func(query), self._query_vector(query))
+            else:
+                strategy = "ensemble"
+                results = self.ensemble_retriever.invoke(query, k=self.top_k * 2)
+            search_span.set_attributes({"retriever.strategy": strategy, "retriever.candidates": len(results)})
+
+        with tracer.span("retriever.diversify", attributes={"retriever.candidates_in": len(results)}) as diversify_span:
+            results = self._diversify(query, results)
+            diversify_span.set_attribute("retriever.candidates_out", len(results))
 
         if self.use_llm_compression and self.compression_retriever:
-            results = self.compression_retriever.invoke(query, **search_kwargs)
-        else:
-            results = self.ensemble_retriever.invoke(query, **search_kwargs)
+            with tracer.span("retriever.llm_compression", kind="CLIENT"):
+                results = self.compression_retriever.base_compressor.compress_documents(results, query)
 
         # Re-ranking за допомогою крос-енкодера
-        reranked = self._cross_encoder_rerank(query, results)
+        with tracer.span("retriever.rerank", attributes={
+            "retriever.pairs": len(results),
+            "retriever.cross_encoder": self.cross_encoder is not None
+        }):
+            reranked = self._cross_encoder_rerank(query, results)[:self.rerank_top_k]
+
+        processed = self._postprocess(query, reranked)
 
+        if cache_key is not None and all(doc.id for doc, _ in reranked):
+            originals = {doc.id: doc for doc, _ in reranked}
+            self.cache.put_results(cache_key, [
+                self._cache_entry(originals[doc.id], doc, score) for doc, score in processed
+            ])
+
+        return processed
+
+    def _postprocess(self, query: str, reranked: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Розширення до батьківського розділу і екстрактивна компресія відібраних контекстів"""
+        if self.section_index and self.expand_parent:
+            reranked = self._expand_parents(reranked)
+
+        if self.extractive_compressor and reranked:
+            with tracer.span("retriever.compress", attributes={"retriever.documents": len(reranked)}) as span:
+                documents = self.extractive_compressor.compress_documents([doc for doc, _ in reranked], query)
+                reranked = [(doc, score) for doc, (_, score) in zip(documents, reranked)]
+                span.set_attribute("retriever.compressed", sum(1 for doc in documents if doc.metadata.get("compressed")))
+
+        return reranked
+
+    @staticmethod
+    def _cache_entry(original: Document, processed: Document, score: float) -> Tuple[str, float, Optional[str], Dict[str, Any]]:
+        """
+        Компактний запис кешу: id, оцінка, текст після пост-обробки (None, якщо він не змінився)
+        і лише ті поля метаданих, що додала пост-обробка
+        """
+        text = processed.page_content if processed.page_content != original.page_content else None
+        extra = {
+            key: value for key, value in processed.metadata.items()
+            if key not in original.metadata or original.metadata[key] != value
+        }
+        return processed.id, float(score), text, extra
+
+    def _materialize_cached(self, cached: Optional[List[Tuple]]) -> Optional[List[Tuple[Document, float]]]:
+        """Відновлення документів за кешованими id чанків (з текстом і метаданими після пост-обробки)"""
+        if cached is None:
+            return None
+
+        reranked = []
+        for doc_id, score, text, extra in cached:
+            doc = self.get_document(doc_id)
+            if doc is None:
+                return None
+            reranked.append((Document(
+                id=doc.id,
+                page_content=doc.page_content if text is None else text,
+                metadata={**doc.metadata, **extra}
+            ), score))
+
+        return reranked
+
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        """
+        Повний текст чанка за id з поточного покоління індексу
+
+        Id злитих сусідніх чанків (MERGED_ID_SEPARATOR, не більше MAX_MERGED_CHUNKS) повертають об'єднаний текст,
+        id з PARENT_ID_SUFFIX (див. context_id) - текст батьківського розділу
+        """
+        if self.store is None or not doc_id:
+            return None
+
+        expand = doc_id.endswith(PARENT_ID_SUFFIX)
+        if expand:
+            doc_id = doc_id[:-len(PARENT_ID_SUFFIX)]
+
+        chunk_ids = doc_id.split(MERGED_ID_SEPARATOR)
+        if len(chunk_ids) > MAX_MERGED_CHUNKS:
+            return None
+
+        positions = [self.store.position(chunk_id) for chunk_id in chunk_ids]
+        if None in positions:
+            return None
+
+        if expand:
+            if not self.section_index or len(positions) != 1:
+                return None
+            return self._parent_document(self.store.document(positions[0]), positions[0])
+
+        return merge_documents(self.store.documents(positions))
+
+    def _format_results(
+            self,
+            reranked: List[Tuple[Document, float]],
+            return_scores: bool
+    ) -> List[Document] | List[RetrievalResult]:
+        """Формування результату пошуку"""
         if return_scores:
             retrieval_results = []
-            for i, (doc, score) in enumerate(reranked[:self.rerank_top_k]):
+            for i, (doc, score) in enumerate(reranked):
                 retrieval_results.append(RetrievalResult(
                     document=doc,
                     relevance_score=score,
@@ -231,4 +804,4 @@ class HybridRetriever:
                 ))
             return retrieval_results
         else:
-            return [doc for doc, _ in reranked[:self.rerank_top_k]]
+            return [doc for doc, _ in reranked]
@@ -0,0 +1,162 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+
+def date_key(value: Optional[str]) -> Optional[int]:
+    """Дата ISO (YYYY-MM-DD) у вигляді числа YYYYMMDD для порівнянь"""
+    if not value:
+        return None
+    try:
+        year, month, day = (int(part) for part in str(value)[:10].split("-"))
+    except ValueError:
+        raise ValueError(f"Некоректна дата фільтра: {value} (очікується YYYY-MM-DD)")
+    return year * 10000 + month * 100 + day
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(item) for item in value if item not in (None, "")]
+    return [str(value)] if value != "" else []
+
+
+@dataclass
+class MetadataFilter:
+    """
+    Фільтр пошуку за метаданими чанків
+
+    - sources: назви файлів документів
+    - sections: номери розділів або пунктів (префікс нумерації: "2" охоплює 2.13 і 2.13.1)
+    - doc_types: типи документів (положення, наказ, порядок...)
+    - effective_from / effective_to: межі дати набрання чинності (YYYY-MM-DD, включно)
+    """
+    sources: List[str] = field(default_factory=list)
+    sections: List[str] = field(default_factory=list)
+    doc_types: List[str] = field(default_factory=list)
+    effective_from: Optional[str] = None
+    effective_to: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, filter_dict: Optional[Dict[str, Any]]) -> "MetadataFilter":
+        """Фільтр зі словника (ключі в однині або множині: source/sources, section/sections, doc_type/doc_types)"""
+        filter_dict = filter_dict or {}
+        metadata_filter = cls(
+            sources=sorted({os.path.basename(s) for s in _as_list(filter_dict.get("sources", filter_dict.get("source")))}),
+            sections=sorted({s.rstrip(".") for s in _as_list(filter_dict.get("sections", filter_dict.get("section")))}),
+            doc_types=sorted({s.lower() for s in _as_list(filter_dict.get("doc_types", filter_dict.get("doc_type")))}),
+            effective_from=filter_dict.get("effective_from") or None,
+            effective_to=filter_dict.get("effective_to") or None
+        )
+
+        # Перевірка формату дат
+        date_key(metadata_filter.effective_from)
+        date_key(metadata_filter.effective_to)
+        return metadata_filter
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.sources or self.sections or self.doc_types or self.effective_from or self.effective_to)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Нормалізований словник (ключ кешу результатів пошуку)"""
+        return {
+            key: value for key, value in {
+                "sources": self.sources,
+                "sections": self.sections,
+                "doc_types": self.doc_types,
+                "effective_from": self.effective_from,
+                "effective_to": self.effective_to
+            }.items() if value
+        }
+
+
+class MetadataFilterIndex:
+    """
+    Інвертовані індекси метаданих чанків для фільтрації до оцінювання
+
+    Для джерела, типу документа і кожного префікса нумерації пункту зберігається бітова маска чанків
+    (numpy bool), для дати набрання чинності - масив дат. Маска фільтра обчислюється як
+    перетин (AND) об'єднань (OR) масок значень кожного поля, тож BM25 і векторні оцінки
+    рахуються лише для чанків, що пройшли фільтр
+    """
+
+    def __init__(self, metadatas: Sequence[Dict[str, Any]]):
+        self.size = len(metadatas)
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {"source": {}, "section": {}, "doc_type": {}}
+        self.effective_dates = np.zeros(self.size, dtype=np.int64)
+
+        for position, metadata in enumerate(metadatas):
+            metadata = metadata or {}
+            self._add("source", os.path.basename(str(metadata.get("source", ""))), position)
+            self._add("doc_type", str(metadata.get("doc_type", "")).lower(), position)
+
+            # Префікси нумерації: пункт 2.13.1 належить розділам 2, 2.13 і 2.13.1
+            clause = str(metadata.get("clause") or metadata.get("section") or "")
+            parts = [part for part in clause.split(".") if part]
+            for depth in range(1, len(parts) + 1):
+                self._add("section", ".".join(parts[:depth]), position)
+
+            effective_date = metadata.get("effective_date")
+            if effective_date:
+                try:
+                    self.effective_dates[position] = date_key(effective_date)
+                except ValueError:
+                    pass
+
+    def _add(self, field_name: str, value: str, position: int):
+        if not value:
+            return
+        postings = self.postings[field_name]
+        if value not in postings:
+            postings[value] = np.zeros(self.size, dtype=bool)
+        postings[value][position] = True
+
+    def _union(self, field_name: str, values: List[str]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            posting = self.postings[field_name].get(value)
+            if posting is not None:
+                mask |= posting
+        return mask
+
+    def mask(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """Бітова маска чанків, що відповідають фільтру"""
+        mask = np.ones(self.size, dtype=bool)
+
+        if metadata_filter.sources:
+            mask &= self._union("source", metadata_filter.sources)
+        if metadata_filter.doc_types:
+            mask &= self._union("doc_type", metadata_filter.doc_types)
+        if metadata_filter.sections:
+            mask &= self._union("section", metadata_filter.sections)
+
+        # Чанки без дати не проходять фільтр за датою
+        if metadata_filter.effective_from:
+            mask &= self.effective_dates >= date_key(metadata_filter.effective_from)
+        if metadata_filter.effective_to:
+            mask &= (self.effective_dates > 0) & (self.effective_dates <= date_key(metadata_filter.effective_to))
+
+        return mask
+
+    def positions(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        return np.flatnonzero(self.mask(metadata_filter))
+
+    @property
+    def supports_sections(self) -> bool:
+        """Чи є в індексі номери розділів (їх створює лише LegalStructureSplitter)"""
+        return bool(self.postings["section"])
+
+    def values(self) -> Dict[str, Any]:
+        """Доступні значення полів (для інтерфейсу вибору фільтрів)"""
+        return {
+            "section_filter": self.supports_sections,
+            "sources": sorted(self.postings["source"]),
+            "doc_types": sorted(self.postings["doc_type"]),
+            "sections": sorted(
+                (value for value in self.postings["section"] if "." not in value),
+                key=lambda value: int(value) if value.isdigit() else 0
+            )
+        }
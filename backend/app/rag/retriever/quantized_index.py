@@ -0,0 +1,206 @@
+import os
+import numpy as np
+from typing import Any, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from pydantic import ConfigDict
+
+
+class QuantizedDenseIndex:
+    """
+    Компактний щільний індекс для двоетапного векторного пошуку
+
+    Етапи пошуку:
+    1. Наближений пошук за квантованими векторами (int8 або бінарними), опційно зменшеними через PCA
+    2. Пере-оцінювання короткого списку кандидатів за повноточними векторами, що зберігаються на диску (memmap)
+
+    Режими:
+    - int8: 1 байт на вимір (зменшення пам'яті у 4 рази)
+    - binary: 1 біт на вимір (зменшення пам'яті у 32 рази)
+    """
+
+    MODES = ("int8", "binary")
+
+    def __init__(
+            self,
+            mode: str = "int8",
+            pca_dim: int = 0,
+            rescore_factor: int = 4,
+            storage_path: Optional[str] = None,
+            block_size: int = 65536
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Невідомий режим квантування: {mode}")
+
+        self.mode = mode
+        self.pca_dim = pca_dim
+        self.rescore_factor = max(1, rescore_factor)
+        self.storage_path = storage_path
+        self.block_size = block_size
+
+        self.ids: List[str] = []
+        self.dim = 0
+        self.codes: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.full_vectors: Optional[np.ndarray] = None
+
+    def build(self, ids: List[str], vectors: np.ndarray):
+        """Побудова індексу з повноточних нормалізованих векторів"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        self.ids = list(ids)
+        self.dim = vectors.shape[1]
+
+        # PCA для зменшення розмірності
+        if 0 < self.pca_dim < self.dim and len(vectors) > self.pca_dim:
+            self.mean = vectors.mean(axis=0)
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            self.components = np.ascontiguousarray(vt[:self.pca_dim].T, dtype=np.float32)
+        else:
+            self.mean = None
+            self.components = None
+
+        projected = self._project(vectors)
+
+        if self.mode == "int8":
+            # Симетричне квантування з масштабом для кожного виміру
+            max_abs = np.abs(projected).max(axis=0)
+            self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.codes = np.clip(np.rint(projected / self.scale), -127, 127).astype(np.int8)
+        else:
+            # Бінарне квантування за знаком центрованих компонент
+            if self.mean is None:
+                self.mean = vectors.mean(axis=0)
+                projected = vectors - self.mean
+            self.codes = np.packbits(projected > 0, axis=1)
+
+        self.full_vectors = self._store_full_vectors(vectors)
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        """Проєкція векторів у PCA-простір (якщо PCA ввімкнено)"""
+        if self.components is None:
+            return vectors
+        projected = (vectors - self.mean) @ self.components
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def _store_full_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """Збереження повноточних векторів на диск (тимчасовий файл і атомарна заміна) і відкриття їх через memmap"""
+        if not self.storage_path:
+            return vectors
+
+        os.makedirs(os.path.dirname(self.storage_path) or ".", exist_ok=True)
+        temporary_path = f"{self.storage_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.save(file, vectors)
+        # Перезапис на місці обрізав би файл під memmap живого індексу (SIGBUS під час пере-оцінювання)
+        os.replace(temporary_path, self.storage_path)
+        return np.load(self.storage_path, mmap_mode="r")
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Наближені оцінки схожості за квантованими кодами"""
+        if self.mode == "int8":
+            projected = self._project(query[None, :])[0]
+            weighted = (projected * self.scale).astype(np.float32)
+            scores = np.empty(len(self.codes), dtype=np.float32)
+
+            # Блокова обробка обмежує розмір тимчасових масивів
+            for start in range(0, len(self.codes), self.block_size):
+                block = self.codes[start:start + self.block_size]
+                scores[start:start + len(block)] = block.astype(np.float32) @ weighted
+            return scores
+
+        if self.components is not None:
+            projected = (query - self.mean) @ self.components
+        else:
+            projected = query - self.mean
+        query_bits = np.packbits(projected > 0)
+        hamming = np.bitwise_count(np.bitwise_xor(self.codes, query_bits)).sum(axis=1, dtype=np.int32)
+        return -hamming.astype(np.float32)
+
+    def search(self, query_vector: List[float] | np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """
+        Двоетапний пошук
+
+        Повертає список пар (позиція в індексі, косинусна схожість) у порядку спадання схожості
+        """
+        if self.codes is None or not len(self.codes) or k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        approx = self._approximate_scores(query)
+
+        shortlist_size = min(len(approx), k * self.rescore_factor)
+        if shortlist_size < len(approx):
+            shortlist = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+        else:
+            shortlist = np.arange(len(approx))
+
+        # Пере-оцінювання за повноточними векторами (читаються лише рядки з короткого списку)
+        shortlist = np.sort(shortlist)
+        exact = np.asarray(self.full_vectors[shortlist], dtype=np.float32) @ query
+
+        order = np.argsort(-exact)[:k]
+        return [(int(shortlist[i]), float(exact[i])) for i in order]
+
+    def exact_search(self, query_vector: List[float] | np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Точний пошук за всіма повноточними векторами (еталон для оцінки recall)"""
+        if self.full_vectors is None or k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = np.asarray(self.full_vectors, dtype=np.float32) @ query
+        order = np.argsort(-scores)[:k]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def recall_at_k(self, query_vectors: np.ndarray, k: int) -> float:
+        """Recall@k двоетапного пошуку відносно точного пошуку"""
+        if not len(query_vectors):
+            return 0.0
+
+        hits = 0
+        for query in query_vectors:
+            expected = {i for i, _ in self.exact_search(query, k)}
+            found = {i for i, _ in self.search(query, k)}
+            hits += len(expected & found)
+
+        return hits / (len(query_vectors) * min(k, len(self.ids)))
+
+    def memory_stats(self) -> dict:
+        """Статистика використання пам'яті індексом"""
+        num_vectors = len(self.ids)
+        code_bytes = int(self.codes.nbytes) if self.codes is not None else 0
+        full_bytes_per_chunk = self.dim * 4
+
+        return {
+            "mode": self.mode,
+            "pca_dim": self.components.shape[1] if self.components is not None else self.dim,
+            "num_vectors": num_vectors,
+            "bytes_per_chunk": code_bytes / num_vectors if num_vectors else 0,
+            "full_precision_bytes_per_chunk": full_bytes_per_chunk,
+            "compression_ratio": (full_bytes_per_chunk * num_vectors / code_bytes) if code_bytes else 0.0
+        }
+
+
+class QuantizedVectorRetriever(BaseRetriever):
+    """Векторний ретривер LangChain поверх QuantizedDenseIndex"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: QuantizedDenseIndex
+    embeddings: Embeddings
+    documents: Any  # послідовність документів за позицією індексу (ChunkStore або список)
+    k: int = 10
+
+    def _get_relevant_documents(
+            self,
+            query: str,
+            *,
+            run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return [self.documents[i] for i, _ in self.index.search(query_vector, self.k)]
@@ -0,0 +1,185 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from rank_bm25 import BM25Okapi
+
+from app.rag.retriever.chunk_store import ChunkStore
+
+
+RRF_C = 60 # константа зваженого RRF, як в EnsembleRetriever
+
+
+def weighted_rrf(rankings: List[Tuple[np.ndarray, float]]) -> Dict[int, float]:
+    """Зважене злиття рангів (Reciprocal Rank Fusion) для списків позицій, відсортованих за спаданням оцінки"""
+    fused: Dict[int, float] = {}
+    for order, weight in rankings:
+        for rank, position in enumerate(order, 1):
+            fused[int(position)] = fused.get(int(position), 0.0) + weight / (rank + RRF_C)
+    return fused
+
+
+def top_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """Індекси k найбільших оцінок у порядку спадання"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+@dataclass
+class Section:
+    """Розділ документа - група чанків одного джерела"""
+    key: str
+    source: str
+    section: str
+    title: str
+    positions: np.ndarray # позиції чанків у порядку документа
+
+
+class SectionIndex:
+    """
+    Грубий індекс розділів для ієрархічного пошуку
+
+    Одиниця індексу - пункт рівня section_level за нумерацією (для 2 - "3.2", включно з підпунктами 3.2.x).
+    Кожен розділ представлено центроїдом нормалізованих вбудовувань його чанків і BM25-документом
+    із заголовка та тексту. Чанки без метаданих розділу (розбиті не за структурою) групуються
+    у вікна по window_size послідовних чанків одного джерела
+    """
+
+    def __init__(
+            self,
+            store: ChunkStore,
+            vectors: np.ndarray,
+            preprocess_func: Callable[[str], List[str]],
+            section_level: int = 2,
+            window_size: int = 8
+    ):
+        self.store = store
+        self.preprocess_func = preprocess_func
+        self.section_level = section_level
+        self.window_size = window_size
+
+        self.sections: List[Section] = []
+        self.section_of = np.zeros(len(store), dtype=np.int32)
+        self.position_by_id = store.position_by_id
+
+        self._group(store)
+
+        # Центроїди розділів
+        centroids = np.stack([vectors[section.positions].mean(axis=0) for section in self.sections])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self.centroids = centroids.astype(np.float32)
+
+        self.bm25 = BM25Okapi([
+            preprocess_func(" ".join([section.title] + [store.text(i) for i in section.positions]))
+            for section in self.sections
+        ])
+
+    def _group(self, store: ChunkStore):
+        groups: Dict[str, List[int]] = {}
+        titles: Dict[str, Tuple[str, str, str]] = {}
+
+        metadatas = [store.metadata(i) for i in range(len(store))]
+        order = sorted(
+            range(len(store)),
+            key=lambda i: (metadatas[i].get("source", ""), metadatas[i].get("chunk_index", 0))
+        )
+
+        for i in order:
+            metadata = metadatas[i]
+            source = metadata.get("source", "")
+            if metadata.get("section_path") is not None:
+                clause = str(metadata.get("clause") or metadata.get("section", ""))
+                section = ".".join(clause.split(".")[:self.section_level])
+                title = metadata.get("section_title", "")
+            else:
+                section = f"w{int(metadata.get('chunk_index', 0)) // self.window_size}"
+                title = ""
+
+            key = f"{source}#{section}"
+            groups.setdefault(key, []).append(i)
+            titles.setdefault(key, (source, section, title))
+
+        for key, positions in groups.items():
+            source, section, title = titles[key]
+            self.section_of[positions] = len(self.sections)
+            self.sections.append(Section(
+                key=key,
+                source=source,
+                section=section,
+                title=title,
+                positions=np.asarray(positions, dtype=np.int64)
+            ))
+
+    def search(
+            self,
+            query_tokens: List[str],
+            query_vector: np.ndarray,
+            k: int,
+            bm25_weight: float,
+            vector_weight: float,
+            allowed: Optional[np.ndarray] = None
+    ) -> List[int]:
+        """
+        Пошук k найрелевантніших розділів (злиття BM25 і схожості з центроїдами)
+
+        allowed - номери розділів, серед яких ведеться пошук (наприклад, після фільтрації метаданих)
+        """
+        section_ids = np.arange(len(self.sections)) if allowed is None else np.asarray(allowed)
+        k = min(k, len(section_ids))
+        if k == 0:
+            return []
+
+        rankings = [(section_ids[top_positions(self.bm25.get_scores(query_tokens)[section_ids], k)], bm25_weight)]
+        if query_vector is not None:
+            rankings.append((section_ids[top_positions(self.centroids[section_ids] @ query_vector, k)], vector_weight))
+
+        fused = weighted_rrf(rankings)
+        return [position for position, _ in sorted(fused.items(), key=lambda item: item[1], reverse=True)][:k]
+
+    def candidate_positions(self, section_ids: List[int]) -> np.ndarray:
+        """Позиції чанків обраних розділів"""
+        if not section_ids:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.sections[i].positions for i in section_ids])
+
+    def expand(self, position: int, max_chars: int) -> Tuple[Section, str]:
+        """
+        Текст батьківського розділу навколо чанка
+
+        Розділ, довший за max_chars, обрізається до сусідніх чанків навколо знайденого
+        """
+        section = self.sections[self.section_of[position]]
+        positions = list(section.positions)
+        center = positions.index(position)
+
+        left, right = center, center + 1
+        lengths = self.store.lengths
+        length = int(lengths[position])
+        while left > 0 or right < len(positions):
+            grown = False
+            if right < len(positions):
+                size = int(lengths[positions[right]])
+                if length + size <= max_chars:
+                    length += size
+                    right += 1
+                    grown = True
+            if left > 0:
+                size = int(lengths[positions[left - 1]])
+                if length + size <= max_chars:
+                    length += size
+                    left -= 1
+                    grown = True
+            if not grown:
+                break
+
+        text = "\n".join(self.store.text(i) for i in positions[left:right])
+        return section, text
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        sizes = [len(section.positions) for section in self.sections]
+        return {
+            "sections": len(self.sections),
+            "avg_chunks_per_section": sum(sizes) / len(sizes) if sizes else None,
+            "max_chunks_per_section": max(sizes) if sizes else None
+        }
@@ -1,9 +1,14 @@
+import logging
 from typing import List
 from langchain_text_splitters import TextSplitter
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 import spacy
 from sklearn.metrics.pairwise import cosine_similarity
+from app.rag.splitter.structure_splitter import LegalStructureSplitter
+
+
+logger = logging.getLogger(__name__)
 
 
 class DocumentSplitter(TextSplitter):
@@ -29,8 +34,14 @@ class DocumentSplitter(TextSplitter):
         self.min_chunk_size = min_chunk_size
         self.embedding_batch_size = embedding_batch_size
 
-        # Завантаження spaCy моделі для української мови
-        self.nlp = spacy.load("uk_core_news_sm")
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        """spaCy модель для української мови (завантажується під час першого використання)"""
+        if self._nlp is None:
+            self._nlp = spacy.load("uk_core_news_sm")
+        return self._nlp
 
     def split_text(self, text: str) -> List[str]:
         """Розбиває текст на чанки з урахуванням речень"""
@@ -133,8 +144,9 @@ class DocumentSplitter(TextSplitter):
 class HybridLegalDocumentSplitter:
     """
     Гібридний розбивач з fallback-механізмом
-    Спочатку намагається використати DocumentSplitter,
-    якщо не вдається, то використовує RecursiveCharacterTextSplitter
+    Спочатку намагається розбити документ за нумерацією розділів і пунктів (LegalStructureSplitter),
+    для документів без розпізнаної структури використовує DocumentSplitter,
+    а якщо не вдається і він, то RecursiveCharacterTextSplitter
     """
 
     def __init__(
@@ -142,7 +154,8 @@ class HybridLegalDocumentSplitter:
         embeddings: Embeddings,
         chunk_size: int = 512,
         chunk_overlap: int = 128,
-        embedding_batch_size: int = 128
+        embedding_batch_size: int = 128,
+        structure_aware: bool = True
     ):
         from langchain_text_splitters import RecursiveCharacterTextSplitter
 
@@ -160,12 +173,25 @@ class HybridLegalDocumentSplitter:
             keep_separator=True,
         )
 
+        # Надто великі пункти розбиваються за реченнями тим самим DocumentSplitter
+        self.structure_splitter = LegalStructureSplitter(
+            chunk_size=chunk_size,
+            sentence_splitter=self.splitter.split_text
+        ) if structure_aware else None
+
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """Розбиває документи на чанки"""
         all_chunks = []
 
         for doc in documents:
             try:
+                # Розбиття за структурою документа
+                if self.structure_splitter:
+                    structure_docs = self.structure_splitter.split_document(doc)
+                    if structure_docs:
+                        all_chunks.extend(structure_docs)
+                        continue
+
                 # Розбиття за допомогою DocumentSplitter
                 texts = self.splitter.split_text(doc.page_content)
                 chunk_docs = self.splitter.create_documents(
@@ -176,7 +202,7 @@ class HybridLegalDocumentSplitter:
 
             except Exception as error:
                 # Fallback-механізм
-                print(
+                logger.warning(
                     f"Помилка при розбитті {doc.metadata.get('source')}: {error}. "
                     f"Використовується альтернативний механізм розбиття тексту..."
                 )
@@ -0,0 +1,216 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from langchain_core.documents import Document
+
+
+PAGE_NUMBER = re.compile(r'^\s*\d{1,3}\s*$')
+TOC_LEADER = re.compile(r'\.{4,}\s*\d+\s*$')
+SECTION_HEADING = re.compile(r'^\s*(?:(?:розділ|РОЗДІЛ|Розділ)\s+)?(\d{1,2}|[IVXLC]+)\.\s+(\S.*)$')
+CLAUSE = re.compile(r'^\s*(\d{1,2}(?:\.\d{1,3}){1,4})\.?\s+(\S.*)$')
+ARTICLE = re.compile(r'^\s*(?:Стаття|СТАТТЯ)\s+(\d+)\.?\s*(.*)$')
+
+
+def _is_upper_title(text: str) -> bool:
+    """Заголовок розділу набрано великими літерами"""
+    letters = [c for c in text if c.isalpha()]
+    return len(letters) >= 3 and sum(c.isupper() for c in letters) / len(letters) >= 0.8
+
+
+@dataclass
+class Clause:
+    """Розділ або пункт документа з накопиченим текстом"""
+    number: str
+    section: str
+    section_title: str
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def section_path(self) -> str:
+        """Шлях у структурі документа: розділ › пункт › підпункт"""
+        if not self.number or self.number == self.section:
+            return self.section or ""
+
+        parts = self.number.split(".")
+        path = [".".join(parts[:i]) for i in range(2, len(parts) + 1)]
+        return " › ".join([self.section, *path])
+
+    @property
+    def text(self) -> str:
+        return re.sub(r'\s+', ' ', " ".join(self.lines)).strip()
+
+
+class LegalStructureSplitter:
+    """
+    Розбивач нормативних документів за їхньою нумерацією (скінченний автомат на регулярних виразах)
+
+    Стани: зміст (пропускається) → заголовок розділу ("1. ЗАГАЛЬНІ ПОЛОЖЕННЯ", "Розділ II. ...")
+    → пункти та підпункти (1.1, 3.2.1, "Стаття 5") → продовження тексту поточного пункту.
+
+    Кожен чанк вирівняно за межами пунктів і має метадані section, section_title, clause і section_path.
+    Дрібні сусідні пункти одного розділу об'єднуються до chunk_size, а надто великі пункти
+    розбиваються резервним розбивачем за реченнями (sentence_splitter)
+    """
+
+    def __init__(
+            self,
+            chunk_size: int = 1000,
+            sentence_splitter: Optional[Callable[[str], List[str]]] = None,
+            min_clauses: int = 5,
+            include_header: bool = True
+    ):
+        self.chunk_size = chunk_size
+        self.sentence_splitter = sentence_splitter
+        self.min_clauses = min_clauses
+        self.include_header = include_header
+
+    def parse(self, text: str) -> List[Clause]:
+        """Розбір тексту на розділи і пункти"""
+        lines = text.splitlines()
+        clauses: List[Clause] = []
+        current = Clause(number="", section="", section_title="")
+        section, section_title = "", ""
+        heading_open = False
+
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            i += 1
+
+            if not line or PAGE_NUMBER.match(line):
+                heading_open = False
+                continue
+
+            if TOC_LEADER.search(line):
+                continue
+
+            heading = SECTION_HEADING.match(line)
+            if heading and _is_upper_title(heading.group(2)) and not CLAUSE.match(line):
+                # Рядок змісту: продовження заголовка закінчується номером сторінки
+                lookahead = lines[i].strip() if i < len(lines) else ""
+                if TOC_LEADER.search(lookahead) and _is_upper_title(lookahead):
+                    i += 1
+                    continue
+
+                clauses.append(current)
+                section, section_title = heading.group(1), heading.group(2).strip()
+                current = Clause(number=section, section=section, section_title=section_title)
+                heading_open = True
+                continue
+
+            # Багаторядковий заголовок розділу
+            if heading_open and _is_upper_title(line) and not CLAUSE.match(line):
+                section_title = f"{section_title} {line}"
+                current.section_title = section_title
+                continue
+            heading_open = False
+
+            clause = CLAUSE.match(line)
+            if clause and (not section or clause.group(1).split(".")[0] == section):
+                clauses.append(current)
+                current = Clause(number=clause.group(1), section=section, section_title=section_title)
+                current.lines.append(clause.group(2))
+                continue
+
+            article = ARTICLE.match(line)
+            if article:
+                clauses.append(current)
+                current = Clause(number=article.group(1), section=section, section_title=section_title)
+                current.lines.append(f"Стаття {article.group(1)}. {article.group(2)}")
+                continue
+
+            current.lines.append(line)
+
+        clauses.append(current)
+        return [clause for clause in clauses if clause.text]
+
+    def _header(self, clause: Clause) -> str:
+        if not self.include_header or not clause.section:
+            return ""
+        header = f"{clause.section}. {clause.section_title}"
+        if clause.number and clause.number != clause.section:
+            header += f" › п. {clause.number}"
+        return header + "\n"
+
+    def _metadata(self, clause: Clause, base: dict) -> dict:
+        return {
+            **base,
+            "section": clause.section,
+            "section_title": clause.section_title,
+            "clause": clause.number,
+            "section_path": clause.section_path,
+            "splitting_method": "structure"
+        }
+
+    def split_document(self, document: Document) -> Optional[List[Document]]:
+        """
+        Розбиття документа на чанки за пунктами
+
+        Повертає None, якщо структуру документа не розпізнано (менше min_clauses пунктів)
+        """
+        clauses = self.parse(document.page_content)
+        if sum(1 for clause in clauses if clause.number) < self.min_clauses:
+            return None
+
+        chunks: List[Document] = []
+        buffer: List[Clause] = []
+
+        def flush():
+            if not buffer:
+                return
+            first = buffer[0]
+            content = self._header(first) + "\n".join(
+                (f"{c.number}. " if c.number and c.number != c.section else "") + c.text for c in buffer
+            )
+            metadata = self._metadata(first, document.metadata)
+            if len(buffer) > 1:
+                metadata["clause_end"] = buffer[-1].number
+            chunks.append(Document(page_content=content, metadata=metadata))
+            buffer.clear()
+
+        for clause in clauses:
+            size = len(clause.text)
+
+            # Надто великий пункт розбивається за реченнями, кожна частина зберігає шлях пункту
+            if size > self.chunk_size:
+                flush()
+                for part in self._split_oversized(clause):
+                    chunks.append(Document(
+                        page_content=self._header(clause) + part,
+                        metadata={**self._metadata(clause, document.metadata), "clause_part": True}
+                    ))
+                continue
+
+            buffered = sum(len(c.text) for c in buffer)
+            if buffer and (buffer[0].section != clause.section or buffered + size > self.chunk_size):
+                flush()
+            buffer.append(clause)
+
+        flush()
+
+        for index, chunk in enumerate(chunks):
+            chunk.metadata["chunk_index"] = index
+            chunk.metadata["chunk_length"] = len(chunk.page_content)
+
+        return chunks
+
+    def _split_oversized(self, clause: Clause) -> List[str]:
+        text = (f"{clause.number}. " if clause.number and clause.number != clause.section else "") + clause.text
+
+        if self.sentence_splitter:
+            parts = self.sentence_splitter(text)
+            if parts:
+                return parts
+
+        # Без резервного розбивача - межі речень за регулярним виразом
+        sentences = re.split(r'(?<=[.;!?])\s+', text)
+        parts, current = [], ""
+        for sentence in sentences:
+            if current and len(current) + len(sentence) + 1 > self.chunk_size:
+                parts.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            parts.append(current)
+        return parts
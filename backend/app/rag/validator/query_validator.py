@@ -1,8 +1,14 @@
+import logging
 from dataclasses import dataclass
-from typing import Optional, Set
+from typing import Any, List, Optional, Set
 from langchain_core.language_models import BaseLLM
 
 from app.rag.prompts.prompt_templates import ethics_check_prompt, relevance_check_prompt
+from app.rag.prompts.prompt_cache import PromptCacheStats
+from app.tracing import tracer
+
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -27,6 +33,7 @@ class QueryValidator:
     def __init__(self, llm: BaseLLM, use_llm_validation: bool = True):
         self.llm = llm
         self.use_llm_validation = use_llm_validation
+        self.prompt_cache_stats = PromptCacheStats()
         
         # Ключові слова для fallback-перевірки
         self.knu_keywords = {
@@ -48,6 +55,17 @@ class QueryValidator:
         """
         Валідація запиту
         """
+        mode = "llm" if self.use_llm_validation else "keyword"
+        with tracer.span("validator.validate_query", attributes={"validator.mode": mode}) as span:
+            result = self._validate(query)
+            span.set_attributes({
+                "validator.is_valid": result.is_valid,
+                "validator.is_ethical": result.is_ethical,
+                "validator.is_relevant": result.is_relevant
+            })
+            return result
+
+    def _validate(self, query: str) -> QueryValidationResult:
         # Перевірка на порожній запит
         if not query or len(query.strip()) < 3:
             return QueryValidationResult(
@@ -75,13 +93,20 @@ class QueryValidator:
             # Fallback-валідація запиту за допомогою keyword-based валідації
             return self._keyword_validate(query)
     
+    def _invoke(self, messages: List[Any]) -> str:
+        """Виклик LLM з обліком кешованих токенів запиту"""
+        with tracer.span("validator.llm_check", kind="CLIENT"):
+            response = self.llm.invoke(messages)
+            self.prompt_cache_stats.record_response(response)
+            return response.content.strip()
+
     def _llm_validate(self, query: str) -> QueryValidationResult:
         """Валідація запиту за допомогою LLM"""
         
         # Перевірка запиту на етичність
         try:
-            ethics_prompt = ethics_check_prompt.format(query=query)
-            ethics_response = self.llm.invoke(ethics_prompt).content.strip().upper()
+            ethics_prompt = ethics_check_prompt.format_messages(query=query)
+            ethics_response = self._invoke(ethics_prompt).upper()
             
             is_ethical = "ЕТИЧНИЙ" in ethics_response or "ETHICAL" in ethics_response
             
@@ -93,7 +118,7 @@ class QueryValidator:
                     rejection_reason="Запит стосується неприйнятних тем для академічної системи. Будь ласка, сформулюйте питання, пов'язане з нормативними документами КНУТШ."
                 )
         except Exception as error:
-            print(f"Помилка при перевірці запиту на етичність за допомогою LLM: {error}")
+            logger.error(f"Помилка при перевірці запиту на етичність за допомогою LLM: {error}")
             # Fallback-перевірка запиту на етичність
             if any(keyword in query.lower() for keyword in self.unethical_keywords):
                 return QueryValidationResult(
@@ -105,8 +130,8 @@ class QueryValidator:
         
         # Перевірка релевантності
         try:
-            relevance_prompt = relevance_check_prompt.format(query=query)
-            relevance_response = self.llm.invoke(relevance_prompt).content.strip().upper()
+            relevance_prompt = relevance_check_prompt.format_messages(query=query)
+            relevance_response = self._invoke(relevance_prompt).upper()
             
             is_relevant = "РЕЛЕВАНТНИЙ" in relevance_response or "RELEVANT" in relevance_response
             
@@ -118,7 +143,7 @@ class QueryValidator:
                     rejection_reason="Ваш запит не стосується нормативних документів КНУТШ. Система є призначеною для пошуку інформації в університетських положеннях та регламентах. Будь ласка, сформулюйте питання про правила, процедури або вимоги КНУТШ."
                 )
         except Exception as error:
-            print(f"Помилка при перевірці запиту на релевантність за допомогою LLM: {error}")
+            logger.error(f"Помилка при перевірці запиту на релевантність за допомогою LLM: {error}")
             # Fallback-перевірка запиту на релевантність
             if not any(keyword in query.lower() for keyword in self.knu_keywords):
                 return QueryValidationResult(
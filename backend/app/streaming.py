@@ -0,0 +1,90 @@
+import asyncio
+import time
+import orjson
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+def encode_sse(event: Dict[str, Any]) -> bytes:
+    """Серіалізація події у SSE-кадр (orjson)"""
+    return b"data: " + orjson.dumps(event) + b"\n\n"
+
+
+def _token_frame(tokens: List[str]) -> Dict[str, Any]:
+    return {"type": "token", "data": {"token": "".join(tokens)}}
+
+
+async def coalesce_tokens(
+        events: AsyncIterator[Dict[str, Any]],
+        interval_ms: float = 30,
+        max_chars: int = 256
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Об'єднання послідовних token-подій у кадри
+
+    Кадр відправляється, коли:
+    - з моменту появи першого токена в буфері минуло interval_ms мілісекунд
+    - розмір буфера досяг max_chars символів
+    - надійшла подія іншого типу або потік завершився
+
+    Формат кадру збігається з форматом звичайної token-події, тому клієнт не потребує змін
+    """
+    if interval_ms <= 0:
+        async for event in events:
+            yield event
+        return
+
+    interval = interval_ms / 1000.0
+    buffer: List[str] = []
+    buffered_chars = 0
+    deadline: Optional[float] = None
+    pending: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            # Час очікування вичерпано: відправляємо накопичені токени, не скасовуючи очікування наступної події
+            if not done:
+                yield _token_frame(buffer)
+                buffer, buffered_chars, deadline = [], 0, None
+                continue
+
+            task, pending = pending, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                break
+
+            if event.get("type") == "token":
+                token = event["data"]["token"]
+                if not buffer:
+                    deadline = time.monotonic() + interval
+                buffer.append(token)
+                buffered_chars += len(token)
+
+                if buffered_chars >= max_chars:
+                    yield _token_frame(buffer)
+                    buffer, buffered_chars, deadline = [], 0, None
+                continue
+
+            if buffer:
+                yield _token_frame(buffer)
+                buffer, buffered_chars, deadline = [], 0, None
+
+            yield event
+
+        if buffer:
+            yield _token_frame(buffer)
+
+    finally:
+        # Очікування наступної події має завершитися до закриття вихідного генератора
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,406 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Коди OTLP: вид спану і статус
+SPAN_KINDS = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Значення атрибута у форматі OTLP/JSON (AnyValue)"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class Span:
+    """
+    Спан трасування, сумісний з моделлю OpenTelemetry
+
+    trace_id (16 байт) і span_id (8 байт) у шістнадцятковому вигляді, як у W3C traceparent і OTLP;
+    links - посилання на спани інших трасувань (спільна робота кількох запитів)
+    """
+
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+        "attributes", "events", "links", "status_code", "status_message", "_tracer"
+    )
+
+    def __init__(
+            self,
+            name: str,
+            tracer: "Tracer",
+            parent: Optional["Span"] = None,
+            kind: str = "INTERNAL",
+            attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.links: List[Dict[str, Any]] = []
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+        self._tracer = tracer
+        self.set_attributes(attributes or {})
+
+    def set_attribute(self, key: str, value: Any) -> "Span":
+        if value is not None:
+            self.attributes[key] = value
+        return self
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> "Span":
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+        return self
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> "Span":
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes or {}})
+        return self
+
+    def add_link(self, span: "Span", attributes: Optional[Dict[str, Any]] = None) -> "Span":
+        self.links.append({"trace_id": span.trace_id, "span_id": span.span_id, "attributes": attributes or {}})
+        return self
+
+    def record_exception(self, error: BaseException) -> "Span":
+        self.status_code = STATUS_ERROR
+        self.status_message = str(error)[:500]
+        return self.add_event("exception", {
+            "exception.type": type(error).__name__,
+            "exception.message": str(error)[:500]
+        })
+
+    def end(self):
+        """Завершення спану (повторний виклик ігнорується) і передача його експортеру"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self._tracer._on_end(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [
+                {"name": event["name"], "timeUnixNano": str(event["time_ns"]), "attributes": _otlp_attributes(event["attributes"])}
+                for event in self.events
+            ],
+            "links": [
+                {"traceId": link["trace_id"], "spanId": link["span_id"], "attributes": _otlp_attributes(link["attributes"])}
+                for link in self.links
+            ],
+            "status": {"code": self.status_code, "message": self.status_message} if self.status_code else {}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def export_request(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """Тіло ExportTraceServiceRequest у форматі OTLP/JSON"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [span.to_otlp() for span in spans]
+            }]
+        }]
+    }
+
+
+class FileSpanExporter:
+    """Експорт спанів у файл JSON Lines (один OTLP/JSON запит на пакет; читається otelcol filereceiver)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, spans: List[Span], service_name: str):
+        line = json.dumps(export_request(spans, service_name), ensure_ascii=False)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+class OTLPHttpSpanExporter:
+    """Експорт спанів до OTLP/HTTP колектора (POST /v1/traces з JSON-тілом)"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, spans: List[Span], service_name: str):
+        body = json.dumps(export_request(spans, service_name)).encode("utf-8")
+        request = urllib.request.Request(
+            self.endpoint, data=body, method="POST", headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class BatchSpanProcessor:
+    """
+    Пакетний експорт завершених спанів у фоновому потоці
+
+    Завершення спану лише кладе його в обмежену чергу, тож запит не чекає на диск чи мережу;
+    якщо черга заповнена, спан відкидається (лічильник dropped)
+    """
+
+    def __init__(
+            self,
+            exporter: Any,
+            service_name: str,
+            max_queue_size: int = 2048,
+            batch_size: int = 256,
+            flush_interval: float = 2.0
+    ):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self.counters = {"exported": 0, "dropped": 0, "export_errors": 0}
+
+        self._worker = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._worker.start()
+
+    def on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def _drain(self, timeout: Optional[float]) -> List[Span]:
+        batch: List[Span] = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: List[Span]):
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch, self.service_name)
+            self.counters["exported"] += len(batch)
+        except Exception as error:
+            self.counters["export_errors"] += 1
+            logging.getLogger(__name__).warning(f"Не вдалося експортувати {len(batch)} спанів: {error}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._export(self._drain(self.flush_interval))
+
+    def shutdown(self):
+        """Зупинка фонового потоку з експортом спанів, що залишилися в черзі"""
+        self._stopped.set()
+        self._worker.join(timeout=self.flush_interval + 1)
+        while not self._queue.empty():
+            self._export(self._drain(None))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "queued": self._queue.qsize(), "queue_capacity": self._queue.maxsize}
+
+
+class Tracer:
+    """
+    Трасувальник запитів
+
+    Поточний спан зберігається в contextvars. Потоки executor-а не успадковують контекст,
+    тож функції для run_in_executor обгортаються bind(), а асинхронні генератори
+    (етапи яких виконуються в різних задачах) передають батьківський спан явно (parent=...)
+    """
+
+    def __init__(self):
+        self.processor: Optional[BatchSpanProcessor] = None
+
+    def configure(self, processor: Optional[BatchSpanProcessor]):
+        if self.processor:
+            self.processor.shutdown()
+        self.processor = processor
+
+    def _on_end(self, span: Span):
+        if self.processor:
+            self.processor.on_end(span)
+
+    def start_span(
+            self,
+            name: str,
+            attributes: Optional[Dict[str, Any]] = None,
+            parent: Optional[Span] = None,
+            kind: str = "INTERNAL",
+            root: bool = False
+    ) -> Span:
+        """Створення спану без активації (завершується викликом end()); root=True - початок нового трасування"""
+        parent = None if root else parent or _current_span.get()
+        return Span(name, self, parent=parent, kind=kind, attributes=attributes)
+
+    @contextmanager
+    def span(
+            self,
+            name: str,
+            attributes: Optional[Dict[str, Any]] = None,
+            parent: Optional[Span] = None,
+            kind: str = "INTERNAL"
+    ):
+        """Спан синхронної ділянки коду: активний у контексті блоку, помилка записується в статус"""
+        span = self.start_span(name, attributes, parent, kind)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as error:
+            span.record_exception(error)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    @contextmanager
+    def use_span(self, span: Optional[Span]):
+        """Активація наявного спану (без завершення) для вкладених спанів і журналювання"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def bind(self, function: Callable, parent: Optional[Span] = None) -> Callable:
+        """Обгортка функції для іншого потоку: батьківський спан (явний або поточний) стає активним"""
+        span = parent or _current_span.get()
+
+        @wraps(function)
+        def bound(*args, **kwargs):
+            with self.use_span(span):
+                return function(*args, **kwargs)
+        return bound
+
+    def stats(self) -> Dict[str, Any]:
+        return self.processor.stats() if self.processor else {"enabled": False}
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def configure_tracing(
+        exporter: str,
+        service_name: str,
+        file_path: str = "./logs/traces.jsonl",
+        otlp_endpoint: str = "http://localhost:4318/v1/traces"
+):
+    """Налаштування експорту спанів: file, otlp або none"""
+    if exporter == "file":
+        span_exporter = FileSpanExporter(file_path)
+    elif exporter == "otlp":
+        span_exporter = OTLPHttpSpanExporter(otlp_endpoint)
+    else:
+        tracer.configure(None)
+        return
+
+    tracer.configure(BatchSpanProcessor(span_exporter, service_name))
+
+
+class TraceContextFilter(logging.Filter):
+    """Додавання trace_id і span_id активного спану до записів журналу"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span else "-"
+        record.span_id = span.span_id if span else "-"
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Структурований журнал: один JSON-об'єкт на рядок"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", "-"),
+            "span_id": getattr(record, "span_id", "-"),
+            "thread": record.threadName
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(level: str = "INFO", log_format: str = "text") -> logging.handlers.QueueListener:
+    """
+    Неблокувальне журналювання з ідентифікаторами трасування
+
+    Записи потрапляють у чергу (QueueHandler) і виводяться окремим потоком (QueueListener),
+    тож потік циклу подій не блокується на записі в stdout. Контекст трасування додається
+    фільтром у потоці, що створив запис
+    """
+    stream_handler = logging.StreamHandler()
+    if log_format == "json":
+        stream_handler.setFormatter(JsonLogFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [trace=%(trace_id)s span=%(span_id)s] %(message)s'
+        ))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(TraceContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
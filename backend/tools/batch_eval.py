@@ -0,0 +1,310 @@
+"""
+Пакетна оцінка якості на еталонному наборі запитань (golden set)
+
+Формат набору - JSONL, по одному запитанню в рядку:
+    {"id": "q1", "question": "Скільки разів можна перескладати екзамен?", "expected_sources": ["polozhennia.pdf"],
+     "expected_phrases": ["не більше двох разів"]}
+Поля id, expected_sources і expected_phrases є необов'язковими; звичайний текстовий файл (запитання в рядку) також підтримується.
+
+Пошук і генерація виконуються з обмеженою паралельністю, а оцінка якості - в окремому пулі потоків,
+тож запитання оцінюються, щойно для них згенеровано відповідь. Звіт містить результати для кожного запитання,
+середні метрики, перцентилі затримок, а також знімок параметрів і хеш набору для порівняння запусків.
+
+Запуск:
+    python -m tools.batch_eval --golden-set golden.jsonl --concurrency 8 --judge-workers 4 --output report.json
+    python -m tools.batch_eval --golden-set golden.jsonl --baseline previous_report.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from tools.load_test import percentiles
+
+
+METRICS = ["faithfulness", "answer_relevancy", "context_relevancy", "mrr", "map", "overall_score"]
+
+
+@dataclass
+class GoldenQuestion:
+    """Запитання еталонного набору"""
+    id: str
+    question: str
+    expected_sources: List[str] = field(default_factory=list)
+    expected_phrases: List[str] = field(default_factory=list)
+
+
+@dataclass
+class QuestionResult:
+    """Результат оцінки одного запитання"""
+    id: str
+    question: str
+    answer: str = ""
+    sources: List[str] = field(default_factory=list)
+    retrieval_latency: Optional[float] = None
+    generation_latency: Optional[float] = None
+    evaluation_latency: Optional[float] = None
+    total_latency: Optional[float] = None
+    metrics: Dict[str, float] = field(default_factory=dict)
+    source_hit: Optional[bool] = None
+    source_recall: Optional[float] = None
+    source_reciprocal_rank: Optional[float] = None
+    error: Optional[str] = None
+
+
+def load_golden_set(path: str) -> List[GoldenQuestion]:
+    """Читання еталонного набору (JSONL або текст)"""
+    questions = []
+    with open(path, encoding="utf-8") as file:
+        for i, line in enumerate(file):
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith("{"):
+                item = json.loads(line)
+                questions.append(GoldenQuestion(
+                    id=str(item.get("id", i + 1)),
+                    question=item["question"],
+                    expected_sources=item.get("expected_sources", []),
+                    expected_phrases=item.get("expected_phrases", [])
+                ))
+            else:
+                questions.append(GoldenQuestion(id=str(i + 1), question=line))
+
+    return questions
+
+
+def golden_set_hash(questions: List[GoldenQuestion]) -> str:
+    digest = hashlib.sha256()
+    for question in questions:
+        digest.update(json.dumps(asdict(question), ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def source_metrics(sources: List[str], expected: List[str]) -> Dict[str, Any]:
+    """Влучання очікуваних джерел у знайдені контексти (за назвою файлу)"""
+    if not expected:
+        return {}
+
+    names = [os.path.basename(source) for source in sources]
+    expected_names = {os.path.basename(source) for source in expected}
+
+    reciprocal_rank = 0.0
+    for rank, name in enumerate(names, 1):
+        if name in expected_names:
+            reciprocal_rank = 1.0 / rank
+            break
+
+    found = expected_names & set(names)
+    return {
+        "source_hit": bool(found),
+        "source_recall": len(found) / len(expected_names),
+        "source_reciprocal_rank": reciprocal_rank
+    }
+
+
+async def evaluate_question(
+        pipeline: Any,
+        item: GoldenQuestion,
+        semaphore: asyncio.Semaphore,
+        judge_pool: ThreadPoolExecutor
+) -> QuestionResult:
+    """Пошук, генерація і оцінка одного запитання"""
+    loop = asyncio.get_running_loop()
+    result = QuestionResult(id=item.id, question=item.question)
+    started = None
+
+    try:
+        # Пошук і генерація обмежуються семафором, оцінка виконується вже поза ним
+        async with semaphore:
+            started = retrieval_started = time.perf_counter()
+            retrieved = await loop.run_in_executor(
+                None, partial(pipeline.retriever.retrieve, item.question, return_scores=True)
+            )
+            result.retrieval_latency = time.perf_counter() - retrieval_started
+
+            packed_context = pipeline.context_packer.pack([r.document for r in retrieved])
+            result.sources = [doc.metadata.get("source", "Unknown") for doc in packed_context.documents]
+
+            generation_started = time.perf_counter()
+            prompt = pipeline.prompt_template.format_messages(context=packed_context.text, question=item.question)
+            response = await pipeline.llm_gateway.interactive.ainvoke(prompt)
+            result.answer = response.content
+            result.generation_latency = time.perf_counter() - generation_started
+
+        result.__dict__.update(source_metrics(result.sources, item.expected_sources))
+
+        if pipeline.evaluator:
+            evaluation_started = time.perf_counter()
+            metrics = await loop.run_in_executor(
+                judge_pool,
+                partial(
+                    pipeline.evaluator.evaluate,
+                    query=item.question,
+                    answer=result.answer,
+                    contexts=packed_context.documents,
+                    context_scores=pipeline._context_scores(packed_context.documents, retrieved)
+                )
+            )
+            result.evaluation_latency = time.perf_counter() - evaluation_started
+            result.metrics = {
+                "faithfulness": metrics.faithfulness,
+                "answer_relevancy": metrics.answer_relevancy,
+                "context_relevancy": metrics.context_relevancy,
+                "mrr": metrics.mrr,
+                "map": metrics.map_score,
+                "overall_score": metrics.overall_score
+            }
+
+    except Exception as error:
+        result.error = f"{type(error).__name__}: {error}"
+
+    # Загальна затримка не враховує очікування у черзі семафора
+    if started is not None:
+        result.total_latency = time.perf_counter() - started
+    return result
+
+
+def aggregate(results: List[QuestionResult]) -> Dict[str, Any]:
+    """Середні метрики і перцентилі затримок"""
+    succeeded = [r for r in results if r.error is None]
+
+    def mean(values: List[float]) -> Optional[float]:
+        return sum(values) / len(values) if values else None
+
+    with_sources = [r for r in succeeded if r.source_hit is not None]
+
+    return {
+        "questions": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "metrics": {
+            metric: mean([r.metrics[metric] for r in succeeded if metric in r.metrics]) for metric in METRICS
+        },
+        "sources": {
+            "questions_with_expected_sources": len(with_sources),
+            "hit_rate": mean([float(r.source_hit) for r in with_sources]),
+            "recall": mean([r.source_recall for r in with_sources]),
+            "mrr": mean([r.source_reciprocal_rank for r in with_sources])
+        },
+        "latency": {
+            "retrieval": percentiles([r.retrieval_latency for r in succeeded if r.retrieval_latency is not None]),
+            "generation": percentiles([r.generation_latency for r in succeeded if r.generation_latency is not None]),
+            "evaluation": percentiles([r.evaluation_latency for r in succeeded if r.evaluation_latency is not None]),
+            "total": percentiles([r.total_latency for r in succeeded if r.total_latency is not None])
+        }
+    }
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Різниця середніх метрик і p95 затримок відносно попереднього запуску"""
+    def delta(current: Optional[float], previous: Optional[float]) -> Optional[float]:
+        if current is None or previous is None:
+            return None
+        return current - previous
+
+    return {
+        "metrics": {
+            metric: delta(summary["metrics"].get(metric), baseline.get("metrics", {}).get(metric))
+            for metric in METRICS
+        },
+        "latency_p95": {
+            stage: delta(values.get("p95"), baseline.get("latency", {}).get(stage, {}).get("p95"))
+            for stage, values in summary["latency"].items()
+        }
+    }
+
+
+async def run_batch_evaluation(
+        pipeline: Any,
+        questions: List[GoldenQuestion],
+        concurrency: int = 8,
+        judge_workers: int = 4
+) -> Dict[str, Any]:
+    """Запуск пакетної оцінки і формування звіту"""
+    semaphore = asyncio.Semaphore(concurrency)
+    judge_pool = ThreadPoolExecutor(max_workers=judge_workers, thread_name_prefix="batch-judge")
+
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            evaluate_question(pipeline, item, semaphore, judge_pool) for item in questions
+        ))
+    finally:
+        judge_pool.shutdown(wait=False)
+    duration = time.perf_counter() - started
+
+    return {
+        "run": {
+            "started_at": started_at,
+            "duration": duration,
+            "golden_set_hash": golden_set_hash(questions),
+            "concurrency": concurrency,
+            "judge_workers": judge_workers,
+            "parameters": {
+                "chunk_size": pipeline.chunk_size,
+                "chunk_overlap": pipeline.chunk_overlap,
+                "top_k": pipeline.top_k,
+                "rerank_top_k": pipeline.rerank_top_k,
+                "bm25_weight": pipeline.bm25_weight,
+                "vector_weight": pipeline.vector_weight
+            },
+            "evaluator": type(pipeline.evaluator).__name__ if pipeline.evaluator else None
+        },
+        "summary": aggregate(results),
+        "questions": [asdict(r) for r in results]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетна оцінка якості на еталонному наборі запитань")
+    parser.add_argument("--golden-set", required=True, help="Файл із запитаннями (JSONL або текст)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Кількість одночасних пошуків і генерацій")
+    parser.add_argument("--judge-workers", type=int, default=4, help="Кількість потоків оцінки якості")
+    parser.add_argument("--limit", type=int, default=None, help="Обмеження кількості запитань")
+    parser.add_argument("--baseline", default=None, help="Попередній звіт для порівняння")
+    parser.add_argument("--output", default=None, help="Файл для збереження звіту у форматі JSON")
+    args = parser.parse_args()
+
+    from app.rag.rag_pipeline import RAGPipeline
+
+    questions = load_golden_set(args.golden_set)[:args.limit]
+    pipeline = RAGPipeline(initialize=True)
+
+    report = asyncio.run(run_batch_evaluation(
+        pipeline,
+        questions,
+        concurrency=args.concurrency,
+        judge_workers=args.judge_workers
+    ))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+        if baseline.get("run", {}).get("golden_set_hash") != report["run"]["golden_set_hash"]:
+            print("Попередження: попередній звіт отримано на іншому наборі запитань")
+        report["comparison"] = compare(report["summary"], baseline.get("summary", {}))
+
+    summary_json = json.dumps(
+        {key: report[key] for key in ("run", "summary", "comparison") if key in report},
+        ensure_ascii=False,
+        indent=2
+    )
+    print(summary_json)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
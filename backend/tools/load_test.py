@@ -0,0 +1,357 @@
+"""
+Навантажувальне тестування /query/stream
+
+Запускає N одночасних SSE-клієнтів і звітує про пропускну здатність, p50/p95/p99 часу до першого токена,
+час до повної відповіді, затримку циклу подій сервера (лише --in-process) і використання пам'яті (RSS).
+
+Режими:
+    # Зовнішній сервер (RSS сервера - за його PID)
+    python -m tools.load_test --url http://localhost:8000 --concurrency 20 --requests 200 --pid 1234
+
+    # Сервер у цьому ж процесі разом із заглушкою LLM (без витрат квоти OpenAI)
+    python -m tools.load_test --in-process --start-stub --concurrency 20 --requests 200
+
+    # Без кешу результатів пошуку і об'єднання однакових запитів (кожен запит проходить увесь пайплайн)
+    python -m tools.load_test --in-process --start-stub --no-cache --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+import httpx
+
+
+DEFAULT_QUESTIONS = [
+    "Скільки разів студент може перескладати екзамен?",
+    "Які підстави для надання академічної відпустки студенту?",
+    "Як проводиться семестровий контроль у КНУ?",
+    "Які права має здобувач освіти щодо вибору навчальних дисциплін?",
+    "Як нараховується академічна стипендія?"
+]
+
+
+@dataclass
+class RequestResult:
+    """Результат одного SSE-запиту"""
+    ok: bool
+    ttft: Optional[float] = None
+    total: Optional[float] = None
+    tokens: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadTestReport:
+    """Зведений звіт навантажувального тесту"""
+    requests: int
+    distinct_questions: int
+    concurrency: int
+    succeeded: int
+    failed: int
+    duration: float
+    throughput_rps: float
+    token_frames_per_second: float
+    ttft: Dict[str, float]
+    total_time: Dict[str, float]
+    event_loop_lag: Optional[Dict[str, float]] # None для зовнішнього сервера: цикл подій клієнта не показовий
+    rss_mb: Dict[str, float]
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, середнє і максимум"""
+    if not values:
+        return {}
+
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "mean": sum(ordered) / len(ordered),
+        "max": ordered[-1]
+    }
+
+
+def read_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """RSS процесу в МБ (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_query(client: httpx.AsyncClient, question: str, return_evaluation: bool) -> RequestResult:
+    """Один SSE-запит з вимірюванням часу до першого токена і до завершення"""
+    started = time.perf_counter()
+    result = RequestResult(ok=False)
+
+    try:
+        async with client.stream(
+            "GET",
+            "/query/stream",
+            params={"question": question, "return_evaluation": str(return_evaluation).lower()}
+        ) as response:
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                return result
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+
+                event = json.loads(line[6:])
+                event_type = event.get("type")
+
+                if event_type == "token":
+                    if result.ttft is None:
+                        result.ttft = time.perf_counter() - started
+                    result.tokens += 1
+                elif event_type == "error":
+                    result.error = event.get("data", {}).get("message", "error")[:80]
+                    return result
+                elif event_type == "done":
+                    result.ok = True
+                    result.total = time.perf_counter() - started
+                    return result
+
+        result.error = "stream closed without done"
+
+    except Exception as error:
+        result.error = type(error).__name__
+
+    return result
+
+
+async def monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.05):
+    """Вимірювання затримки циклу подій: наскільки пізніше за очікуване прокидається таймер"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def monitor_rss(samples: List[float], stop: asyncio.Event, pid: Optional[int], interval: float = 0.5):
+    while not stop.is_set():
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+async def run_load_test(
+        base_url: str,
+        questions: List[str],
+        concurrency: int,
+        total_requests: int,
+        return_evaluation: bool = False,
+        server_pid: Optional[int] = None,
+        timeout: float = 120.0,
+        measure_loop_lag: bool = False
+) -> LoadTestReport:
+    """
+    Запуск навантаження і формування звіту
+
+    measure_loop_lag - вимірювати затримку циклу подій цього процесу; має сенс лише для сервера
+    в цьому ж процесі (--in-process), інакше вимірювався б цикл подій клієнта навантаження
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(questions[i % len(questions)])
+
+    results: List[RequestResult] = []
+    lag_samples: List[float] = []
+    rss_samples: List[float] = []
+    stop = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+
+        async def worker():
+            while True:
+                try:
+                    question = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results.append(await run_query(client, question, return_evaluation))
+
+        monitors = [asyncio.create_task(monitor_rss(rss_samples, stop, server_pid))]
+        if measure_loop_lag:
+            monitors.append(asyncio.create_task(monitor_loop_lag(lag_samples, stop)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+        stop.set()
+        await asyncio.gather(*monitors)
+
+    succeeded = [r for r in results if r.ok]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r.ok:
+            errors[r.error or "unknown"] = errors.get(r.error or "unknown", 0) + 1
+
+    return LoadTestReport(
+        requests=len(results),
+        distinct_questions=len(set(questions)),
+        concurrency=concurrency,
+        succeeded=len(succeeded),
+        failed=len(results) - len(succeeded),
+        duration=duration,
+        throughput_rps=len(succeeded) / duration if duration else 0.0,
+        token_frames_per_second=sum(r.tokens for r in succeeded) / duration if duration else 0.0,
+        ttft=percentiles([r.ttft for r in succeeded if r.ttft is not None]),
+        total_time=percentiles([r.total for r in succeeded if r.total is not None]),
+        event_loop_lag=percentiles(lag_samples) if measure_loop_lag else None,
+        rss_mb={"start": rss_samples[0], "peak": max(rss_samples), "end": rss_samples[-1]} if rss_samples else {},
+        errors=errors
+    )
+
+
+def start_stub_server(args) -> subprocess.Popen:
+    """Запуск заглушки LLM в окремому процесі"""
+    command = [
+        sys.executable, "-m", "tools.stub_llm_server",
+        "--port", str(args.stub_port),
+        "--tokens-per-second", str(args.stub_tokens_per_second),
+        "--ttft", str(args.stub_ttft),
+        "--error-rate", str(args.stub_error_rate)
+    ]
+    process = subprocess.Popen(command)
+
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", args.stub_port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError("Заглушку LLM не вдалося запустити")
+
+
+async def run_in_process(args, questions: List[str]) -> LoadTestReport:
+    """Запуск main.app у цьому ж процесі (через uvicorn) і навантаження на нього"""
+    import uvicorn
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+
+    while not server.started:
+        if server_task.done():
+            raise RuntimeError("Сервер не вдалося запустити")
+        await asyncio.sleep(0.1)
+
+    try:
+        return await run_load_test(
+            base_url=f"http://127.0.0.1:{port}",
+            questions=questions,
+            concurrency=args.concurrency,
+            total_requests=args.requests,
+            return_evaluation=args.return_evaluation,
+            measure_loop_lag=True
+        )
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Навантажувальне тестування /query/stream")
+    parser.add_argument("--url", default="http://localhost:8000", help="Адреса зовнішнього сервера")
+    parser.add_argument("--in-process", action="store_true", help="Запустити main.app у цьому процесі")
+    parser.add_argument("--pid", type=int, default=None, help="PID зовнішнього сервера для вимірювання RSS")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--questions", default=None, help="Файл із запитаннями (по одному в рядку)")
+    parser.add_argument("--return-evaluation", action="store_true")
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Вимкнути кеш результатів пошуку і об'єднання однакових запитів (лише з --in-process)"
+    )
+    parser.add_argument("--output", default=None, help="Файл для збереження звіту у форматі JSON")
+    parser.add_argument("--start-stub", action="store_true", help="Запустити локальну заглушку LLM")
+    parser.add_argument("--stub-port", type=int, default=9000)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--stub-ttft", type=float, default=0.4)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as file:
+            questions = [line.strip() for line in file if line.strip()]
+
+    if args.no_cache:
+        if not args.in_process:
+            parser.error("--no-cache діє лише з --in-process; кеші зовнішнього сервера вимикаються його налаштуваннями")
+        # Налаштування має бути задано до імпорту app.config
+        os.environ["ENABLE_RETRIEVAL_CACHE"] = "false"
+        os.environ["ENABLE_SINGLE_FLIGHT"] = "false"
+    elif args.requests > 2 * len(set(questions)):
+        print(
+            f"Увага: {args.requests} запитів на {len(set(questions))} різних запитань - з увімкненими кешем пошуку "
+            f"і об'єднанням однакових запитів більшість запитів вимірюватиме влучання в кеш. "
+            f"Використайте --questions з більшим набором запитань або --no-cache (з --in-process)",
+            file=sys.stderr
+        )
+
+    stub_process = None
+    if args.start_stub:
+        stub_process = start_stub_server(args)
+        # Налаштування має бути задано до імпорту app.config
+        os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+
+    try:
+        if args.in_process:
+            report = asyncio.run(run_in_process(args, questions))
+        else:
+            report = asyncio.run(run_load_test(
+                base_url=args.url,
+                questions=questions,
+                concurrency=args.concurrency,
+                total_requests=args.requests,
+                return_evaluation=args.return_evaluation,
+                server_pid=args.pid
+            ))
+    finally:
+        if stub_process:
+            stub_process.terminate()
+
+    report_json = json.dumps(asdict(report), ensure_ascii=False, indent=2)
+    print(report_json)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Локальний OpenAI-сумісний сервер-заглушка для навантажувального тестування
+
+Імітує POST /v1/chat/completions (потоковий і звичайний режими) з налаштовуваними
+швидкістю генерації токенів, часом до першого токена та часткою помилок.
+
+Запуск:
+    python -m tools.stub_llm_server --port 9000 --tokens-per-second 50 --ttft 0.4 --error-rate 0.01
+
+Після цього бекенд спрямовується на заглушку змінною середовища LLM_BASE_URL=http://localhost:9000/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class StubConfig:
+    """Параметри поведінки заглушки"""
+    tokens_per_second: float = 50.0
+    ttft: float = 0.4
+    ttft_jitter: float = 0.1
+    answer_tokens: int = 120
+    error_rate: float = 0.0
+
+
+ANSWER_WORDS = (
+    "Згідно з пунктом 3.2 Положення про організацію освітнього процесу здобувач вищої освіти "
+    "має право на повторне складання семестрового контролю не більше двох разів"
+).split()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+def _judge_answer(system_prompt: str) -> str:
+    """Відповідь для службових запитів (оцінка якості, валідація)"""
+    if "individual_score" in system_prompt:
+        return json.dumps({"individual_score": [True, True, False], "overall_score": 0.7})
+    if "НЕЕТИЧНИЙ" in system_prompt:
+        return "ЕТИЧНИЙ"
+    if "НЕРЕЛЕВАНТНИЙ" in system_prompt:
+        return "РЕЛЕВАНТНИЙ"
+    if "від 0.0 до 1.0" in system_prompt:
+        return f"{random.uniform(0.6, 1.0):.2f}"
+    return ""
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    """Створення застосунку-заглушки"""
+    app = FastAPI(title="Заглушка OpenAI API")
+    seen_prefixes = set()
+    counters = {"requests": 0, "streams": 0, "errors_injected": 0}
+
+    def usage(messages: List[Dict[str, Any]], completion_tokens: int) -> Dict[str, Any]:
+        system_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+
+        # Імітація кешування префікса: повторний системний префікс вважається кешованим
+        prefix_hash = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()
+        cached_tokens = _estimate_tokens(system_prompt) if system_prompt and prefix_hash in seen_prefixes else 0
+        seen_prefixes.add(prefix_hash)
+
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "stub")
+        counters["requests"] += 1
+
+        if random.random() < config.error_rate:
+            counters["errors_injected"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Injected error", "type": "server_error"}}
+            )
+
+        system_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        judge_answer = _judge_answer(system_prompt)
+
+        if not body.get("stream"):
+            await asyncio.sleep(max(0.0, config.ttft + random.uniform(-config.ttft_jitter, config.ttft_jitter)))
+            content = judge_answer or " ".join(ANSWER_WORDS)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage(messages, _estimate_tokens(content))
+            }
+
+        counters["streams"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def stream():
+            def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            await asyncio.sleep(max(0.0, config.ttft + random.uniform(-config.ttft_jitter, config.ttft_jitter)))
+            yield chunk({"role": "assistant", "content": ""})
+
+            interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+            for i in range(config.answer_tokens):
+                yield chunk({"content": ANSWER_WORDS[i % len(ANSWER_WORDS)] + " "})
+                if interval:
+                    await asyncio.sleep(interval)
+
+            yield chunk({}, finish_reason="stop")
+
+            if include_usage:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage(messages, config.answer_tokens)
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-сумісна заглушка LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--ttft", type=float, default=0.4, help="Час до першого токена, с")
+    parser.add_argument("--ttft-jitter", type=float, default=0.1)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Частка запитів, що завершуються помилкою 500")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = StubConfig(
+        tokens_per_second=args.tokens_per_second,
+        ttft=args.ttft,
+        ttft_jitter=args.ttft_jitter,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate
+    )
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
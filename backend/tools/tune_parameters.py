@@ -0,0 +1,449 @@
+"""
+Офлайн-перебір і автоналаштування параметрів пошуку на розміченому наборі запитань
+
+Розмітка - той самий JSONL, що й для tools.batch_eval: чанк вважається релевантним, якщо його джерело
+входить до expected_sources і (якщо задано) він містить хоча б одну з expected_phrases.
+
+Перебираються chunk_size, chunk_overlap, top_k, rerank_top_k і ваги bm25_weight/vector_weight:
+- кожен варіант розбиття будується один раз: текст PDF і вбудовування чанків беруться з постійних кешів;
+  структурний розбивач враховує chunk_overlap лише для надто великих пунктів і документів без нумерації,
+  тож варіант з тими самими чанками, що й уже оцінений, пропускається
+- для кожного запитання один раз обчислюються оцінки BM25, щільного пошуку і крос-енкодера,
+  після чого всі комбінації злиття (зважений RRF, як у EnsembleRetriever) і re-ranking
+  оцінюються векторизовано (NumPy) без повторних викликів моделей
+- затримка оцінюється за виміряним часом BM25, щільного пошуку і re-ranking однієї пари
+
+Результат - фронт Парето "якість пошуку (MRR) - затримка" з параметрами у форматі POST /parameters
+
+Запуск:
+    python -m tools.tune_parameters --golden-set golden.jsonl --output tuning.json
+    python -m tools.tune_parameters --golden-set golden.jsonl --apply http://localhost:8000
+"""
+import argparse
+import hashlib
+import json
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from tools.batch_eval import GoldenQuestion, load_golden_set
+
+
+RRF_C = 60 # Константа зваженого RRF у EnsembleRetriever
+
+
+@dataclass
+class ChunkingVariant:
+    """Варіант розбиття на чанки з попередньо обчисленими індексами"""
+    chunk_size: int
+    chunk_overlap: int
+    documents: List[Document]
+    vectors: np.ndarray
+    bm25: BM25Okapi
+    build_time: float
+
+
+@dataclass
+class QuestionScores:
+    """Попередньо обчислені оцінки одного запитання для одного варіанта розбиття"""
+    labels: np.ndarray
+    bm25_ranks: np.ndarray
+    dense_ranks: np.ndarray
+    rerank_scores: Optional[np.ndarray]
+    bm25_time: float
+    dense_time: float
+
+
+@dataclass
+class TuningResult:
+    """Якість і затримка однієї комбінації параметрів"""
+    parameters: Dict[str, Any]
+    mrr: float
+    hit_rate: float
+    fusion_mrr: float
+    latency_ms: float
+    context_chars: float
+    pareto: bool = False
+
+
+def parse_list(value: str, cast=float) -> List[Any]:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def split_corpus(
+        text_documents: List[Document],
+        chunk_size: int,
+        chunk_overlap: int,
+        embeddings: Any,
+        structure_aware: bool = True
+) -> List[Document]:
+    """Розбиття на чанки тим самим розбивачем, що й у RAGPipeline"""
+    from app.rag.splitter.custom_splitter import HybridLegalDocumentSplitter
+
+    splitter = HybridLegalDocumentSplitter(
+        embeddings=embeddings,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        structure_aware=structure_aware
+    )
+    return splitter.split_documents(text_documents)
+
+
+def chunks_hash(documents: List[Document]) -> str:
+    """Відбиток розбиття (джерело і текст чанків) для виявлення однакових варіантів"""
+    digest = hashlib.sha256()
+    for doc in documents:
+        digest.update(str(doc.metadata.get("source")).encode("utf-8") + b"\0")
+        digest.update(doc.page_content.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def build_variant(
+        documents: List[Document],
+        chunk_size: int,
+        chunk_overlap: int,
+        embeddings: Any,
+        split_time: float = 0.0
+) -> ChunkingVariant:
+    """Побудова BM25 та матриці вбудовувань варіанта розбиття (вбудовування - з постійного кешу)"""
+    started = time.perf_counter()
+
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    # Та сама токенізація, що й у BM25Retriever за замовчуванням
+    bm25 = BM25Okapi([doc.page_content.split() for doc in documents])
+
+    return ChunkingVariant(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        documents=documents,
+        vectors=vectors,
+        bm25=bm25,
+        build_time=split_time + time.perf_counter() - started
+    )
+
+
+def relevance_labels(item: GoldenQuestion, documents: List[Document]) -> np.ndarray:
+    """Розмітка релевантності чанків для запитання"""
+    labels = np.ones(len(documents), dtype=bool)
+
+    if item.expected_sources:
+        expected = set(item.expected_sources)
+        labels &= np.array([doc.metadata.get("source") in expected for doc in documents], dtype=bool)
+
+    if item.expected_phrases:
+        phrases = [phrase.lower() for phrase in item.expected_phrases]
+        labels &= np.array([any(p in doc.page_content.lower() for p in phrases) for doc in documents], dtype=bool)
+
+    return labels
+
+
+def ranks_from_scores(scores: np.ndarray) -> np.ndarray:
+    """Позиція (з нуля) кожного чанка в ранжуванні за спаданням оцінки"""
+    ranks = np.empty(len(scores), dtype=np.int64)
+    ranks[np.argsort(-scores, kind="stable")] = np.arange(len(scores))
+    return ranks
+
+
+def score_question(
+        item: GoldenQuestion,
+        query_vector: np.ndarray,
+        variant: ChunkingVariant,
+        max_candidates: int,
+        cross_encoder: Any
+) -> Tuple[QuestionScores, float, int]:
+    """Оцінки BM25, щільного пошуку і крос-енкодера для одного запитання"""
+    started = time.perf_counter()
+    bm25_scores = np.asarray(variant.bm25.get_scores(item.question.split()))
+    bm25_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    dense_scores = variant.vectors @ query_vector
+    dense_time = time.perf_counter() - started
+
+    bm25_ranks = ranks_from_scores(bm25_scores)
+    dense_ranks = ranks_from_scores(dense_scores)
+
+    rerank_scores = None
+    rerank_time, rerank_pairs = 0.0, 0
+    if cross_encoder is not None:
+        # Крос-енкодер оцінює лише кандидатів найбільшого top_k (решта варіантів - їх підмножини)
+        candidates = np.flatnonzero((bm25_ranks < max_candidates) | (dense_ranks < max_candidates))
+        rerank_scores = np.full(len(variant.documents), -np.inf, dtype=np.float32)
+
+        started = time.perf_counter()
+        pairs = [[item.question, variant.documents[i].page_content] for i in candidates]
+        rerank_scores[candidates] = np.asarray(cross_encoder.predict(pairs), dtype=np.float32)
+        rerank_time, rerank_pairs = time.perf_counter() - started, len(pairs)
+
+    return QuestionScores(
+        labels=relevance_labels(item, variant.documents),
+        bm25_ranks=bm25_ranks,
+        dense_ranks=dense_ranks,
+        rerank_scores=rerank_scores,
+        bm25_time=bm25_time,
+        dense_time=dense_time
+    ), rerank_time, rerank_pairs
+
+
+def reciprocal_ranks(top: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Обернений ранг першого релевантного чанка для кожного рядка матриці top [W, r]"""
+    hits = labels[top]
+    first = np.argmax(hits, axis=1)
+    return np.where(hits.any(axis=1), 1.0 / (first + 1), 0.0)
+
+
+def evaluate_variant(
+        variant: ChunkingVariant,
+        scores: List[QuestionScores],
+        top_ks: List[int],
+        rerank_top_ks: List[int],
+        weights: np.ndarray,
+        rerank_pair_time: float
+) -> List[TuningResult]:
+    """Векторизована оцінка всіх комбінацій злиття і re-ranking для одного варіанта розбиття"""
+    results = []
+    lengths = np.array([len(doc.page_content) for doc in variant.documents], dtype=np.float64)
+
+    for top_k in top_ks:
+        k = top_k * 2 # Кожен ретривер повертає top_k * 2 кандидатів
+
+        # Накопичення метрик для кожного rerank_top_k (рядки) і пари ваг (стовпці)
+        mrr = np.zeros((len(rerank_top_ks), len(weights)))
+        fusion_mrr = np.zeros((len(rerank_top_ks), len(weights)))
+        hit_rate = np.zeros((len(rerank_top_ks), len(weights)))
+        context_chars = np.zeros((len(rerank_top_ks), len(weights)))
+        latency = 0.0
+
+        for question in scores:
+            bm25_contribution = np.where(question.bm25_ranks < k, 1.0 / (question.bm25_ranks + 1 + RRF_C), 0.0)
+            dense_contribution = np.where(question.dense_ranks < k, 1.0 / (question.dense_ranks + 1 + RRF_C), 0.0)
+            candidates = (question.bm25_ranks < k) | (question.dense_ranks < k)
+
+            # Зважений RRF для всіх пар ваг одночасно: [W, N]
+            fused = weights[:, :1] * bm25_contribution[None, :] + weights[:, 1:] * dense_contribution[None, :]
+            fused[:, ~candidates] = -np.inf
+            fused_order = np.argsort(-fused, axis=1, kind="stable")
+
+            if question.rerank_scores is not None:
+                # Крос-енкодер переранжовує всіх кандидатів, тож порядок не залежить від ваг злиття
+                reranked = np.where(candidates, question.rerank_scores, -np.inf)
+                final_order = np.broadcast_to(np.argsort(-reranked, kind="stable"), fused_order.shape)
+            else:
+                final_order = fused_order
+
+            num_candidates = int(candidates.sum())
+            latency += question.bm25_time + question.dense_time + rerank_pair_time * num_candidates
+
+            for i, rerank_top_k in enumerate(rerank_top_ks):
+                r = min(rerank_top_k, num_candidates)
+                if r == 0:
+                    continue
+
+                final_top = final_order[:, :r]
+                fusion_mrr[i] += reciprocal_ranks(fused_order[:, :r], question.labels)
+                mrr[i] += reciprocal_ranks(final_top, question.labels)
+                hit_rate[i] += question.labels[final_top].any(axis=1)
+                context_chars[i] += lengths[final_top].sum(axis=1)
+
+        n = max(len(scores), 1)
+        for i, rerank_top_k in enumerate(rerank_top_ks):
+            for w, (bm25_weight, vector_weight) in enumerate(weights):
+                results.append(TuningResult(
+                    parameters={
+                        "chunk_size": variant.chunk_size,
+                        "chunk_overlap": variant.chunk_overlap,
+                        "top_k": top_k,
+                        "rerank_top_k": rerank_top_k,
+                        "bm25_weight": round(float(bm25_weight), 3),
+                        "vector_weight": round(float(vector_weight), 3)
+                    },
+                    mrr=float(mrr[i, w] / n),
+                    hit_rate=float(hit_rate[i, w] / n),
+                    fusion_mrr=float(fusion_mrr[i, w] / n),
+                    latency_ms=1000.0 * latency / n,
+                    context_chars=float(context_chars[i, w] / n)
+                ))
+
+    return results
+
+
+def pareto_front(results: List[TuningResult]) -> List[TuningResult]:
+    """
+    Фронт Парето: найвища якість (MRR) за найменшої затримки
+
+    За рівних MRR і затримки перевага надається кращому злиттю (fusion_mrr) і меншому контексту
+    """
+    ordered = sorted(results, key=lambda r: (r.latency_ms, -r.mrr, -r.fusion_mrr, r.context_chars))
+
+    front = []
+    best_mrr = -1.0
+    for result in ordered:
+        if result.mrr > best_mrr:
+            result.pareto = True
+            front.append(result)
+            best_mrr = result.mrr
+
+    return front
+
+
+def run_tuning(
+        questions: List[GoldenQuestion],
+        text_documents: List[Document],
+        embeddings: Any,
+        cross_encoder: Any,
+        chunk_sizes: List[int],
+        chunk_overlaps: List[int],
+        top_ks: List[int],
+        rerank_top_ks: List[int],
+        bm25_weights: List[float],
+        structure_aware: bool = True
+) -> Dict[str, Any]:
+    """Перебір параметрів і побудова фронту Парето (варіанти з однаковими чанками оцінюються один раз)"""
+    labelled = [q for q in questions if q.expected_sources or q.expected_phrases]
+    if not labelled:
+        raise ValueError("Набір не містить розмічених запитань (expected_sources або expected_phrases)")
+
+    query_vectors = np.asarray([embeddings.embed_query(q.question) for q in labelled], dtype=np.float32)
+    query_vectors /= np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+
+    weights = np.array([[w, round(1.0 - w, 3)] for w in bm25_weights], dtype=np.float64)
+    max_candidates = max(top_ks) * 2
+
+    results: List[TuningResult] = []
+    variants_report = []
+    evaluated: Dict[str, str] = {}
+
+    for chunk_size in chunk_sizes:
+        for chunk_overlap in chunk_overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+
+            started = time.perf_counter()
+            documents = split_corpus(text_documents, chunk_size, chunk_overlap, embeddings, structure_aware)
+            split_time = time.perf_counter() - started
+
+            # Однакові чанки дали б ті самі оцінки: повторне оцінювання лише подвоїло б час і точки фронту
+            fingerprint = chunks_hash(documents)
+            if fingerprint in evaluated:
+                variants_report.append({
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "num_chunks": len(documents),
+                    "duplicate_of": evaluated[fingerprint]
+                })
+                print(f"Варіант розбиття {chunk_size}/{chunk_overlap}: ті самі чанки, що й {evaluated[fingerprint]} - пропущено")
+                continue
+            evaluated[fingerprint] = f"{chunk_size}/{chunk_overlap}"
+
+            variant = build_variant(documents, chunk_size, chunk_overlap, embeddings, split_time)
+
+            scores = []
+            rerank_time, rerank_pairs = 0.0, 0
+            for item, query_vector in zip(labelled, query_vectors):
+                question_scores, question_rerank_time, question_rerank_pairs = score_question(
+                    item, query_vector, variant, max_candidates, cross_encoder
+                )
+                scores.append(question_scores)
+                rerank_time += question_rerank_time
+                rerank_pairs += question_rerank_pairs
+
+            rerank_pair_time = rerank_time / rerank_pairs if rerank_pairs else 0.0
+            results.extend(evaluate_variant(variant, scores, top_ks, rerank_top_ks, weights, rerank_pair_time))
+
+            variants_report.append({
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "num_chunks": len(variant.documents),
+                "build_time": variant.build_time,
+                "rerank_pair_ms": 1000.0 * rerank_pair_time
+            })
+            print(f"Варіант розбиття {chunk_size}/{chunk_overlap}: {len(variant.documents)} чанків")
+
+    front = pareto_front(results)
+    recommended = max(front, key=lambda r: (r.mrr, r.hit_rate, -r.latency_ms)) if front else None
+
+    return {
+        "questions": len(labelled),
+        "configurations": len(results),
+        "variants": variants_report,
+        "recommended": asdict(recommended) if recommended else None,
+        "pareto_front": [asdict(r) for r in front],
+        "results": [asdict(r) for r in sorted(results, key=lambda r: (-r.mrr, r.latency_ms))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-перебір параметрів пошуку")
+    parser.add_argument("--golden-set", required=True, help="Розмічений набір запитань (JSONL)")
+    parser.add_argument("--documents-path", default=None)
+    parser.add_argument("--chunk-sizes", default="512,1000,1500")
+    parser.add_argument("--chunk-overlaps", default="100,200")
+    parser.add_argument("--top-ks", default="3,5,8,10")
+    parser.add_argument("--rerank-top-ks", default="2,3,5")
+    parser.add_argument("--bm25-weights", default="0.2,0.3,0.4,0.5,0.6")
+    parser.add_argument("--no-rerank", action="store_true", help="Оцінювати без крос-енкодера")
+    parser.add_argument("--output", default=None, help="Файл для збереження результатів у форматі JSON")
+    parser.add_argument("--apply", default=None, help="Адреса сервера для застосування рекомендованих параметрів")
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from app.config import settings
+    from app.rag.cache.corpus_cache import ExtractedTextCache, PersistentEmbeddings
+
+    embeddings = PersistentEmbeddings(
+        HuggingFaceEmbeddings(
+            model_name=settings.embedding_model,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        ),
+        path=settings.embedding_store_path
+    )
+
+    cross_encoder = None
+    if not args.no_rerank:
+        from sentence_transformers import CrossEncoder
+        cross_encoder = CrossEncoder(settings.cross_encoder_model)
+
+    text_cache = ExtractedTextCache(settings.text_cache_dir)
+    text_documents = text_cache.load_documents(args.documents_path or settings.documents_path)
+
+    report = run_tuning(
+        questions=load_golden_set(args.golden_set),
+        text_documents=text_documents,
+        embeddings=embeddings,
+        cross_encoder=cross_encoder,
+        chunk_sizes=parse_list(args.chunk_sizes, int),
+        chunk_overlaps=parse_list(args.chunk_overlaps, int),
+        top_ks=parse_list(args.top_ks, int),
+        rerank_top_ks=parse_list(args.rerank_top_ks, int),
+        bm25_weights=parse_list(args.bm25_weights, float),
+        structure_aware=settings.structure_splitting
+    )
+    report["caches"] = {"text": text_cache.stats(), "embeddings": embeddings.stats()}
+
+    print(json.dumps(
+        {key: report[key] for key in ("questions", "configurations", "variants", "recommended", "pareto_front", "caches")},
+        ensure_ascii=False,
+        indent=2
+    ))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.apply and report["recommended"]:
+        import httpx
+
+        response = httpx.post(f"{args.apply}/parameters", json=report["recommended"]["parameters"], timeout=600)
+        response.raise_for_status()
+        print(f"Параметри застосовано: {response.json()}")
+
+
+if __name__ == "__main__":
+    main()